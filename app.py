@@ -1,21 +1,42 @@
 # -*- coding: utf-8 -*-
 
+import time
+INICIO_PROCESSO = time.perf_counter() # Referência para medir o tempo até a primeira pintura da janela
+
 import tkinter as tk
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
-from tkinter import messagebox, simpledialog, scrolledtext
+from tkinter import messagebox, simpledialog, scrolledtext, filedialog
 from ttkbootstrap import Style
-import pandas as pd
 import os
 import threading
-import time # Embora importado, time não é usado diretamente. Pode ser removido se não houver planos futuros.
 import queue
 import sys
 import re
 
-# Importa os módulos locais
-from prtg_api import PRTGAPI
+# Importa os módulos locais (o cliente do PRTG é importado sob demanda)
 from network_tools import NetworkTools
+from tarefas import CANCELADA, CONCLUIDA, FALHOU, GerenciadorTarefas
+from monitor import MonitorContinuo
+from historico import HistoricoResultados
+from metricas import HISTOGRAMA, METRICAS, ExportadorMetricas
+from indice_lojas import IndiceLojas, BuscaIncremental, ObservadorLojas, assinatura_arquivo, carregar_indice_lojas
+from tabela_lojas import ler_lojas_csv, nome_loja_prtg
+from varredura import STATUS_SEM_NUMERO, VMS_LOJA, extrair_numero_loja, filtrar_lojas, ips_vms_loja, numero_da_loja, varrer_lojas
+
+ATRASO_SUGESTOES_MS = 150 # Espera após a última tecla antes de calcular sugestões (debounce)
+LIMITE_SUGESTOES = 10 # Quantidade máxima de lojas sugeridas durante a digitação
+
+CAMINHO_LOJAS_CSV = os.path.join("data", "lojas.csv") # Assume que o CSV está em uma pasta "data"
+INTERVALO_MONITOR_S = 30 # Intervalo padrão entre verificações do monitoramento contínuo
+LIMITE_LINHAS_INFO = 1000 # Linhas mantidas na área de informações enquanto o monitor anexa mudanças
+INTERVALO_VERIFICACAO_LOJAS_S = 5 # Frequência com que o CSV de lojas é verificado em busca de alterações
+CAMINHO_HISTORICO = os.path.join("data", "historico.db") # Histórico local de pings e circuitos (SQLite)
+CAMINHO_METRICAS = os.environ.get("METRICAS_ARQUIVO") # Se definido, as métricas são regravadas nesse arquivo (.prom ou .json)
+INTERVALO_EXPORTACAO_METRICAS_S = 15
+CAMINHO_TOPOLOGIA_PRTG = os.path.join("data", "prtg_topologia.json") # Snapshot local da árvore Core/Loja/Dispositivos
+MAX_TAREFAS_SIMULTANEAS = 6 # Consultas e pings executando ao mesmo tempo; as demais aguardam na fila
+INTERVALO_PAINEL_TAREFAS_MS = 150 # Agrupa as atualizações de progresso antes de redesenhar o painel de tarefas
 
 class AppMonitoramentoLojas:
     """Classe principal da aplicação de monitoramento de lojas."""
@@ -29,7 +50,7 @@ class AppMonitoramentoLojas:
         """
         self.root = root
         self.root.title("Monitoramento de Lojas - NOC")
-        self.root.geometry("900x650") # Dimensões da janela principal
+        self.root.geometry("900x780") # Dimensões da janela principal
 
         # Configuração de estilo para widgets ttkbootstrap
         style = Style()
@@ -52,13 +73,41 @@ class AppMonitoramentoLojas:
                   bordercolor=[("focus", "#e6a914"), ("hover", "#e6a914")])
 
         # Inicialização de variáveis de estado e dados
-        self.lojas_df = self.carregar_dados_lojas() # DataFrame com dados das lojas
-        self.loja_selecionada = None # Armazena a linha do DataFrame da loja atualmente selecionada
+        self.indice_lojas = IndiceLojas([]) # Índice de busca por ID e nome; preenchido em segundo plano
+        self.dados_lojas_carregados = False # Flag para indicar que o carregamento das lojas terminou
+        self.observador_lojas = None # Reaplica alterações do lojas.csv ao índice sem reiniciar
+        self.loja_selecionada = None # Armazena o registro (dicionário) da loja atualmente selecionada
         self.network_tools = NetworkTools() # Instância para ferramentas de rede (ping)
         self.prtg_api = None # Instância da API do PRTG, inicializada após configuração
         self.prtg_configurado = False # Flag para indicar se o PRTG foi configurado
-        self.thread_running = False # Flag para indicar se uma operação em thread está em execução
-        self.thread_stop = False # Flag para sinalizar a uma thread em execução que ela deve parar
+        try:
+            self.historico = HistoricoResultados(CAMINHO_HISTORICO) # Séries de pings e circuitos, com agregados
+        except Exception as e:
+            print(f"Histórico local indisponível ({CAMINHO_HISTORICO}): {e}")
+            self.historico = None
+        self.monitor = MonitorContinuo(
+            self.network_tools,
+            obter_prtg=lambda: self.prtg_api if self.prtg_configurado else None,
+            ao_mudanca=lambda loja, mudancas, estado: self.root.after(0, lambda: self._exibir_mudancas_monitor(loja, mudancas)),
+            intervalo=INTERVALO_MONITOR_S,
+            historico=self.historico
+        )
+        self.exportador_metricas = None
+        if CAMINHO_METRICAS:
+            self.exportador_metricas = ExportadorMetricas(METRICAS, CAMINHO_METRICAS, INTERVALO_EXPORTACAO_METRICAS_S)
+            self.exportador_metricas.iniciar()
+        # Operações (consultas, pings, varreduras) rodam em paralelo, cada uma com progresso e cancelamento próprios
+        self.tarefas = GerenciadorTarefas(
+            max_workers=MAX_TAREFAS_SIMULTANEAS,
+            ao_mudar=lambda tarefa: self.root.after(0, self._agendar_painel_tarefas)
+        )
+        self.tarefa_em_foco = None # ID da tarefa cujo resultado aparece na área de informações
+        self.texto_em_foco = None # Último texto exibido da tarefa em foco (evita redesenhar sem mudança)
+        self.painel_tarefas_after_id = None
+        self.sugestoes = [] # Registros das lojas exibidas na lista de sugestões
+        self.sugestoes_after_id = None # Agendamento pendente do debounce das sugestões
+        self.sugestoes_geracao = 0 # Incrementado ao ocultar a lista; invalida cálculos em andamento
+        self.fila_sugestoes = queue.Queue() # Termos enviados à thread de sugestões
 
         # --- Layout da Interface Gráfica ---
         main_frame = ttk.Frame(root, padding="15")
@@ -76,12 +125,27 @@ class AppMonitoramentoLojas:
         self.loja_entry.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
         consulta_frame.columnconfigure(1, weight=1)
         self.loja_entry.bind("<Return>", self.buscar_loja_event) # Permite buscar com Enter
+        self.loja_entry.bind("<KeyRelease>", self.agendar_sugestoes) # Sugestões durante a digitação
+        self.loja_entry.bind("<Down>", self._focar_sugestoes)
+        self.loja_entry.bind("<Escape>", lambda e: self._ocultar_sugestoes())
         self.loja_entry.focus_set() # Foco inicial no campo de busca
 
+        # Lista de sugestões (oculta enquanto não houver candidatos)
+        self.sugestoes_listbox = tk.Listbox(consulta_frame, height=6, activestyle="dotbox", font=("Consolas", 10))
+        self.sugestoes_listbox.grid(row=1, column=1, padx=5, pady=(0, 5), sticky="ew")
+        self.sugestoes_listbox.grid_remove()
+        self.sugestoes_listbox.bind("<Double-Button-1>", self._selecionar_sugestao)
+        self.sugestoes_listbox.bind("<Return>", self._selecionar_sugestao)
+        self.sugestoes_listbox.bind("<Escape>", lambda e: self._ocultar_sugestoes())
+
         self.buscar_button = ttk.Button(consulta_frame, text="Buscar", command=self.buscar_loja, style="Amarelo.TButton", width=10)
         self.buscar_button.grid(row=0, column=2, padx=(10, 5), pady=5)
         self.config_prtg_button = ttk.Button(consulta_frame, text="Configurar PRTG", command=self.configurar_prtg, style="Danger", width=15)
         self.config_prtg_button.grid(row=0, column=3, padx=5, pady=5)
+        self.varredura_button = ttk.Button(consulta_frame, text="Varredura de Lojas", command=self.abrir_varredura, bootstyle="primary-outline", width=18)
+        self.varredura_button.grid(row=0, column=4, padx=5, pady=5)
+        self.painel_core_button = ttk.Button(consulta_frame, text="Painel do Core", command=self.abrir_painel_core, bootstyle="info-outline", width=15)
+        self.painel_core_button.grid(row=0, column=5, padx=5, pady=5)
 
         # --- Frame de Informações da Loja ---
         info_frame = ttk.LabelFrame(main_frame, text=" Informações da Loja ", padding="15", bootstyle="success")
@@ -109,98 +173,275 @@ class AppMonitoramentoLojas:
         self.ping_vms_button = ttk.Button(self.actions_frame, text="Ping VMs Loja", command=self.ping_vms_action, state="disabled", bootstyle="primary", width=20)
         self.ping_vms_button.grid(row=0, column=2, padx=5, pady=5)
 
-        self.cancelar_button = ttk.Button(self.actions_frame, text="Cancelar Operação", command=self.cancelar_operacao, state="disabled", bootstyle="danger-outline", width=20)
-        self.cancelar_button.grid(row=0, column=3, padx=5, pady=5)
+        self.monitor_button = ttk.Button(self.actions_frame, text="Monitorar Loja", command=self.alternar_monitoramento, state="disabled", bootstyle="warning-outline", width=20)
+        self.monitor_button.grid(row=0, column=3, padx=5, pady=5)
+
+        self.historico_button = ttk.Button(self.actions_frame, text="Histórico da Loja", command=self.exibir_historico, state="disabled", bootstyle="secondary-outline", width=20)
+        self.historico_button.grid(row=1, column=0, padx=(0, 5), pady=5)
+
+        self.diagnostico_button = ttk.Button(self.actions_frame, text="Diagnóstico", command=lambda: JanelaDiagnostico(self), bootstyle="secondary-outline", width=20)
+        self.diagnostico_button.grid(row=1, column=1, padx=5, pady=5)
+
+        # --- Frame de Tarefas ---
+        tarefas_frame = ttk.LabelFrame(main_frame, text=" Tarefas ", padding="10", bootstyle="secondary")
+        tarefas_frame.grid(row=3, column=0, padx=10, pady=5, sticky="ew")
+        tarefas_frame.columnconfigure(0, weight=1)
+
+        colunas_tarefas = ("tarefa", "alvo", "estado", "progresso", "duracao")
+        titulos_tarefas = {"tarefa": "Tarefa", "alvo": "Loja / Core", "estado": "Estado", "progresso": "Progresso", "duracao": "Duração"}
+        self.grade_tarefas = ttk.Treeview(tarefas_frame, columns=colunas_tarefas, show="headings", height=4)
+        for coluna in colunas_tarefas:
+            self.grade_tarefas.heading(coluna, text=titulos_tarefas[coluna])
+            self.grade_tarefas.column(coluna, width=300 if coluna == "progresso" else 120,
+                                      anchor=tk.CENTER if coluna in ("estado", "duracao") else tk.W)
+        self.grade_tarefas.tag_configure(CONCLUIDA, foreground="#2fb344")
+        self.grade_tarefas.tag_configure(FALHOU, foreground="#d9534f")
+        self.grade_tarefas.tag_configure(CANCELADA, foreground="#999999")
+        self.grade_tarefas.bind("<<TreeviewSelect>>", self._focar_tarefa_selecionada)
+        self.grade_tarefas.grid(row=0, column=0, rowspan=3, sticky="ew")
+
+        self.cancelar_button = ttk.Button(tarefas_frame, text="Cancelar Tarefa", command=self.cancelar_operacao, state="disabled", bootstyle="danger-outline", width=18)
+        self.cancelar_button.grid(row=0, column=1, padx=(10, 0), pady=2)
+        self.cancelar_todas_button = ttk.Button(tarefas_frame, text="Cancelar Todas", command=self.tarefas.cancelar_todas, state="disabled", bootstyle="danger-outline", width=18)
+        self.cancelar_todas_button.grid(row=1, column=1, padx=(10, 0), pady=2)
+        self.limpar_tarefas_button = ttk.Button(tarefas_frame, text="Limpar Finalizadas", command=self.limpar_tarefas, bootstyle="secondary-outline", width=18)
+        self.limpar_tarefas_button.grid(row=2, column=1, padx=(10, 0), pady=2)
 
         # --- Barra de Status ---
         self.status_var = tk.StringVar()
         self.status_var.set("Pronto")
         self.status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W, padding=(10, 5), bootstyle="light")
-        self.status_bar.grid(row=3, column=0, sticky="ew")
+        self.status_bar.grid(row=4, column=0, sticky="ew")
+
+        # Indicador de progresso exibido enquanto os dados são carregados em segundo plano
+        self.progresso = ttk.Progressbar(main_frame, mode="indeterminate", bootstyle="success-striped")
+        self.progresso.grid(row=5, column=0, sticky="ew", pady=(2, 0))
+        self.progresso.start(15)
+        self.status_var.set("Carregando dados das lojas...")
+
+        self.root.protocol("WM_DELETE_WINDOW", self.ao_fechar) # Salva o snapshot do PRTG antes de sair
 
-    def carregar_dados_lojas(self):
-        """Carrega os dados das lojas a partir de um arquivo CSV."""
-        caminho_csv = os.path.join("data", "lojas.csv") # Assume que o CSV está em uma pasta "data"
+        # Thread dedicada às sugestões: a busca nunca roda no loop principal do Tkinter
+        threading.Thread(target=self._thread_sugestoes, daemon=True).start()
+
+        # O carregamento pesado só começa depois que a janela for desenhada pela primeira vez
+        self.root.after_idle(self._apos_primeira_pintura)
+
+    def _apos_primeira_pintura(self):
+        """Registra o tempo até a janela aparecer e inicia o carregamento em segundo plano."""
+        self.tempo_primeira_pintura_ms = (time.perf_counter() - INICIO_PROCESSO) * 1000
+        METRICAS.definir("gui_first_paint_seconds", self.tempo_primeira_pintura_ms / 1000)
+        threading.Thread(target=self._thread_carregar_dados, daemon=True).start()
+
+    def _thread_carregar_dados(self):
+        """(Executado em Thread) Carrega o índice de lojas e pré-importa o cliente do PRTG."""
+        inicio = time.perf_counter()
+        avisos = []
+        assinatura = assinatura_arquivo(CAMINHO_LOJAS_CSV) # Tomada antes da leitura: alterações durante a carga não se perdem
+        indice, erro = self.carregar_dados_lojas(avisos)
+        try:
+            self._obter_classe_prtg() # Deixa requests/urllib3 prontos antes do primeiro uso
+        except ImportError as e:
+            avisos.append(f"Cliente do PRTG indisponível: {e}")
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        self.root.after(0, lambda: self._concluir_carregamento(indice, erro, avisos, duracao_ms, assinatura))
+
+    def _concluir_carregamento(self, indice, erro, avisos, duracao_ms, assinatura=None):
+        """Publica o índice carregado e libera a busca (executado no thread da GUI)."""
+        self.indice_lojas = indice
+        self.dados_lojas_carregados = True
+        if not erro:
+            self.observador_lojas = ObservadorLojas(
+                CAMINHO_LOJAS_CSV, indice, ler_lojas_csv,
+                lambda novo, resumo: self.root.after(0, lambda: self._aplicar_lojas_atualizadas(novo, resumo)),
+                intervalo=INTERVALO_VERIFICACAO_LOJAS_S, assinatura=assinatura
+            )
+            self.observador_lojas.iniciar()
+        self.progresso.stop()
+        self.progresso.grid_remove()
+        if erro:
+            titulo, mensagem = erro
+            messagebox.showerror(titulo, mensagem)
+        for aviso in avisos:
+            messagebox.showwarning("Aviso de Dados", aviso)
+        self.status_var.set(f"{len(indice)} lojas carregadas em {duracao_ms:.0f} ms "
+                            f"(janela exibida em {self.tempo_primeira_pintura_ms:.0f} ms). Pronto")
+        if self.loja_entry.get().strip():
+            self.agendar_sugestoes() # O operador começou a digitar durante o carregamento
+
+    def _aplicar_lojas_atualizadas(self, indice, resumo):
+        """
+        Troca o índice de lojas pelo que reflete o lojas.csv alterado (executado no thread da GUI).
+
+        Args:
+            indice: Novo IndiceLojas produzido pelo ObservadorLojas.
+            resumo: Contagens de lojas incluídas, removidas e alteradas.
+        """
+        self.indice_lojas = indice # Troca atômica: buscas em andamento terminam no índice anterior
+        if self.loja_selecionada is not None:
+            atuais = indice.buscar_por_id(self.loja_selecionada.get("ID_Loja", ""))
+            if len(atuais) == 1:
+                self.loja_selecionada = atuais[0]
+        self.status_var.set(
+            f"lojas.csv atualizado: {resumo['incluidas']} incluídas, {resumo['removidas']} removidas, "
+            f"{resumo['alteradas']} alteradas ({len(indice)} lojas)."
+        )
+
+    def _obter_classe_prtg(self):
+        """Importa o cliente do PRTG sob demanda (requests/urllib3 só são carregados quando necessários)."""
+        from prtg_api import PRTGAPI
+        return PRTGAPI
+
+    def carregar_dados_lojas(self, avisos):
+        """
+        Carrega o índice de lojas, reaproveitando o cache binário enquanto o CSV não mudar.
+
+        Pode ser chamado fora do thread da GUI: não abre diálogos, apenas devolve o erro
+        (título, mensagem) e acumula em `avisos` os alertas a serem exibidos depois.
+
+        Returns:
+            Tupla (IndiceLojas, erro ou None).
+        """
+        caminho_csv = CAMINHO_LOJAS_CSV
         if not os.path.exists(caminho_csv):
-            messagebox.showerror("Erro de Dados", f"Arquivo de dados não encontrado: {caminho_csv}")
-            return pd.DataFrame() # Retorna DataFrame vazio em caso de erro
+            return IndiceLojas([]), ("Erro de Dados", f"Arquivo de dados não encontrado: {caminho_csv}")
         try:
-            try:
-                # Tenta ler com UTF-8, que é mais comum
-                df = pd.read_csv(caminho_csv, dtype={"ID_Loja": str})
-            except UnicodeDecodeError:
-                # Se falhar, tenta com latin1, comum em sistemas mais antigos ou arquivos do Windows
-                df = pd.read_csv(caminho_csv, encoding="latin1", dtype={"ID_Loja": str})
-            
-            colunas_esperadas = ["ID_Loja", "Nome_Loja", "Core_PRTG", "Cidade", "Estado", "Contato_Gerencia", "Telefone"]
-            colunas_presentes = df.columns.tolist()
-            colunas_faltando = [col for col in colunas_esperadas if col not in colunas_presentes]
-            
-            if colunas_faltando:
-                 messagebox.showwarning("Aviso de Dados", f"O arquivo {caminho_csv} não contém as colunas esperadas: {', '.join(colunas_faltando)}.")
-                 # Adiciona colunas faltantes com valores vazios para evitar KeyErrors posteriores
-                 for col in colunas_faltando:
-                     df[col] = ""
-            
-            df = df.fillna("") # Preenche NaNs com strings vazias para consistência
-            return df
+            return carregar_indice_lojas(caminho_csv, lambda caminho: self._ler_csv_lojas(caminho, avisos)), None
         except Exception as e:
-            messagebox.showerror("Erro ao Carregar Dados", f"Não foi possível ler o arquivo CSV ({caminho_csv}):\n{e}")
-            return pd.DataFrame()
+            return IndiceLojas([]), ("Erro ao Carregar Dados", f"Não foi possível ler o arquivo CSV ({caminho_csv}):\n{e}")
+
+    def _ler_csv_lojas(self, caminho_csv, avisos):
+        """Lê e valida o CSV de lojas, devolvendo a lista de registros compactos (RegistroLoja)."""
+        # Leitura com o módulo csv: o pandas fica restrito à exportação (tabela_lojas.para_dataframe)
+        return ler_lojas_csv(caminho_csv, avisos)
 
     def buscar_loja_event(self, event):
         """Callback para o evento <Return> no campo de busca."""
         self.buscar_loja()
 
+    def agendar_sugestoes(self, event=None):
+        """Reinicia o debounce das sugestões a cada tecla que altera o termo."""
+        if event is not None and event.keysym in ("Return", "KP_Enter", "Up", "Down", "Escape", "Tab"):
+            return
+        if self.sugestoes_after_id is not None:
+            self.root.after_cancel(self.sugestoes_after_id)
+        self.sugestoes_after_id = self.root.after(ATRASO_SUGESTOES_MS, self._disparar_sugestoes)
+
+    def _disparar_sugestoes(self):
+        """Envia o termo atual para a thread de sugestões."""
+        self.sugestoes_after_id = None
+        self.fila_sugestoes.put((self.sugestoes_geracao, self.loja_entry.get()))
+
+    def _thread_sugestoes(self):
+        """(Executado em Thread) Calcula sugestões incrementais, sempre para o termo mais recente."""
+        busca = None
+        while True:
+            geracao, termo = self.fila_sugestoes.get()
+            while not self.fila_sugestoes.empty(): # Descarta termos já superados pela digitação
+                geracao, termo = self.fila_sugestoes.get_nowait()
+            try:
+                indice = self.indice_lojas
+                if busca is None or busca.indice is not indice:
+                    busca = BuscaIncremental(indice, limite=LIMITE_SUGESTOES)
+                sugestoes = busca.sugerir(termo)
+            except Exception as e:
+                print(f"Erro ao calcular sugestões de lojas: {e}")
+                sugestoes = []
+            self.root.after(0, lambda g=geracao, t=termo, s=sugestoes: self._exibir_sugestoes(g, t, s))
+
+    def _exibir_sugestoes(self, geracao, termo, sugestoes):
+        """Mostra as sugestões, se ainda corresponderem ao que está digitado."""
+        if geracao != self.sugestoes_geracao or termo != self.loja_entry.get():
+            return # Resultado antigo: a busca já foi feita ou um termo mais recente está a caminho
+        self.sugestoes = sugestoes
+        self.sugestoes_listbox.delete(0, tk.END)
+        if not sugestoes:
+            self.sugestoes_listbox.grid_remove()
+            return
+        for loja in sugestoes:
+            self.sugestoes_listbox.insert(tk.END, f"{loja.get('ID_Loja', '')} - {loja.get('Nome_Loja', '')}")
+        self.sugestoes_listbox.config(height=min(len(sugestoes), LIMITE_SUGESTOES))
+        self.sugestoes_listbox.grid()
+
+    def _focar_sugestoes(self, event=None):
+        """Move o foco do campo de busca para a lista de sugestões (seta para baixo)."""
+        if self.sugestoes:
+            self.sugestoes_listbox.focus_set()
+            self.sugestoes_listbox.selection_clear(0, tk.END)
+            self.sugestoes_listbox.selection_set(0)
+            self.sugestoes_listbox.activate(0)
+        return "break"
+
+    def _selecionar_sugestao(self, event=None):
+        """Carrega a loja escolhida na lista de sugestões."""
+        selecao = self.sugestoes_listbox.curselection()
+        if not selecao:
+            return
+        loja = self.sugestoes[selecao[0]]
+        self.loja_entry.delete(0, tk.END)
+        self.loja_entry.insert(0, str(loja.get("ID_Loja", "")))
+        self.loja_entry.focus_set()
+        self.buscar_loja()
+
+    def _ocultar_sugestoes(self):
+        """Esconde a lista de sugestões e descarta cálculos pendentes."""
+        if self.sugestoes_after_id is not None:
+            self.root.after_cancel(self.sugestoes_after_id)
+            self.sugestoes_after_id = None
+        self.sugestoes_geracao += 1
+        self.sugestoes = []
+        self.sugestoes_listbox.delete(0, tk.END)
+        self.sugestoes_listbox.grid_remove()
+
     def buscar_loja(self):
         """Busca uma loja com base no termo inserido pelo usuário."""
+        self._ocultar_sugestoes()
         termo_busca = self.loja_entry.get().strip()
         # Não limpar o campo de busca aqui, para o usuário ver o que buscou.
         # self.loja_entry.delete(0, tk.END) 
 
         self.loja_selecionada = None
+        self.tarefa_em_foco = None # Tarefas em andamento seguem no painel, mas não sobrescrevem a nova loja
         self.atualizar_info_text("") # Limpa informações anteriores
         # Desabilita todos os botões de ação ao iniciar uma nova busca
         self.ver_circuitos_button.config(state="disabled")
         self.ping_button.config(state="disabled")
         self.ping_vms_button.config(state="disabled")
+        self._atualizar_botoes_monitoramento()
 
         if not termo_busca:
             messagebox.showwarning("Busca Inválida", "Por favor, insira o ID ou Nome da Loja.")
             return
         
-        if self.lojas_df.empty:
+        if not self.dados_lojas_carregados:
+            messagebox.showinfo("Carregando Dados", "Os dados das lojas ainda estão sendo carregados. Aguarde um instante.")
+            return
+
+        if len(self.indice_lojas) == 0:
             messagebox.showerror("Erro de Dados", "Base de dados de lojas não carregada ou vazia.")
             return
 
         try:
-            # Busca primeiro pelo ID da Loja (correspondência exata)
-            if "ID_Loja" in self.lojas_df.columns:
-                resultado = self.lojas_df[self.lojas_df["ID_Loja"].astype(str) == termo_busca]
-            else:
-                resultado = pd.DataFrame() # Garante que resultado é um DataFrame
-
-            # Se não encontrou por ID, busca pelo Nome da Loja (correspondência parcial, case-insensitive)
-            if resultado.empty and "Nome_Loja" in self.lojas_df.columns:
-                resultado = self.lojas_df[self.lojas_df["Nome_Loja"].str.contains(termo_busca, case=False, na=False)]
+            # Busca primeiro pelo ID da Loja (correspondência exata) e, se não encontrar,
+            # pelo Nome da Loja (correspondência parcial, sem diferenciar maiúsculas nem acentos)
+            resultado = self.indice_lojas.buscar(termo_busca)
         except Exception as e:
             messagebox.showerror("Erro na Busca", f"Ocorreu um erro durante a busca: {e}")
             return
 
-        if resultado.empty:
+        if not resultado:
             self.atualizar_info_text(f"Nenhuma loja encontrada para o termo: \"{termo_busca}\"")
         elif len(resultado) > 1:
             try:
                 # Formata a lista de lojas encontradas para exibição
-                nomes = "\n".join([f"- {nome} (ID: {id_loja})" 
-                                   for nome, id_loja in zip(resultado["Nome_Loja"], resultado["ID_Loja"])])
+                nomes = "\n".join([f"- {loja['Nome_Loja']} (ID: {loja['ID_Loja']})" for loja in resultado])
                 self.atualizar_info_text(f"Múltiplas lojas encontradas para \"{termo_busca}\". Refine sua busca.\n\nLojas encontradas:\n{nomes}")
             except KeyError as e:
                  messagebox.showerror("Erro de Dados", f"Coluna '{e}' não encontrada no arquivo CSV. Verifique 'data/lojas.csv'.")
                  self.atualizar_info_text(f"Erro ao listar múltiplas lojas. Coluna '{e}' ausente.")
         else:
             # Loja única encontrada
-            self.loja_selecionada = resultado.iloc[0]
+            self.loja_selecionada = resultado[0]
             try:
                 info = "--- Informações da Loja ---\n"
                 info += f"ID:             {self.loja_selecionada.get('ID_Loja', 'N/A')}\n"
@@ -216,6 +457,7 @@ class AppMonitoramentoLojas:
                 
                 # Habilita o botão Ping VMs Loja, pois não depende do PRTG
                 self.ping_vms_button.config(state="normal") 
+                self._atualizar_botoes_monitoramento()
                 
                 if self.prtg_configurado:
                     self.ver_circuitos_button.config(state="normal")
@@ -250,11 +492,17 @@ class AppMonitoramentoLojas:
         self.root.update_idletasks() # Força atualização da GUI
 
         try:
+            PRTGAPI = self._obter_classe_prtg()
+            if self.prtg_api is not None:
+                self.prtg_api.stop_revalidation() # O cliente anterior não deve mais revalidar nem gravar o snapshot
             self.prtg_api = PRTGAPI(server_url.strip(), username.strip(), password) # Não passar o passhash diretamente
             success, message = self.prtg_api.test_connection()
             
             if success:
                 self.prtg_configurado = True
+                # Snapshot local e sincronização ficam fora do thread da GUI
+                self.tarefas.submeter("Sincronizar PRTG", self._tarefa_sincronizar_prtg, self.prtg_api,
+                                      alvo=self.prtg_api.server_url, chave=("sincronizar_prtg", id(self.prtg_api)))
                 messagebox.showinfo("Configuração PRTG", "Conexão com PRTG estabelecida com sucesso!")
                 # Se uma loja já estiver selecionada, atualiza o estado dos botões PRTG
                 if self.loja_selecionada is not None:
@@ -282,229 +530,363 @@ class AppMonitoramentoLojas:
     
     def formatar_nome_loja_para_prtg(self, nome_loja_csv):
         """Formata o nome da loja do CSV para o padrão PRTG (ex: 'Loja 10' -> 'LJ010')."""
-        if not isinstance(nome_loja_csv, str):
-            return str(nome_loja_csv) # Retorna como string se não for
-            
-        match = re.search(r'\d+', nome_loja_csv)
-        if match:
-            try:
-                numero = int(match.group())
-                return f"LJ{numero:03d}" # Formata com 3 dígitos, ex: 10 -> 010
-            except ValueError:
-                return nome_loja_csv # Retorna original se não conseguir converter número
-        return nome_loja_csv # Retorna original se não encontrar números
+        return nome_loja_prtg(nome_loja_csv)
 
     def _extrair_numero_loja(self, id_ou_nome_loja):
         """
         Extrai o número da loja do ID_Loja (ex: '10', '010') ou Nome_Loja (ex: 'Loja 10', 'LJ010').
         Usado para construir os IPs das VMs.
         """
-        if id_ou_nome_loja is None: return None
-        
-        # Tenta extrair números de uma string. Ex: "LJ010" -> "010", "Loja 10" -> "10", "10" -> "10"
-        match = re.search(r'\d+', str(id_ou_nome_loja)) 
-        if match:
-            try:
-                return int(match.group()) # Converte para inteiro
-            except ValueError:
-                return None # Falha na conversão
-        return None # Nenhum número encontrado
+        return extrair_numero_loja(id_ou_nome_loja)
+
+    def abrir_varredura(self):
+        """Abre a janela de varredura de saúde das VMs de todas as lojas (ou de um filtro)."""
+        if not self.dados_lojas_carregados:
+            messagebox.showinfo("Aguarde", "Os dados das lojas ainda estão sendo carregados.", parent=self.root)
+            return
+        JanelaVarredura(self)
+
+    def abrir_painel_core(self):
+        """Abre o painel com o status dos circuitos de todas as lojas de um Core."""
+        if not self.prtg_configurado or self.prtg_api is None:
+            messagebox.showwarning("PRTG Não Configurado",
+                                   "O 'Painel do Core' requer que o PRTG esteja configurado e conectado.",
+                                   parent=self.root)
+            return
+        JanelaPainelCore(self)
 
     # --- Métodos de Ação (PRTG e Ping VMs) ---
     def ver_circuitos(self):
-        """Inicia a thread para buscar e exibir informações dos circuitos PRTG."""
+        """Agenda a consulta dos circuitos PRTG da loja selecionada."""
         if self._verificar_prerequisitos_acao("Ver Circuitos PRTG", require_prtg=True):
-            self.status_var.set("Consultando circuitos PRTG...")
-            self._preparar_thread_inicio()
-            threading.Thread(target=self._thread_ver_circuitos, daemon=True).start()
+            self._submeter_acao_loja("Circuitos PRTG", self._tarefa_ver_circuitos, self.prtg_api)
 
-    def _thread_ver_circuitos(self):
-        """(Executado em Thread) Busca informações dos circuitos no PRTG."""
-        try:
-            nome_loja_csv = self.loja_selecionada.get("Nome_Loja", "N/A")
-            nome_loja_prtg = self.formatar_nome_loja_para_prtg(nome_loja_csv)
-            core_prtg = self.loja_selecionada.get("Core_PRTG", "N/A")
-            
-            # Atualiza status na GUI (thread-safe via root.after)
-            self.root.after(0, lambda: self.status_var.set(f"Buscando circuitos para {nome_loja_prtg} no Core {core_prtg}..."))
-            
-            resultado = self.prtg_api.get_circuit_info(nome_loja_prtg, core_prtg)
-            
-            if self.thread_stop: # Verifica se a operação foi cancelada
-                self.root.after(0, lambda: self.status_var.set("Consulta de circuitos cancelada."))
-                return
-            
-            info_display = f"--- Circuitos PRTG para {nome_loja_prtg} (Core: {core_prtg}) ---\n"
-            if not resultado.get("success"):
-                info_display += f"Erro ao buscar dados do PRTG: {resultado.get("message", "Erro desconhecido")}\n"
+    def _tarefa_ver_circuitos(self, tarefa, loja, prtg_api):
+        """(Executado no pool de tarefas) Busca informações dos circuitos no PRTG."""
+        nome_loja_prtg = self.formatar_nome_loja_para_prtg(loja.get("Nome_Loja", "N/A"))
+        core_prtg = loja.get("Core_PRTG", "N/A")
+
+        tarefa.informar(f"Buscando circuitos para {nome_loja_prtg} no Core {core_prtg}...")
+        with prtg_api.cancellable(tarefa.cancelamento):
+            resultado = prtg_api.get_circuit_info(nome_loja_prtg, core_prtg)
+        if tarefa.cancelada():
+            return None
+
+        info_display = f"--- Circuitos PRTG para {nome_loja_prtg} (Core: {core_prtg}) ---\n"
+        if not resultado.get("success"):
+            info_display += f"Erro ao buscar dados do PRTG: {resultado.get('message', 'Erro desconhecido')}\n"
+        else:
+            devices_circuits = resultado.get("devices_circuits", [])
+            if not devices_circuits:
+                info_display += "Nenhum dispositivo com circuitos PRTG correspondentes foi encontrado.\n"
             else:
-                devices_circuits = resultado.get("devices_circuits", [])
-                if not devices_circuits:
-                    info_display += "Nenhum dispositivo com circuitos PRTG correspondentes foi encontrado.\n"
-                else:
-                    for dev_data in devices_circuits:
-                        info_display += f"Dispositivo: {dev_data.get('device_name', 'N/A')} "
-                        info_display += f"(Host: {dev_data.get('device_host', 'N/A')}, Status: {dev_data.get('device_status', 'N/A')})\n"
-                        circuits = dev_data.get("circuits", [])
-                        if circuits:
-                            for i, c in enumerate(circuits, 1):
-                                info_display += f"  {i}. Sensor: {c.get('name', 'N/A')}\n"
-                                info_display += f"     Status: {c.get('status', 'N/A')}\n"
-                                info_display += f"     Mensagem: {c.get('message', 'N/A')}\n"
-                                info_display += f"     Último Valor: {c.get('lastvalue', 'N/A')}\n"
-                        else:
-                            info_display += "  Nenhum sensor de circuito PRTG encontrado para este dispositivo.\n"
-                        info_display += "\n" # Linha em branco entre dispositivos
-            
-            self.root.after(0, lambda: self.atualizar_info_text(info_display))
-            self.root.after(0, lambda: self.status_var.set(f"Circuitos de {nome_loja_prtg} carregados."))
+                for dev_data in devices_circuits:
+                    info_display += f"Dispositivo: {dev_data.get('device_name', 'N/A')} "
+                    info_display += f"(Host: {dev_data.get('device_host', 'N/A')}, Status: {dev_data.get('device_status', 'N/A')})\n"
+                    circuits = dev_data.get("circuits", [])
+                    if circuits:
+                        for i, c in enumerate(circuits, 1):
+                            info_display += f"  {i}. Sensor: {c.get('name', 'N/A')}\n"
+                            info_display += f"     Status: {c.get('status', 'N/A')}\n"
+                            info_display += f"     Mensagem: {c.get('message', 'N/A')}\n"
+                            info_display += f"     Último Valor: {c.get('lastvalue', 'N/A')}\n"
+                    else:
+                        info_display += "  Nenhum sensor de circuito PRTG encontrado para este dispositivo.\n"
+                    info_display += "\n" # Linha em branco entre dispositivos
 
-        except Exception as e:
-            error_msg = f"Erro inesperado ao consultar circuitos PRTG: {e}"
-            self.root.after(0, lambda: messagebox.showerror("Erro na Thread", error_msg))
-            self.root.after(0, lambda: self.status_var.set("Erro ao consultar circuitos PRTG."))
-        finally:
-            self.root.after(0, self._finalizar_thread) # Garante que a UI é reabilitada
+        if resultado.get("success"):
+            if self.historico:
+                self.historico.registrar_circuitos(self.monitor.chave_loja(loja), resultado["devices_circuits"])
+            prtg_api.save_topology(wait=False) # Tarefas simultâneas não gravam o snapshot cada uma
+            tarefa.informar(f"Circuitos de {nome_loja_prtg} carregados.")
+        else:
+            tarefa.informar("Erro ao consultar circuitos PRTG.")
+        return info_display
 
     def ping_links(self):
-        """Inicia a thread para pingar os links da loja (obtidos do PRTG)."""
+        """Agenda o ping dos links da loja (IPs obtidos do PRTG)."""
         if self._verificar_prerequisitos_acao("Ping Links PRTG", require_prtg=True):
-            self.status_var.set("Iniciando ping dos links PRTG...")
-            self._preparar_thread_inicio()
-            threading.Thread(target=self._thread_ping_links, daemon=True).start()
+            self._submeter_acao_loja("Ping Links PRTG", self._tarefa_ping_links, self.prtg_api)
 
-    def _thread_ping_links(self):
-        """(Executado em Thread) Obtém IPs do PRTG e realiza pings."""
-        try:
-            nome_loja_csv = self.loja_selecionada.get("Nome_Loja", "N/A")
-            nome_loja_prtg = self.formatar_nome_loja_para_prtg(nome_loja_csv)
-            core_prtg = self.loja_selecionada.get("Core_PRTG", "N/A")
-            hosts_para_ping = []
+    def _tarefa_ping_links(self, tarefa, loja, prtg_api):
+        """(Executado no pool de tarefas) Obtém IPs do PRTG e realiza pings."""
+        nome_loja_prtg = self.formatar_nome_loja_para_prtg(loja.get("Nome_Loja", "N/A"))
+        core_prtg = loja.get("Core_PRTG", "N/A")
+        hosts_para_ping = []
 
-            self.root.after(0, lambda: self.status_var.set(f"Consultando IPs no PRTG para {nome_loja_prtg}..."))
-            resultado_api = self.prtg_api.get_circuit_info(nome_loja_prtg, core_prtg)
-            
-            if self.thread_stop: return
+        tarefa.informar(f"Consultando IPs no PRTG para {nome_loja_prtg}...")
+        with prtg_api.cancellable(tarefa.cancelamento):
+            resultado_api = prtg_api.get_circuit_info(nome_loja_prtg, core_prtg)
+        if tarefa.cancelada():
+            return None
 
-            if resultado_api.get("success") and resultado_api.get("devices_circuits"):
-                for dev_data in resultado_api["devices_circuits"]:
-                    host_prtg = dev_data.get("device_host")
-                    if host_prtg and host_prtg not in hosts_para_ping: # Evita duplicados
-                        hosts_para_ping.append(host_prtg)
-            
-            if not hosts_para_ping:
-                # Se não encontrou IPs no PRTG, pergunta ao usuário
-                ip_queue = queue.Queue()
-                prompt_msg = f"IPs dos links de {nome_loja_prtg} não encontrados no PRTG. \nDigite um IP para ping (ou deixe em branco para cancelar):"
-                # A função _ask_ip_and_put precisa ser chamada no thread principal da GUI
-                self.root.after(0, lambda: self._ask_ip_and_put(ip_queue, prompt_msg))
-                ip_manual = ip_queue.get() # Bloqueia até que o usuário insira algo
-                
-                if self.thread_stop: return
-                if not ip_manual or not ip_manual.strip():
-                    self.root.after(0, lambda: self.status_var.set("Ping de links PRTG cancelado pelo usuário."))
-                    self.root.after(0, lambda: self.atualizar_info_text("Ping de links PRTG cancelado."))
-                    return
-                hosts_para_ping.append(ip_manual.strip())
-
-            ping_results_text = f"--- Ping Links PRTG para {nome_loja_prtg} ---\n"
-            for host_idx, host in enumerate(hosts_para_ping):
-                if self.thread_stop: return
-                self.root.after(0, lambda h=host, idx=host_idx, total=len(hosts_para_ping):
-                                 self.status_var.set(f"Ping para {h} ({idx+1}/{total})..."))
-                result = self.network_tools.ping_host(host)
-                ping_results_text += f"\nHost: {host}\n"
-                if result.get("success"):
-                    ping_results_text += f"  Status: Online, Tempo Médio: {result.get("avg_time", "N/A")} ms, Perda: {result.get("packet_loss", "N/A")} %\n"
-                else:
-                    ping_results_text += f"  Status: Offline / Erro ({result.get("error", "Desconhecido")})\n"
-            
-            self.root.after(0, lambda: self.atualizar_info_text(ping_results_text))
-            self.root.after(0, lambda: self.status_var.set(f"Ping dos links de {nome_loja_prtg} concluído."))
+        if resultado_api.get("success") and resultado_api.get("devices_circuits"):
+            for dev_data in resultado_api["devices_circuits"]:
+                host_prtg = dev_data.get("device_host")
+                if host_prtg and host_prtg not in hosts_para_ping: # Evita duplicados
+                    hosts_para_ping.append(host_prtg)
 
-        except Exception as e:
-            error_msg = f"Erro inesperado ao realizar ping dos links PRTG: {e}"
-            self.root.after(0, lambda: messagebox.showerror("Erro na Thread", error_msg))
-            self.root.after(0, lambda: self.status_var.set("Erro no ping dos links PRTG."))
-        finally:
-            self.root.after(0, self._finalizar_thread)
+        if not hosts_para_ping:
+            # Se não encontrou IPs no PRTG, pergunta ao usuário
+            ip_queue = queue.Queue()
+            prompt_msg = f"IPs dos links de {nome_loja_prtg} não encontrados no PRTG. \nDigite um IP para ping (ou deixe em branco para cancelar):"
+            tarefa.informar("Aguardando IP informado pelo usuário...")
+            # A função _ask_ip_and_put precisa ser chamada no thread principal da GUI
+            self.root.after(0, lambda: self._ask_ip_and_put(ip_queue, prompt_msg))
+            # Bloqueia até que o usuário insira algo; o cancelamento libera a espera na hora
+            liberar = tarefa.cancelamento.ao_cancelar(lambda: ip_queue.put(""))
+            ip_manual = ip_queue.get()
+            tarefa.cancelamento.remover(liberar)
+
+            if tarefa.cancelada():
+                return None
+            if not ip_manual or not ip_manual.strip():
+                tarefa.informar("Ping de links PRTG cancelado pelo usuário.")
+                return "Ping de links PRTG cancelado."
+            hosts_para_ping.append(ip_manual.strip())
+
+        titulo = f"--- Ping Links PRTG para {nome_loja_prtg} ---\n"
+        texto = self._executar_pings_concorrentes(tarefa, loja, titulo, {host: host for host in hosts_para_ping})
+        tarefa.informar(f"Ping dos links de {nome_loja_prtg} concluído.")
+        return texto
 
     def ping_vms_action(self):
-        """Inicia a thread para pingar as VMs da loja selecionada."""
+        """Agenda o ping das VMs da loja selecionada."""
         if self._verificar_prerequisitos_acao("Ping VMs Loja", require_prtg=False): # Não requer PRTG
-            # self.status_var.set("Iniciando ping das VMs da loja...") # Agora definido por _preparar_thread_inicio
-            self._preparar_thread_inicio("Iniciando ping das VMs da loja...")
-            threading.Thread(target=self._thread_ping_vms_loja, daemon=True).start()
+            self._submeter_acao_loja("Ping VMs", self._tarefa_ping_vms_loja)
 
-    def _thread_ping_vms_loja(self):
-        """(Executado em Thread) Gera IPs das VMs e executa o ping."""
-        try:
-            id_loja = self.loja_selecionada.get("ID_Loja")
-            nome_loja_display = self.loja_selecionada.get("Nome_Loja", f"Loja ID {id_loja}")
-            
-            # Tenta extrair o número da loja primeiro do ID, depois do Nome
-            numero_loja = self._extrair_numero_loja(id_loja) 
-            if numero_loja is None:
-                 nome_loja_csv = self.loja_selecionada.get("Nome_Loja")
-                 numero_loja = self._extrair_numero_loja(nome_loja_csv)
-
-            if numero_loja is None:
-                msg_erro_num_loja = f"Não foi possível determinar o número da loja '{nome_loja_display}' para gerar os IPs das VMs. Verifique os dados no CSV."
-                self.root.after(0, lambda: self.atualizar_info_text(msg_erro_num_loja))
-                self.root.after(0, lambda: self.status_var.set("Erro ao obter número da loja para Ping VMs."))
+    def _tarefa_ping_vms_loja(self, tarefa, loja):
+        """(Executado no pool de tarefas) Gera IPs das VMs e executa o ping."""
+        id_loja = loja.get("ID_Loja")
+        nome_loja_display = loja.get("Nome_Loja", f"Loja ID {id_loja}")
+
+        # Tenta extrair o número da loja primeiro do ID, depois do Nome
+        numero_loja = self._extrair_numero_loja(id_loja)
+        if numero_loja is None:
+            numero_loja = self._extrair_numero_loja(loja.get("Nome_Loja"))
+
+        if numero_loja is None:
+            tarefa.informar("Erro ao obter número da loja para Ping VMs.")
+            return f"Não foi possível determinar o número da loja '{nome_loja_display}' para gerar os IPs das VMs. Verifique os dados no CSV."
+
+        # Define os IPs das VMs com base no número da loja
+        ips_vm = ips_vms_loja(numero_loja)
+
+        titulo = f"--- Ping host principais para {nome_loja_display} (Loja N° {numero_loja}) ---\n"
+        rotulos = {ip_vm: f"{nome_vm} (IP: {ip_vm})" for nome_vm, ip_vm in ips_vm.items()}
+        texto = self._executar_pings_concorrentes(tarefa, loja, titulo, rotulos)
+        tarefa.informar(f"Ping das VMs de {nome_loja_display} concluído.")
+        return texto
+
+    def _tarefa_sincronizar_prtg(self, tarefa, prtg_api):
+        """
+        (Executado no pool de tarefas) Carrega a topologia salva na última execução; sem snapshot
+        completo, sincroniza a topologia inteira do PRTG e salva o snapshot local.
+        """
+        tarefa.informar("Lendo a topologia salva...")
+        # Com snapshot, a revalidação ocorre em segundo plano (PRTGAPI.load_topology)
+        prtg_api.load_topology(CAMINHO_TOPOLOGIA_PRTG)
+        if tarefa.cancelada():
+            return None
+        if prtg_api.topology_index is not None:
+            tarefa.informar("Topologia do PRTG carregada do snapshot local.")
+            return None
+
+        # Sem snapshot completo: pré-carrega toda a árvore do PRTG em poucas chamadas em lote
+        tarefa.informar("Carregando grupos, dispositivos e sensores...")
+        with prtg_api.cancellable(tarefa.cancelamento):
+            success, message = prtg_api.sync_topology()
+        if tarefa.cancelada():
+            return None
+        if not success:
+            raise RuntimeError(message)
+        prtg_api.save_topology(wait=False)
+        tarefa.informar(message)
+        self.root.after(0, lambda: self.status_var.set(message))
+        return None
+
+    def _executar_pings_concorrentes(self, tarefa, loja, titulo, rotulos):
+        """
+        (Executado no pool de tarefas) Pinga todos os hosts ao mesmo tempo e publica o texto parcial
+        da tarefa assim que cada resultado chega.
+
+        Args:
+            tarefa: Tarefa em execução (fornece o cancelamento e recebe o progresso).
+            loja: Registro da loja, para o histórico.
+            titulo: Cabeçalho exibido acima da lista de hosts.
+            rotulos: Dicionário {host: rótulo exibido}, na ordem de exibição.
+
+        Returns:
+            Texto final com o resultado de cada host.
+        """
+        resultados = {}
+        total = len(rotulos)
+        chave_loja = self.monitor.chave_loja(loja)
+        tarefa.informar(f"Ping para {total} host(s) em andamento...", concluidos=0, total=total,
+                        resultado=self._formatar_resultados_ping(titulo, rotulos, {}))
+
+        def ao_receber(host, resultado):
+            if tarefa.cancelada():
                 return
+            resultados[host] = resultado
+            if self.historico:
+                self.historico.registrar_ping(chave_loja, host, resultado)
+            tarefa.informar(f"Ping: {len(resultados)}/{total} host(s) concluído(s)...", concluidos=len(resultados),
+                            resultado=self._formatar_resultados_ping(titulo, rotulos, resultados))
 
-            # Define os IPs das VMs com base no número da loja
-            ips_vm = {
-                "Gateway": f"192.168.{numero_loja}.1",
-                "API": f"192.168.{numero_loja}.2",
-                "DB": f"192.168.{numero_loja}.3",
-                "Manager": f"192.168.{numero_loja}.4"
-            }
+        self.network_tools.ping_hosts_concurrently(list(rotulos), on_result=ao_receber, cancel_token=tarefa.cancelamento)
+        return self._formatar_resultados_ping(titulo, rotulos, resultados)
 
-            ping_results_text = f"--- Ping host principais para {nome_loja_display} (Loja N° {numero_loja}) ---\n"
-            
-            for vm_idx, (nome_vm, ip_vm) in enumerate(ips_vm.items()):
-                if self.thread_stop: return
-                self.root.after(0, lambda n=nome_vm, i=ip_vm, idx=vm_idx, total=len(ips_vm):
-                                 self.status_var.set(f"Ping para host {n} ({i}) ({idx+1}/{total})..."))
-                result = self.network_tools.ping_host(ip_vm)
-                ping_results_text += f"\nHost: {nome_vm} (IP: {ip_vm})\n"
-                if result.get("success"):
-                    ping_results_text += f"  Status: Online, Tempo Médio: {result.get("avg_time", "N/A")} ms, Perda: {result.get("packet_loss", "N/A")} %\n"
-                else:
-                    ping_results_text += f"  Status: Offline / Erro ({result.get("error", "Desconhecido")})\n"
-            
-            self.root.after(0, lambda: self.atualizar_info_text(ping_results_text))
-            self.root.after(0, lambda: self.status_var.set(f"Ping das VMs de {nome_loja_display} concluído."))
+    def _formatar_resultados_ping(self, titulo, rotulos, resultados):
+        """Monta o texto com uma entrada por host; hosts sem resultado aparecem como aguardando."""
+        texto = titulo
+        for host, rotulo in rotulos.items():
+            texto += f"\nHost: {rotulo}\n"
+            result = resultados.get(host)
+            if result is None:
+                texto += "  Status: Aguardando resposta...\n"
+            elif result.get("success"):
+                texto += f"  Status: Online, Tempo Médio: {result.get('avg_time', 'N/A')} ms, Perda: {result.get('packet_loss', 'N/A')} %\n"
+            else:
+                texto += f"  Status: Offline / Erro ({result.get('error', 'Desconhecido')})\n"
+        return texto
+
+    # --- Monitoramento Contínuo ---
+    def alternar_monitoramento(self):
+        """Inclui ou retira a loja selecionada da lista de lojas monitoradas continuamente."""
+        if self.loja_selecionada is None:
+            return
+        chave = self.monitor.chave_loja(self.loja_selecionada)
+        nome_loja = self.loja_selecionada.get("Nome_Loja", chave)
+        if self.monitor.monitorando(chave):
+            self.monitor.remover(chave)
+            self.status_var.set(f"Monitoramento de {nome_loja} encerrado.")
+        else:
+            intervalo = simpledialog.askinteger(
+                "Monitoramento Contínuo", "Intervalo entre verificações (segundos):",
+                initialvalue=self.monitor.intervalo, minvalue=5, maxvalue=3600, parent=self.root
+            )
+            if intervalo is None:
+                return
+            self.monitor.intervalo = intervalo
+            self.monitor.adicionar(self.loja_selecionada)
+            self._anexar_info_text([f"\n--- Monitoramento de {nome_loja} a cada ~{intervalo} s (apenas mudanças) ---"])
+            self.status_var.set(f"Monitorando {len(self.monitor.lojas())} loja(s).")
+        self._atualizar_botoes_monitoramento()
+
+    def _atualizar_botoes_monitoramento(self):
+        """Ajusta os botões de monitoramento e histórico para a loja selecionada."""
+        self.historico_button.config(state="normal" if self.loja_selecionada is not None and self.historico else "disabled")
+        if self.loja_selecionada is None:
+            self.monitor_button.config(text="Monitorar Loja", state="disabled")
+            return
+        ativo = self.monitor.monitorando(self.monitor.chave_loja(self.loja_selecionada))
+        self.monitor_button.config(text="Parar Monitoramento" if ativo else "Monitorar Loja", state="normal")
+
+    def _exibir_mudancas_monitor(self, loja, mudancas):
+        """
+        Anexa à área de informações apenas os itens que mudaram de estado (executado no thread da GUI).
+
+        Args:
+            loja: Registro da loja verificada.
+            mudancas: Lista de (item, estado anterior, estado atual).
+        """
+        chave = self.monitor.chave_loja(loja)
+        if not self.monitor.monitorando(chave):
+            return # Loja retirada enquanto a verificação terminava
+        horario = time.strftime("%H:%M:%S")
+        nome_loja = loja.get("Nome_Loja", chave)
+        linhas = []
+        for item, anterior, atual in mudancas:
+            if anterior is None:
+                linhas.append(f"[{horario}] {nome_loja} | {item}: {atual}")
+            else:
+                trocas = self.monitor.transicoes.get((chave, item), 0)
+                linhas.append(f"[{horario}] {nome_loja} | {item}: {anterior} -> {atual or 'removido'} ({trocas} mudança(s))")
+        self._anexar_info_text(linhas)
+        mudou = [m for m in mudancas if m[1] is not None]
+        if mudou:
+            item, anterior, atual = mudou[-1]
+            self.status_var.set(f"Monitor [{horario}]: {nome_loja} - {item}: {anterior} -> {atual or 'removido'}")
+        else:
+            self.status_var.set(f"Monitor [{horario}]: estado inicial de {nome_loja} registrado.")
+
+    def exibir_historico(self):
+        """Mostra, a partir do histórico local, disponibilidade e latência da loja em três janelas de tempo."""
+        if self.loja_selecionada is None or not self.historico:
+            return
+        # A consulta grava antes as amostras pendentes e pode esperar uma limpeza do banco: fica no pool
+        self._submeter_acao_loja("Histórico da Loja", self._tarefa_historico)
 
+    def _tarefa_historico(self, tarefa, loja):
+        """(Executado no pool de tarefas) Monta o texto do histórico local da loja."""
+        chave = self.monitor.chave_loja(loja)
+        texto = f"--- Histórico local de {loja.get('Nome_Loja', chave)} ---\n"
+        tarefa.informar("Consultando o histórico local...")
+        try:
+            for titulo, periodo in (("Última hora", 3600), ("Últimas 24 horas", 86400), ("Últimos 7 dias", 7 * 86400)):
+                resumo = self.historico.resumo(chave, periodo)
+                texto += f"\n{titulo}:\n"
+                if not resumo:
+                    texto += "  Sem amostras.\n"
+                for (tipo, alvo), (amostras, disponibilidade, media, minimo, maximo) in resumo.items():
+                    latencia = f"média {media:.1f} (mín {minimo:.1f} / máx {maximo:.1f})" if media is not None else "sem valores"
+                    texto += f"  [{tipo}] {alvo}: {disponibilidade:.1f}% disponível em {amostras} amostra(s), {latencia}\n"
         except Exception as e:
-            error_msg = f"Erro inesperado ao realizar ping das VMs: {e}"
-            self.root.after(0, lambda: messagebox.showerror("Erro na Thread", error_msg))
-            self.root.after(0, lambda: self.status_var.set("Erro no ping das VMs."))
-        finally:
-            self.root.after(0, self._finalizar_thread)
+            texto += f"\nErro ao consultar o histórico: {e}\n"
+        tarefa.informar("Histórico consultado.")
+        return texto
+
+    def _anexar_info_text(self, linhas):
+        """Acrescenta linhas ao final da área de informações, descartando as mais antigas acima do limite."""
+        try:
+            self.info_text.config(state="normal")
+            self.info_text.insert(tk.END, "\n".join(linhas) + "\n")
+            excedente = int(self.info_text.index("end-1c").split(".")[0]) - LIMITE_LINHAS_INFO
+            if excedente > 0:
+                self.info_text.delete("1.0", f"{excedente + 1}.0")
+            self.info_text.see(tk.END)
+            self.info_text.config(state="disabled")
+        except Exception as e:
+            print(f"Erro ao anexar à área de texto 'info_text': {e}")
 
     # --- Métodos Auxiliares e de Controle da GUI ---
+    def ao_fechar(self):
+        """Persiste a topologia do PRTG em disco e encerra a aplicação."""
+        if self.observador_lojas is not None:
+            self.observador_lojas.parar()
+        self.tarefas.encerrar()
+        self.monitor.parar()
+        if self.historico:
+            self.historico.fechar()
+        if self.exportador_metricas is not None:
+            self.exportador_metricas.parar()
+        if self.prtg_api is not None:
+            self.prtg_api.save_topology()
+        self.root.destroy()
+
     def _ask_ip_and_put(self, q, prompt):
-        """Pede um IP ao usuário e coloca na fila (usado por _thread_ping_links)."""
+        """Pede um IP ao usuário e coloca na fila (usado por _tarefa_ping_links)."""
         ip = simpledialog.askstring("Entrada Necessária", prompt, parent=self.root)
         q.put(ip if ip is not None else "") # Garante que algo é colocado na fila
 
     def cancelar_operacao(self):
-        """Sinaliza para a thread em execução que ela deve parar."""
-        if self.thread_running:
-            self.thread_stop = True
-            self.status_var.set("Cancelando operação em andamento...")
-            # A thread em si deve verificar self.thread_stop e terminar graciosamente.
+        """
+        Cancela a tarefa selecionada no painel (ou, sem seleção, a tarefa em foco): a requisição ao
+        PRTG é abortada e os processos de ping são mortos, sem afetar as demais tarefas.
+        """
+        selecao = self.grade_tarefas.selection()
+        identificador = int(selecao[0]) if selecao else self.tarefa_em_foco
+        if identificador is not None:
+            self.tarefas.cancelar(identificador)
+
+    def limpar_tarefas(self):
+        """Retira do painel as tarefas concluídas, com falha ou canceladas."""
+        self.tarefas.limpar_finalizadas()
+        self._atualizar_painel_tarefas()
 
     def _verificar_prerequisitos_acao(self, nome_acao, require_prtg=False):
         """Verifica se as condições para executar uma ação são atendidas."""
-        if self.thread_running:
-            messagebox.showwarning("Operação em Andamento", 
-                                 "Aguarde a operação atual terminar ou cancele-a antes de iniciar uma nova.",
-                                 parent=self.root)
-            return False
         if self.loja_selecionada is None:
             messagebox.showwarning("Nenhuma Loja Selecionada", 
                                  "Nenhuma loja está selecionada. Por favor, realize uma busca primeiro.",
@@ -516,47 +898,79 @@ class AppMonitoramentoLojas:
                                  parent=self.root)
             return False
         return True
-    def _preparar_thread_inicio(self, status_msg):
-        """Desabilita botões e prepara a GUI para uma operação em thread."""
-        self.thread_running = True
-        self.thread_stop = False # Reseta a flag de parada
-        self.status_var.set(status_msg) # Define a mensagem de status
-        # Desabilita botões que iniciam novas operações
-        self.ver_circuitos_button.config(state="disabled")
-        self.ping_button.config(state="disabled")
-        self.ping_vms_button.config(state="disabled")
-        self.buscar_button.config(state="disabled")
-        self.config_prtg_button.config(state="disabled") # Desabilita config PRTG durante operação
-        self.cancelar_button.config(state="normal") # Habilita o botão de cancelar
-
-    def _finalizar_thread(self):
-        """Reabilita botões e atualiza a GUI após uma operação em thread terminar."""
-        self.thread_running = False
-        # self.thread_stop é resetado em _preparar_thread_inicio
-        
-        # Reabilita o botão de busca e configuração do PRTG
-        self.buscar_button.config(state="normal")
-        self.config_prtg_button.config(state="normal")
-        self.cancelar_button.config(state="disabled") # Desabilita o botão de cancelar
 
-        # Reabilita botões de ação com base no estado atual
-        if self.loja_selecionada is not None:
-            self.ping_vms_button.config(state="normal") # Ping VMs sempre habilitado se loja selecionada
-            if self.prtg_configurado:
-                self.ver_circuitos_button.config(state="normal")
-                self.ping_button.config(state="normal")
+    def _submeter_acao_loja(self, titulo, funcao, *args):
+        """
+        Agenda uma ação para a loja selecionada e coloca a tarefa em foco.
+
+        A loja (e o cliente do PRTG, quando houver) é capturada no momento do clique, então o
+        operador pode buscar outra loja e disparar novas ações enquanto esta continua rodando.
+        Repetir a mesma ação para a mesma loja enquanto ela roda apenas volta o foco para ela.
+
+        Args:
+            titulo: Nome da ação exibido no painel de tarefas.
+            funcao: Executada como funcao(tarefa, loja, *args) no pool de tarefas.
+        """
+        loja = self.loja_selecionada
+        chave_loja = self.monitor.chave_loja(loja)
+        alvo = loja.get("Nome_Loja") or chave_loja
+        tarefa = self.tarefas.submeter(titulo, funcao, loja, *args, alvo=alvo, chave=(titulo, chave_loja))
+        self._focar_tarefa(tarefa.id)
+
+    def _focar_tarefa(self, identificador):
+        """Passa a exibir na área de informações o resultado (parcial ou final) da tarefa."""
+        self.tarefa_em_foco = identificador
+        self.texto_em_foco = None
+        self._atualizar_painel_tarefas()
+
+    def _focar_tarefa_selecionada(self, event=None):
+        selecao = self.grade_tarefas.selection()
+        if selecao and int(selecao[0]) != self.tarefa_em_foco:
+            self._focar_tarefa(int(selecao[0]))
+
+    def _agendar_painel_tarefas(self):
+        """Agenda um redesenho do painel de tarefas; mudanças próximas são aplicadas juntas."""
+        if self.painel_tarefas_after_id is None:
+            self.painel_tarefas_after_id = self.root.after(INTERVALO_PAINEL_TAREFAS_MS, self._atualizar_painel_tarefas)
+
+    def _atualizar_painel_tarefas(self):
+        """Sincroniza o painel com o gerenciador de tarefas e exibe a tarefa em foco (thread da GUI)."""
+        if self.painel_tarefas_after_id is not None:
+            self.root.after_cancel(self.painel_tarefas_after_id)
+            self.painel_tarefas_after_id = None
+
+        tarefas = self.tarefas.tarefas()
+        existentes = set(self.grade_tarefas.get_children(""))
+        for tarefa in tarefas:
+            iid = str(tarefa.id)
+            progresso = tarefa.progresso
+            if tarefa.total and tarefa.ativa():
+                progresso = f"[{tarefa.concluidos}/{tarefa.total}] {progresso}"
+            valores = (tarefa.titulo, tarefa.alvo, tarefa.estado, progresso, f"{tarefa.duracao():.1f} s")
+            if iid in existentes:
+                self.grade_tarefas.item(iid, values=valores, tags=(tarefa.estado,))
+                existentes.discard(iid)
             else:
-                self.ver_circuitos_button.config(state="disabled")
-                self.ping_button.config(state="disabled")
-        else: # Nenhuma loja selecionada, todos os botões de ação desabilitados
-            self.ver_circuitos_button.config(state="disabled")
-            self.ping_button.config(state="disabled")
-            self.ping_vms_button.config(state="disabled")
-
-        # Atualiza a barra de status, a menos que já mostre um erro ou cancelamento específico
-        current_status = self.status_var.get()
-        if not any(s in current_status.lower() for s in ["erro", "cancelad", "falha", "não foi possível"]):
-            self.status_var.set("Pronto")
+                self.grade_tarefas.insert("", 0, iid=iid, values=valores, tags=(tarefa.estado,)) # Mais recentes no topo
+        if existentes:
+            self.grade_tarefas.delete(*existentes)
+
+        ativas = [tarefa for tarefa in tarefas if tarefa.ativa()]
+        self.cancelar_button.config(state="normal" if ativas else "disabled")
+        self.cancelar_todas_button.config(state="normal" if ativas else "disabled")
+
+        foco = self.tarefas.obter(self.tarefa_em_foco) if self.tarefa_em_foco is not None else None
+        if foco is not None:
+            texto = foco.resultado
+            if texto is None and foco.erro is not None:
+                texto = f"Erro inesperado em '{foco.titulo}' ({foco.alvo}): {foco.erro}"
+            if texto is not None and texto != self.texto_em_foco:
+                self.texto_em_foco = texto
+                self.atualizar_info_text(texto)
+            self.status_var.set(f"{foco.titulo} - {foco.alvo}: {foco.progresso or foco.estado}")
+
+        if ativas: # Mantém a coluna de duração andando
+            self.painel_tarefas_after_id = self.root.after(1000, self._atualizar_painel_tarefas)
 
     def atualizar_info_text(self, texto):
         """Atualiza o conteúdo da área de texto de informações."""
@@ -576,21 +990,480 @@ class AppMonitoramentoLojas:
             except: 
                 pass # Evita loop de erro se a própria caixa de texto estiver com problemas
 
+def ordenar_grade(grade, coluna, decrescente=False):
+    """Reordena as linhas de um Treeview pela coluna, comparando números como números."""
+    def chave(iid):
+        valor = str(grade.set(iid, coluna))
+        numero = re.match(r'^\d+(\.\d+)?', valor)
+        # Números (tempos em ms, IDs) antes de textos; "Falha", "-" e "..." vão para o fim
+        return (0, float(numero.group()), "") if numero else (1, 0.0, valor.lower())
+
+    itens = sorted(grade.get_children(""), key=chave, reverse=decrescente)
+    for indice, iid in enumerate(itens):
+        grade.move(iid, "", indice)
+
+class JanelaVarredura:
+    """Janela com a varredura das VMs (192.168.N.1-4) de várias lojas, em uma grade ordenável."""
+
+    TODOS = "(Todos)"
+    INTERVALO_ATUALIZACAO_MS = 200 # Resultados são aplicados à grade em lotes, não um a um
+
+    def __init__(self, app):
+        """
+        Args:
+            app: Instância de AppMonitoramentoLojas (fornece o índice de lojas e o NetworkTools).
+        """
+        self.app = app
+        self.tarefa = None # Tarefa da varredura em andamento (no gerenciador do app)
+        self.em_execucao = False
+        self.fechada = False
+        self.fila = queue.Queue() # (posição, VM, resultado, status) produzidos pela thread da varredura
+        self.lojas = []
+        self.ordenacao = (None, False) # (coluna, decrescente)
+
+        self.janela = ttk.Toplevel(app.root)
+        self.janela.title("Varredura de Lojas - VMs")
+        self.janela.geometry("1000x600")
+        self.janela.protocol("WM_DELETE_WINDOW", self.fechar)
+
+        registros = app.indice_lojas.registros()
+        cores = sorted({str(loja.get("Core_PRTG", "")).strip() for loja in registros} - {""})
+        estados = sorted({str(loja.get("Estado", "")).strip() for loja in registros} - {""})
+
+        filtros_frame = ttk.Frame(self.janela, padding=(10, 10, 10, 5))
+        filtros_frame.pack(fill=tk.X)
+        ttk.Label(filtros_frame, text="Core PRTG:").pack(side=tk.LEFT)
+        self.core_combo = ttk.Combobox(filtros_frame, values=[self.TODOS] + cores, state="readonly", width=20)
+        self.core_combo.set(self.TODOS)
+        self.core_combo.pack(side=tk.LEFT, padx=(5, 15))
+        ttk.Label(filtros_frame, text="Estado:").pack(side=tk.LEFT)
+        self.estado_combo = ttk.Combobox(filtros_frame, values=[self.TODOS] + estados, state="readonly", width=8)
+        self.estado_combo.set(self.TODOS)
+        self.estado_combo.pack(side=tk.LEFT, padx=(5, 15))
+        self.iniciar_button = ttk.Button(filtros_frame, text="Iniciar Varredura", command=self.iniciar, bootstyle="success", width=18)
+        self.iniciar_button.pack(side=tk.LEFT, padx=5)
+        self.cancelar_button = ttk.Button(filtros_frame, text="Cancelar", command=self.cancelar, state="disabled", bootstyle="danger-outline", width=12)
+        self.cancelar_button.pack(side=tk.LEFT, padx=5)
+
+        colunas = ("id", "nome", "core", "estado") + tuple(nome_vm for nome_vm, _ in VMS_LOJA) + ("status",)
+        titulos = {"id": "ID", "nome": "Loja", "core": "Core PRTG", "estado": "UF", "status": "Status"}
+        grade_frame = ttk.Frame(self.janela, padding=(10, 0, 10, 0))
+        grade_frame.pack(fill=tk.BOTH, expand=True)
+        self.grade = ttk.Treeview(grade_frame, columns=colunas, show="headings")
+        for coluna in colunas:
+            self.grade.heading(coluna, text=titulos.get(coluna, coluna), command=lambda c=coluna: self.ordenar(c))
+            self.grade.column(coluna, width=220 if coluna == "nome" else 90, anchor=tk.W if coluna == "nome" else tk.CENTER)
+        self.grade.tag_configure("Online", foreground="#2fb344")
+        self.grade.tag_configure("Parcial", foreground="#f0ad4e")
+        self.grade.tag_configure("Offline", foreground="#d9534f")
+        barra = ttk.Scrollbar(grade_frame, orient=tk.VERTICAL, command=self.grade.yview)
+        self.grade.configure(yscrollcommand=barra.set)
+        self.grade.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        barra.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.progresso = ttk.Progressbar(self.janela, mode="determinate", bootstyle="success")
+        self.progresso.pack(fill=tk.X, padx=10, pady=(5, 0))
+        self.resumo_var = tk.StringVar(value="Escolha os filtros e inicie a varredura.")
+        ttk.Label(self.janela, textvariable=self.resumo_var, anchor=tk.W, padding=(10, 5)).pack(fill=tk.X)
+
+    def iniciar(self):
+        """Preenche a grade com as lojas filtradas e inicia os pings em uma thread."""
+        if self.em_execucao:
+            return
+        core = self.core_combo.get()
+        estado = self.estado_combo.get()
+        self.lojas = filtrar_lojas(self.app.indice_lojas.registros(),
+                                   core=None if core == self.TODOS else core,
+                                   estado=None if estado == self.TODOS else estado)
+        if not self.lojas:
+            self.resumo_var.set("Nenhuma loja corresponde aos filtros.")
+            return
+
+        self.grade.delete(*self.grade.get_children())
+        for posicao, loja in enumerate(self.lojas):
+            valores = (loja.get("ID_Loja", ""), loja.get("Nome_Loja", ""), loja.get("Core_PRTG", ""), loja.get("Estado", ""))
+            self.grade.insert("", tk.END, iid=str(posicao), values=valores + ("...",) * len(VMS_LOJA) + ("Aguardando",))
+        self.contagem = {}
+        self.vms_concluidas = 0
+        self.progresso.config(maximum=len(self.lojas) * len(VMS_LOJA), value=0)
+        self.inicio = time.perf_counter()
+
+        self.em_execucao = True
+        self.fila = queue.Queue() # Resultados atrasados de uma varredura cancelada não entram na nova
+        self.iniciar_button.config(state="disabled")
+        self.cancelar_button.config(state="normal")
+        self.resumo_var.set(f"Varrendo {len(self.lojas)} loja(s)...")
+        fila = self.fila
+        self.tarefa = self.app.tarefas.submeter(
+            "Varredura de VMs", self._tarefa_varredura, self.lojas, fila, alvo=f"{len(self.lojas)} loja(s)",
+            ao_terminar=lambda tarefa: fila.put(None) # Marca o fim, inclusive se cancelada antes de começar
+        )
+        self.janela.after(self.INTERVALO_ATUALIZACAO_MS, self._aplicar_resultados)
+
+    def _tarefa_varredura(self, tarefa, lojas, fila):
+        """(Executado no pool de tarefas) Pinga as VMs de todas as lojas e enfileira cada resultado."""
+        total = len(lojas) * len(VMS_LOJA)
+        concluidas = 0
+        try:
+            for posicao, loja in enumerate(lojas):
+                if numero_da_loja(loja) is None: # Sem número não há IPs a pingar
+                    fila.put((posicao, None, None, STATUS_SEM_NUMERO))
+                    concluidas += len(VMS_LOJA)
+            tarefa.informar("Pingando VMs...", concluidos=concluidas, total=total)
+            historico = self.app.historico
+
+            def ao_resultado(posicao, nome_vm, resultado, status):
+                nonlocal concluidas
+                fila.put((posicao, nome_vm, resultado, status))
+                if historico:
+                    historico.registrar_ping(MonitorContinuo.chave_loja(lojas[posicao]), resultado.get("host"), resultado)
+                concluidas += 1
+                tarefa.informar(concluidos=concluidas)
+
+            varrer_lojas(self.app.network_tools, lojas, ao_resultado=ao_resultado, cancelamento=tarefa.cancelamento)
+            tarefa.informar(f"{concluidas}/{total} VMs verificadas.")
+        except Exception as e:
+            fila.put((None, None, None, f"Erro na varredura: {e}"))
+            raise
+
+    def _aplicar_resultados(self):
+        """Aplica à grade os resultados acumulados desde a última atualização (thread da GUI)."""
+        if self.fechada:
+            return
+        terminou = False
+        while True:
+            try:
+                item = self.fila.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                terminou = True
+                break
+            posicao, nome_vm, resultado, status = item
+            if posicao is None:
+                self.resumo_var.set(status)
+                continue
+            iid = str(posicao)
+            if nome_vm is not None:
+                self.vms_concluidas += 1
+                if resultado.get("success"):
+                    self.grade.set(iid, nome_vm, f"{resultado.get('avg_time', 0):.0f} ms")
+                else:
+                    self.grade.set(iid, nome_vm, "Falha")
+            else:
+                for nome, _ in VMS_LOJA:
+                    self.grade.set(iid, nome, "-")
+                self.vms_concluidas += len(VMS_LOJA)
+            if status is not None:
+                self.grade.set(iid, "status", status)
+                self.grade.item(iid, tags=(status,))
+                self.contagem[status] = self.contagem.get(status, 0) + 1
+
+        self.progresso.config(value=self.vms_concluidas)
+        duracao = time.perf_counter() - self.inicio
+        resumo = ", ".join(f"{status}: {n}" for status, n in sorted(self.contagem.items()))
+        if terminou:
+            self.em_execucao = False
+            self.iniciar_button.config(state="normal")
+            self.cancelar_button.config(state="disabled")
+            cancelada = self.tarefa.estado == CANCELADA
+            situacao = "cancelada" if cancelada else "concluída"
+            if cancelada:
+                for iid in self.grade.get_children(""):
+                    if self.grade.set(iid, "status") == "Aguardando":
+                        self.grade.set(iid, "status", "Cancelada")
+            self.resumo_var.set(f"Varredura {situacao} em {duracao:.1f} s ({len(self.lojas)} lojas). {resumo}")
+            if self.ordenacao[0]:
+                self.ordenar(self.ordenacao[0], inverter=False)
+            return
+        self.resumo_var.set(f"{self.vms_concluidas}/{len(self.lojas) * len(VMS_LOJA)} VMs em {duracao:.1f} s. {resumo}")
+        self.janela.after(self.INTERVALO_ATUALIZACAO_MS, self._aplicar_resultados)
+
+    def ordenar(self, coluna, inverter=True):
+        """Ordena a grade pela coluna clicada; um novo clique na mesma coluna inverte a ordem."""
+        anterior, decrescente = self.ordenacao
+        if inverter:
+            decrescente = not decrescente if anterior == coluna else False
+        self.ordenacao = (coluna, decrescente)
+
+        ordenar_grade(self.grade, coluna, decrescente)
+
+    def cancelar(self):
+        """Interrompe a varredura: os pings em andamento são mortos e a thread termina em seguida."""
+        if self.em_execucao:
+            self.resumo_var.set("Cancelando varredura...")
+            self.app.tarefas.cancelar(self.tarefa.id)
+
+    def fechar(self):
+        """Cancela a varredura em andamento e fecha a janela."""
+        if self.tarefa is not None:
+            self.app.tarefas.cancelar(self.tarefa.id)
+        self.fechada = True
+        self.janela.destroy()
+
+class JanelaPainelCore:
+    """Painel com o status dos circuitos PRTG de todas as lojas de um Core, obtido em uma única passada."""
+
+    ORDEM_STATUS = {"Down": 0, "Parcial": 1, "Sem circuitos": 2, "Up": 3}
+
+    def __init__(self, app):
+        """
+        Args:
+            app: Instância de AppMonitoramentoLojas (fornece o cliente do PRTG e o índice de lojas).
+        """
+        self.app = app
+        self.em_execucao = False
+        self.fechada = False
+        self.tarefa = None # Consulta em andamento (no gerenciador do app); cancelada ao fechar o painel
+        self.lojas_por_nome_prtg = {}
+        for loja in app.indice_lojas.registros():
+            nome_prtg = app.formatar_nome_loja_para_prtg(loja.get("Nome_Loja", ""))
+            self.lojas_por_nome_prtg.setdefault(str(nome_prtg).strip().lower(), loja)
+
+        self.janela = ttk.Toplevel(app.root)
+        self.janela.title("Painel do Core - Circuitos PRTG")
+        self.janela.geometry("900x600")
+        self.janela.protocol("WM_DELETE_WINDOW", self.fechar)
+
+        cores = sorted({str(loja.get("Core_PRTG", "")).strip() for loja in app.indice_lojas.registros()} - {""})
+        topo_frame = ttk.Frame(self.janela, padding=(10, 10, 10, 5))
+        topo_frame.pack(fill=tk.X)
+        ttk.Label(topo_frame, text="Core PRTG:").pack(side=tk.LEFT)
+        self.core_combo = ttk.Combobox(topo_frame, values=cores, width=25)
+        if app.loja_selecionada is not None and app.loja_selecionada.get("Core_PRTG"):
+            self.core_combo.set(app.loja_selecionada.get("Core_PRTG"))
+        elif cores:
+            self.core_combo.set(cores[0])
+        self.core_combo.pack(side=tk.LEFT, padx=(5, 15))
+        self.core_combo.bind("<Return>", lambda e: self.atualizar())
+        self.atualizar_button = ttk.Button(topo_frame, text="Atualizar", command=self.atualizar, bootstyle="success", width=12)
+        self.atualizar_button.pack(side=tk.LEFT, padx=5)
+
+        colunas = ("id", "loja", "status", "circuitos", "fora", "detalhes")
+        titulos = {"id": "ID", "loja": "Loja (PRTG)", "status": "Status", "circuitos": "Circuitos", "fora": "Fora", "detalhes": "Circuitos fora"}
+        grade_frame = ttk.Frame(self.janela, padding=(10, 0, 10, 0))
+        grade_frame.pack(fill=tk.BOTH, expand=True)
+        self.grade = ttk.Treeview(grade_frame, columns=colunas, show="headings")
+        for coluna in colunas:
+            self.grade.heading(coluna, text=titulos[coluna], command=lambda c=coluna: self.ordenar(c))
+            self.grade.column(coluna, width=360 if coluna == "detalhes" else 90,
+                              anchor=tk.W if coluna in ("loja", "detalhes") else tk.CENTER)
+        self.grade.tag_configure("Up", foreground="#2fb344")
+        self.grade.tag_configure("Parcial", foreground="#f0ad4e")
+        self.grade.tag_configure("Down", foreground="#d9534f")
+        self.grade.tag_configure("Sem circuitos", foreground="#999999")
+        self.grade.bind("<Double-Button-1>", self._abrir_loja)
+        barra = ttk.Scrollbar(grade_frame, orient=tk.VERTICAL, command=self.grade.yview)
+        self.grade.configure(yscrollcommand=barra.set)
+        self.grade.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        barra.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.resumo_var = tk.StringVar(value="Escolha o Core e clique em Atualizar. Duplo clique abre a loja.")
+        ttk.Label(self.janela, textvariable=self.resumo_var, anchor=tk.W, padding=(10, 5)).pack(fill=tk.X)
+        self.ordenacao = ("status", False)
+
+    def atualizar(self):
+        """Busca em segundo plano o status de todas as lojas do Core escolhido."""
+        core = self.core_combo.get().strip()
+        if self.em_execucao or not core:
+            return
+        self.em_execucao = True
+        self.atualizar_button.config(state="disabled")
+        self.resumo_var.set(f"Consultando o Core '{core}' no PRTG...")
+        self.tarefa = self.app.tarefas.submeter(
+            "Painel do Core", self._tarefa_atualizar, core, self.app.prtg_api, alvo=core,
+            ao_terminar=lambda tarefa: self.app.root.after(0, lambda: self._exibir(tarefa))
+        )
+
+    def _tarefa_atualizar(self, tarefa, core, prtg_api):
+        """(Executado no pool de tarefas) Consulta o status de todas as lojas do Core no PRTG."""
+        tarefa.informar(f"Consultando o Core '{core}'...")
+        with prtg_api.cancellable(tarefa.cancelamento):
+            return prtg_api.get_core_circuit_status(core)
+
+    def _exibir(self, tarefa):
+        """Preenche a grade com uma linha por loja (thread da GUI)."""
+        if self.fechada:
+            return
+        self.em_execucao = False
+        self.atualizar_button.config(state="normal")
+        duracao = tarefa.duracao()
+        if tarefa.estado == CANCELADA:
+            self.resumo_var.set("Consulta cancelada.")
+            return
+        resultado = tarefa.resultado
+        if tarefa.erro is not None:
+            resultado = {"success": False, "message": f"Erro inesperado ao consultar o Core '{tarefa.alvo}': {tarefa.erro}", "stores": {}}
+        if not resultado.get("success"):
+            self.resumo_var.set(resultado.get("message", "Falha ao consultar o Core."))
+            return
+
+        self.grade.delete(*self.grade.get_children())
+        contagem = {}
+        for nome_loja, loja in resultado["stores"].items():
+            registro = self.lojas_por_nome_prtg.get(nome_loja.lower())
+            self.grade.insert("", tk.END, tags=(loja["status"],), values=(
+                registro.get("ID_Loja", "") if registro is not None else "",
+                nome_loja, loja["status"], loja["circuits_total"], loja["circuits_down"], ", ".join(loja["down_circuits"])
+            ))
+            contagem[loja["status"]] = contagem.get(loja["status"], 0) + 1
+        self.ordenar(self.ordenacao[0], inverter=False)
+        resumo = ", ".join(f"{status}: {n}" for status, n in sorted(contagem.items(), key=lambda i: self.ORDEM_STATUS.get(i[0], 9)))
+        self.resumo_var.set(f"{resultado.get('message')} {resumo}. Consulta em {duracao:.1f} s.")
+
+    def ordenar(self, coluna, inverter=True):
+        """Ordena a grade pela coluna clicada; a coluna Status segue a gravidade (Down primeiro)."""
+        anterior, decrescente = self.ordenacao
+        if inverter:
+            decrescente = not decrescente if anterior == coluna else False
+        self.ordenacao = (coluna, decrescente)
+        if coluna != "status":
+            ordenar_grade(self.grade, coluna, decrescente)
+            return
+        itens = sorted(self.grade.get_children(""), reverse=decrescente,
+                       key=lambda iid: self.ORDEM_STATUS.get(self.grade.set(iid, "status"), 9))
+        for indice, iid in enumerate(itens):
+            self.grade.move(iid, "", indice)
+
+    def _abrir_loja(self, event=None):
+        """Carrega na janela principal a loja da linha clicada."""
+        selecao = self.grade.selection()
+        if not selecao:
+            return
+        id_loja = self.grade.set(selecao[0], "id")
+        if id_loja:
+            self.app.loja_entry.delete(0, tk.END)
+            self.app.loja_entry.insert(0, id_loja)
+            self.app.buscar_loja()
+
+    def fechar(self):
+        """Fecha o painel e abandona a consulta em andamento."""
+        if self.tarefa is not None:
+            self.app.tarefas.cancelar(self.tarefa.id)
+        self.fechada = True
+        self.janela.destroy()
+
+def formatar_metrica(nome, valor):
+    """Formata um valor de métrica para exibição, conforme a unidade indicada no nome."""
+    if valor is None:
+        return "-"
+    if nome.endswith("_seconds"):
+        return f"{valor * 1000:.1f} ms" if valor < 10 else f"{valor:.1f} s"
+    if nome.endswith("_ms"):
+        return f"{valor:.1f} ms"
+    if "bytes" in nome:
+        for unidade in ("B", "KB", "MB"):
+            if valor < 1024:
+                return f"{valor:.0f} {unidade}"
+            valor /= 1024
+        return f"{valor:.1f} GB"
+    return f"{valor:g}"
+
+class JanelaDiagnostico:
+    """Painel com as métricas internas (requisições ao PRTG, pings e caches), atualizado periodicamente."""
+
+    INTERVALO_ATUALIZACAO_MS = 2000
+
+    def __init__(self, app):
+        """
+        Args:
+            app: Instância de AppMonitoramentoLojas (janela pai).
+        """
+        self.app = app
+        self.fechada = False
+        self.janela = ttk.Toplevel(app.root)
+        self.janela.title("Diagnóstico - Métricas Internas")
+        self.janela.geometry("950x500")
+        self.janela.protocol("WM_DELETE_WINDOW", self.fechar)
+
+        topo_frame = ttk.Frame(self.janela, padding=(10, 10, 10, 5))
+        topo_frame.pack(fill=tk.X)
+        self.resumo_var = tk.StringVar()
+        ttk.Label(topo_frame, textvariable=self.resumo_var, anchor=tk.W).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        ttk.Button(topo_frame, text="Zerar", command=self.zerar, bootstyle="danger-outline", width=10).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(topo_frame, text="Exportar...", command=self.exportar, bootstyle="info", width=12).pack(side=tk.RIGHT, padx=5)
+
+        colunas = ("metrica", "rotulos", "n", "media", "p50", "p95", "maximo")
+        titulos = {"metrica": "Métrica", "rotulos": "Rótulos", "n": "Qtd / Total", "media": "Média",
+                   "p50": "p50", "p95": "p95", "maximo": "Máximo"}
+        grade_frame = ttk.Frame(self.janela, padding=(10, 0, 10, 10))
+        grade_frame.pack(fill=tk.BOTH, expand=True)
+        self.grade = ttk.Treeview(grade_frame, columns=colunas, show="headings")
+        for coluna in colunas:
+            self.grade.heading(coluna, text=titulos[coluna])
+            self.grade.column(coluna, width={"metrica": 190, "rotulos": 250}.get(coluna, 85),
+                              anchor=tk.W if coluna in ("metrica", "rotulos") else tk.E)
+        barra = ttk.Scrollbar(grade_frame, orient=tk.VERTICAL, command=self.grade.yview)
+        self.grade.configure(yscrollcommand=barra.set)
+        self.grade.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        barra.pack(side=tk.RIGHT, fill=tk.Y)
+        self.atualizar()
+
+    def atualizar(self):
+        """Atualiza as linhas no lugar (mantém seleção e rolagem) e reagenda a próxima leitura."""
+        if self.fechada:
+            return
+        vistos = set()
+        for linha in METRICAS.instantaneo():
+            nome = linha["nome"]
+            rotulos = ", ".join(f"{chave}={valor}" for chave, valor in linha["rotulos"].items())
+            if linha["tipo"] == HISTOGRAMA:
+                valores = (nome, rotulos, linha["n"], formatar_metrica(nome, linha["media"]),
+                           formatar_metrica(nome, linha["p50"]), formatar_metrica(nome, linha["p95"]),
+                           formatar_metrica(nome, linha["maximo"]))
+            else:
+                valores = (nome, rotulos, formatar_metrica(nome, linha["valor"]), "", "", "", "")
+            iid = f"{nome}|{rotulos}"
+            vistos.add(iid)
+            if self.grade.exists(iid):
+                self.grade.item(iid, values=valores)
+            else:
+                self.grade.insert("", tk.END, iid=iid, values=valores)
+        for iid in set(self.grade.get_children("")) - vistos:
+            self.grade.delete(iid)
+
+        taxas = METRICAS.taxa_acerto("cache_requests_total", "cache")
+        acertos = ", ".join(f"{cache}: {taxa:.0%}" for cache, taxa in sorted(taxas.items())) or "sem consultas"
+        desde = time.strftime("%H:%M:%S", time.localtime(METRICAS.inicio))
+        self.resumo_var.set(f"Desde {desde}. Acertos de cache: {acertos}.")
+        self.janela.after(self.INTERVALO_ATUALIZACAO_MS, self.atualizar)
+
+    def exportar(self):
+        """Grava as métricas em arquivo: texto do Prometheus (.prom) ou JSON (.json)."""
+        caminho = filedialog.asksaveasfilename(
+            parent=self.janela, title="Exportar métricas", defaultextension=".prom",
+            filetypes=[("Prometheus (textfile)", "*.prom"), ("JSON", "*.json")]
+        )
+        if not caminho:
+            return
+        try:
+            METRICAS.exportar(caminho)
+        except OSError as e:
+            messagebox.showerror("Erro", f"Não foi possível exportar as métricas: {e}", parent=self.janela)
+
+    def zerar(self):
+        """Descarta os valores acumulados, para medir um trecho de uso a partir de agora."""
+        METRICAS.zerar()
+        self.grade.delete(*self.grade.get_children(""))
+        self.resumo_var.set("")
+
+    def fechar(self):
+        self.fechada = True
+        self.janela.destroy()
+
 # --- Bloco de Execução Principal (__main__) ---
 if __name__ == "__main__":
     # Verificação e tentativa de instalação de dependências
     dependencias = {
-        "pandas": "pandas", 
         "requests": "requests", 
         "ttkbootstrap": "ttkbootstrap"
     }
     faltando = []
     try:
-        import importlib
+        import importlib.util
+        # find_spec apenas localiza o pacote, sem executá-lo: a importação real fica para o primeiro uso
         for nome_modulo_import, nome_pacote_pip in dependencias.items():
-            try:
-                importlib.import_module(nome_modulo_import)
-            except ImportError:
+            if importlib.util.find_spec(nome_modulo_import) is None:
                 faltando.append(nome_pacote_pip)
     except ImportError:
         # Caso raro onde o próprio importlib não está disponível (Python muito antigo/quebrado)
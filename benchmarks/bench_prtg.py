@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark do cliente do PRTG (prtg_API.PRTGAPI) contra o servidor simulado deste diretório.
+
+Para cada escala, sobe o servidor em um processo separado (assim o custo dele não entra no tempo
+nem na memória medidos) e mede cada operação: tempo de parede (mediana e mínimo de N repetições),
+requisições e bytes recebidos (pelas métricas do próprio cliente) e pico de memória alocada
+(tracemalloc, em uma execução à parte). Os resultados são comparados com baseline.json; qualquer
+regressão acima da tolerância faz o comando terminar com código 1.
+
+Exemplos:
+    python benchmarks/bench_prtg.py
+    python benchmarks/bench_prtg.py --escalas pequena,media,grande --latencia-ms 40
+    python benchmarks/bench_prtg.py --salvar-baseline
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIRETORIO))
+
+from metricas import METRICAS
+from prtg_API import PRTGAPI
+
+CAMINHO_BASELINE = os.path.join(DIRETORIO, "baseline.json")
+CAMINHO_SERVIDOR = os.path.join(DIRETORIO, "servidor_prtg_falso.py")
+
+# Cores, lojas por Core, dispositivos por loja e sensores por dispositivo
+ESCALAS = {
+    "pequena": {"cores": 2, "lojas": 20, "dispositivos": 2, "sensores": 5},
+    "media": {"cores": 5, "lojas": 200, "dispositivos": 3, "sensores": 8},
+    "grande": {"cores": 10, "lojas": 500, "dispositivos": 4, "sensores": 10},
+}
+
+# (nome, chamada, reaproveita o cliente): sem reaproveitar, cada repetição usa um PRTGAPI novo (caches frios)
+OPERACOES = (
+    ("test_connection", lambda api, alvo: api.test_connection(), False),
+    ("get_device_by_core", lambda api, alvo: api.get_device_by_core(alvo["core"], alvo["loja"]), False),
+    ("get_circuit_info", lambda api, alvo: api.get_circuit_info(alvo["loja"], alvo["core"]), False),
+    ("get_circuit_info (cache)", lambda api, alvo: api.get_circuit_info(alvo["loja"], alvo["core"]), True),
+    ("get_core_circuit_status", lambda api, alvo: api.get_core_circuit_status(alvo["core"]), False),
+    ("sync_topology", lambda api, alvo: api.sync_topology(), False),
+)
+
+def _soma_metrica(nome):
+    return sum(linha["valor"] for linha in METRICAS.instantaneo() if linha["nome"] == nome)
+
+def _sucesso(resultado):
+    if isinstance(resultado, tuple):
+        return bool(resultado[0])
+    if isinstance(resultado, dict) and "success" in resultado:
+        return bool(resultado["success"])
+    return resultado is not None
+
+@contextlib.contextmanager
+def servidor_simulado(escala, latencia_ms):
+    """Sobe o servidor simulado em outro processo e devolve a URL dele."""
+    argumentos = [sys.executable, CAMINHO_SERVIDOR, "--latencia-ms", str(latencia_ms)]
+    for parametro, valor in escala.items():
+        argumentos += [f"--{parametro}", str(valor)]
+    processo = subprocess.Popen(argumentos, stdout=subprocess.PIPE, text=True)
+    try:
+        url = processo.stdout.readline().strip()
+        if not url:
+            raise RuntimeError("O servidor simulado não informou a URL.")
+        yield url
+    finally:
+        processo.terminate()
+        processo.wait(timeout=10)
+
+def medir(operacao, url, alvo, repeticoes):
+    """
+    Executa uma operação `repeticoes` vezes e devolve as medidas.
+
+    Returns:
+        Dicionário com tempo_ms (mediana), tempo_min_ms, requisicoes e bytes (por execução),
+        pico_kb (tracemalloc) e ok (a operação teve sucesso).
+    """
+    _, executar, reaproveitar = operacao
+
+    def criar_api():
+        return PRTGAPI(url, "benchmark", "0", timeout=120)
+
+    api = criar_api() if reaproveitar else None
+    if reaproveitar:
+        executar(api, alvo) # Preenche os caches antes de medir
+
+    tempos = []
+    requisicoes = tamanho = 0
+    resultado = None
+    for _ in range(repeticoes):
+        cliente = api if reaproveitar else criar_api()
+        requisicoes_antes = _soma_metrica("prtg_requests_total")
+        bytes_antes = _soma_metrica("prtg_response_bytes_total")
+        inicio = time.perf_counter()
+        resultado = executar(cliente, alvo)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        requisicoes = _soma_metrica("prtg_requests_total") - requisicoes_antes
+        tamanho = _soma_metrica("prtg_response_bytes_total") - bytes_antes
+
+    # Memória em uma execução separada: o tracemalloc deixa o código bem mais lento
+    cliente = api if reaproveitar else criar_api()
+    tracemalloc.start()
+    try:
+        executar(cliente, alvo)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "tempo_ms": round(statistics.median(tempos), 2),
+        "tempo_min_ms": round(min(tempos), 2),
+        "requisicoes": requisicoes,
+        "bytes": tamanho,
+        "pico_kb": round(pico / 1024, 1),
+        "ok": _sucesso(resultado),
+    }
+
+def executar_escala(nome_escala, latencia_ms, repeticoes):
+    escala = ESCALAS[nome_escala]
+    numero_loja = escala["cores"] * escala["lojas"] # Última loja do último Core
+    alvo = {"core": f"CORE-{escala['cores']:02d}", "loja": f"LJ{numero_loja:03d}"}
+    resultados = {}
+    with servidor_simulado(escala, latencia_ms) as url:
+        for operacao in OPERACOES:
+            # Mensagens do cliente (print) vão para o stderr; o stdout fica com a tabela
+            with contextlib.redirect_stdout(sys.stderr):
+                resultados[operacao[0]] = medir(operacao, url, alvo, repeticoes)
+            medida = resultados[operacao[0]]
+            print(f"  {operacao[0]:<26} {medida['tempo_ms']:>10.1f} ms {medida['requisicoes']:>6} req "
+                  f"{medida['bytes'] / 1024:>10.1f} KB {medida['pico_kb']:>10.1f} KB pico"
+                  f"{'' if medida['ok'] else '  (falhou)'}", flush=True)
+    return resultados
+
+def comparar(atual, baseline, tolerancia, tolerancia_memoria, piso_ms=5.0, piso_kb=64.0):
+    """
+    Lista as regressões de `atual` em relação à baseline (tempo, requisições e memória).
+
+    Diferenças menores que `piso_ms` e `piso_kb` são ignoradas: em operações de poucos
+    milissegundos ou kilobytes, o ruído sozinho passaria da tolerância percentual.
+    """
+    regressoes = []
+    for nome_escala, operacoes in atual.items():
+        for nome, medida in operacoes.items():
+            base = baseline.get(nome_escala, {}).get(nome)
+            if base is None:
+                continue
+            if medida["tempo_ms"] > base["tempo_ms"] * (1 + tolerancia) and medida["tempo_ms"] - base["tempo_ms"] > piso_ms:
+                regressoes.append(f"{nome_escala}/{nome}: tempo {base['tempo_ms']:.1f} -> {medida['tempo_ms']:.1f} ms")
+            if medida["requisicoes"] > base["requisicoes"]:
+                regressoes.append(f"{nome_escala}/{nome}: requisições {base['requisicoes']} -> {medida['requisicoes']}")
+            if medida["pico_kb"] > base["pico_kb"] * (1 + tolerancia_memoria) and medida["pico_kb"] - base["pico_kb"] > piso_kb:
+                regressoes.append(f"{nome_escala}/{nome}: pico de memória {base['pico_kb']:.0f} -> {medida['pico_kb']:.0f} KB")
+            if base.get("ok") and not medida["ok"]:
+                regressoes.append(f"{nome_escala}/{nome}: passou a falhar")
+    return regressoes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do cliente do PRTG contra um servidor simulado.")
+    parser.add_argument("--escalas", default="pequena,media", help=f"Escalas separadas por vírgula ({', '.join(ESCALAS)}).")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="Latência simulada por requisição.")
+    parser.add_argument("--baseline", default=CAMINHO_BASELINE)
+    parser.add_argument("--salvar-baseline", action="store_true", help="Grava os resultados como nova baseline.")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Piora de tempo aceita (0.25 = 25%%).")
+    parser.add_argument("--tolerancia-memoria", type=float, default=0.10, help="Aumento de pico de memória aceito.")
+    parser.add_argument("--saida", help="Grava os resultados desta execução em JSON.")
+    args = parser.parse_args(argv)
+
+    escalas = [nome.strip() for nome in args.escalas.split(",") if nome.strip()]
+    desconhecidas = [nome for nome in escalas if nome not in ESCALAS]
+    if desconhecidas:
+        parser.error(f"escala desconhecida: {', '.join(desconhecidas)}")
+
+    resultados = {}
+    for nome_escala in escalas:
+        print(f"Escala '{nome_escala}' {ESCALAS[nome_escala]}, latência {args.latencia_ms:g} ms:", flush=True)
+        resultados[nome_escala] = executar_escala(nome_escala, args.latencia_ms, args.repeticoes)
+
+    documento = {
+        "gerado_em": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "latencia_ms": args.latencia_ms,
+        "repeticoes": args.repeticoes,
+        "resultados": resultados,
+    }
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(documento, arquivo, ensure_ascii=False, indent=2)
+
+    codigo = 0
+    if args.salvar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as arquivo:
+            json.dump(documento, arquivo, ensure_ascii=False, indent=2)
+        print(f"Baseline gravada em {args.baseline}.")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as arquivo:
+            baseline = json.load(arquivo)
+        if baseline.get("latencia_ms") != args.latencia_ms:
+            print(f"A baseline foi gerada com latência {baseline.get('latencia_ms')} ms; comparação ignorada.")
+        else:
+            regressoes = comparar(resultados, baseline.get("resultados", {}), args.tolerancia, args.tolerancia_memoria)
+            for regressao in regressoes:
+                print(f"REGRESSÃO {regressao}")
+            if regressoes:
+                codigo = 1
+            else:
+                print(f"Sem regressões em relação à baseline de {baseline.get('gerado_em')}.")
+    return codigo
+
+if __name__ == "__main__":
+    sys.exit(main())
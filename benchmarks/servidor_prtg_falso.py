@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Servidor HTTP local que imita o /api/table.json do PRTG, para medir o cliente sem um PRTG real.
+
+A árvore é gerada de forma determinística (semente fixa): Cores -> Lojas (LJ001, LJ002...) ->
+Dispositivos -> Sensores. O primeiro sensor de cada dispositivo tem o nome do dispositivo (é o
+"circuito" para o prtg_API) e uma fração deles fica Down. Suporta os parâmetros usados pelo
+cliente: content, columns, count/start (com treesize), id (recursivo), filter_name,
+filter_device e filter_parentid, com @sub() ou valor exato.
+
+Uso isolado:
+    python benchmarks/servidor_prtg_falso.py --cores 5 --lojas 200 --latencia-ms 50
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+STATUS_UP = ("Up", 3)
+STATUS_DOWN = ("Down", 5)
+
+class ArvorePRTG:
+    """Grupos, dispositivos e sensores gerados, com índices para responder filtros sem varrer tudo."""
+
+    def __init__(self, cores=2, lojas=20, dispositivos=2, sensores=5, fracao_down=0.1, semente=42):
+        self.tabelas = {"groups": [], "devices": [], "sensors": []}
+        self._pais = {}
+        self._subarvores = {} # (conteúdo, objid) -> linhas abaixo do objeto, para o filtro id=
+        aleatorio = random.Random(semente)
+        proximo_id = [1000]
+
+        def novo_id(pai):
+            proximo_id[0] += 1
+            self._pais[proximo_id[0]] = pai
+            return proximo_id[0]
+
+        numero_loja = 0
+        for c in range(cores):
+            nome_core = f"CORE-{c + 1:02d}"
+            core_id = novo_id(0)
+            self.tabelas["groups"].append({"objid": core_id, "name": nome_core, "parentid": 0})
+            for _ in range(lojas):
+                numero_loja += 1
+                nome_loja = f"LJ{numero_loja:03d}"
+                loja_id = novo_id(core_id)
+                self.tabelas["groups"].append({"objid": loja_id, "name": nome_loja, "parentid": core_id})
+                for d in range(dispositivos):
+                    nome_dispositivo = f"{nome_loja}-LINK{d + 1}"
+                    dispositivo_id = novo_id(loja_id)
+                    self.tabelas["devices"].append({
+                        "objid": dispositivo_id, "device": nome_dispositivo, "parentid": loja_id,
+                        "host": f"10.{c}.{numero_loja % 256}.{d + 1}",
+                        # get_device_by_core procura o nome do Core na coluna group do dispositivo
+                        "group": f"{nome_core} / {nome_loja}", "group_raw": nome_loja,
+                        "status": "Up", "status_raw": 3
+                    })
+                    for s in range(sensores):
+                        status, status_raw = STATUS_DOWN if aleatorio.random() < fracao_down else STATUS_UP
+                        self.tabelas["sensors"].append({
+                            "objid": novo_id(dispositivo_id), "parentid": dispositivo_id,
+                            "sensor": nome_dispositivo if s == 0 else f"Ping {s}",
+                            "status": status, "status_raw": status_raw,
+                            "message": "OK" if status_raw == 3 else "Sem resposta",
+                            "message_raw": "OK" if status_raw == 3 else "Sem resposta",
+                            "lastvalue": f"{aleatorio.randint(1, 80)} ms"
+                        })
+
+        # Pré-calculado para que o custo do servidor não entre na medição do cliente
+        for conteudo, linhas in self.tabelas.items():
+            for linha in linhas:
+                ancestral = linha["parentid"]
+                while ancestral:
+                    self._subarvores.setdefault((conteudo, ancestral), []).append(linha)
+                    ancestral = self._pais.get(ancestral)
+
+    def subarvore(self, conteudo, raiz):
+        # id= no PRTG devolve todos os objetos abaixo da raiz (a própria raiz não entra)
+        return self._subarvores.get((conteudo, raiz), [])
+
+    def consultar(self, parametros):
+        conteudo = parametros.get("content", "")
+        if conteudo not in self.tabelas:
+            return None
+        linhas = self.tabelas[conteudo]
+        if "id" in parametros:
+            linhas = self.subarvore(conteudo, int(parametros["id"]))
+        if "filter_parentid" in parametros:
+            linhas = [linha for linha in linhas if str(linha["parentid"]) == parametros["filter_parentid"]]
+        for filtro, campo in (("filter_name", "name"), ("filter_device", "device")):
+            valor = parametros.get(filtro)
+            if valor is None:
+                continue
+            if valor.startswith("@sub(") and valor.endswith(")"):
+                trecho = valor[5:-1].lower()
+                linhas = [linha for linha in linhas if trecho in str(linha.get(campo, "")).lower()]
+            else:
+                linhas = [linha for linha in linhas if str(linha.get(campo, "")) == valor]
+
+        total = len(linhas)
+        inicio = int(parametros.get("start", 0))
+        quantidade = int(parametros.get("count", 500))
+        colunas = [coluna for coluna in parametros.get("columns", "").split(",") if coluna]
+        pagina = [{coluna: linha.get(coluna) for coluna in colunas} if colunas else linha
+                  for linha in linhas[inicio:inicio + quantidade]]
+        return {"prtg-version": "simulado", "treesize": total, conteudo: pagina}
+
+def criar_servidor(arvore, latencia=0.0, variacao=0.0, porta=0):
+    """
+    Cria (sem iniciar) o servidor HTTP da árvore.
+
+    Args:
+        arvore: ArvorePRTG a servir.
+        latencia: Segundos de espera antes de cada resposta (simula a distância até o PRTG).
+        variacao: Segundos somados aleatoriamente à latência (0 a `variacao`).
+        porta: Porta local; 0 escolhe uma livre.
+
+    Returns:
+        ThreadingHTTPServer; `servidor.requisicoes` conta as requisições atendidas.
+    """
+    lock = threading.Lock()
+
+    class Manipulador(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # Keep-alive, como o PRTG atrás de um proxy
+        disable_nagle_algorithm = True # Cabeçalho e corpo saem em escritas separadas: sem isso, +40 ms por resposta
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with lock:
+                servidor.requisicoes += 1
+            endereco = urlparse(self.path)
+            parametros = {chave: valores[0] for chave, valores in parse_qs(endereco.query).items()}
+            if latencia or variacao:
+                time.sleep(latencia + random.uniform(0, variacao))
+            dados = arvore.consultar(parametros) if endereco.path == "/api/table.json" else None
+            if dados is None:
+                self.send_error(404)
+                return
+            corpo = json.dumps(dados).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), Manipulador)
+    servidor.daemon_threads = True
+    servidor.requisicoes = 0
+    return servidor
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PRTG simulado (table.json) para benchmarks.")
+    parser.add_argument("--cores", type=int, default=2)
+    parser.add_argument("--lojas", type=int, default=20, help="Lojas por Core.")
+    parser.add_argument("--dispositivos", type=int, default=2, help="Dispositivos por loja.")
+    parser.add_argument("--sensores", type=int, default=5, help="Sensores por dispositivo.")
+    parser.add_argument("--latencia-ms", type=float, default=0.0)
+    parser.add_argument("--variacao-ms", type=float, default=0.0)
+    parser.add_argument("--porta", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    arvore = ArvorePRTG(args.cores, args.lojas, args.dispositivos, args.sensores)
+    servidor = criar_servidor(arvore, args.latencia_ms / 1000, args.variacao_ms / 1000, args.porta)
+    # A primeira linha da saída é a URL: o benchmark lê daqui a porta escolhida
+    print(f"http://127.0.0.1:{servidor.server_address[1]}", flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+import threading
+
+class TokenCancelamento:
+    """
+    Sinal de cancelamento de uma operação, com ações registradas para interrompê-la na hora.
+
+    Quem executa a operação registra em `ao_cancelar` o que desbloqueia cada espera em andamento
+    (matar o processo do ping, liberar uma fila, abandonar uma requisição HTTP); `cancelar()` executa
+    todas elas imediatamente, no thread de quem cancelou, em vez de esperar a operação conferir uma flag.
+    """
+
+    def __init__(self):
+        self._evento = threading.Event()
+        self._lock = threading.Lock()
+        self._acoes = {}
+        self._sequencia = itertools.count()
+
+    def cancelado(self):
+        # Método (e não propriedade) para poder ser passado direto como should_stop
+        return self._evento.is_set()
+
+    def cancelar(self):
+        with self._lock:
+            if self._evento.is_set():
+                return
+            self._evento.set()
+            acoes = list(self._acoes.values())
+            self._acoes.clear()
+        for acao in acoes:
+            try:
+                acao()
+            except Exception as e:
+                print(f"Erro ao interromper operação cancelada: {e}")
+
+    def ao_cancelar(self, acao):
+        """
+        Registra `acao` para ser chamada no cancelamento (na hora, se já estiver cancelado).
+
+        Returns:
+            Identificador para `remover` quando a espera correspondente terminar normalmente.
+        """
+        with self._lock:
+            if not self._evento.is_set():
+                identificador = next(self._sequencia)
+                self._acoes[identificador] = acao
+                return identificador
+        acao()
+        return None
+
+    def remover(self, identificador):
+        if identificador is not None:
+            with self._lock:
+                self._acoes.pop(identificador, None)
+
+    def aguardar(self, timeout=None):
+        """Espera o cancelamento por até `timeout` segundos; retorna True se foi cancelado."""
+        return self._evento.wait(timeout)
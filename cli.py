@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+Linha de comando do monitoramento de lojas, sem interface gráfica.
+
+Usa os mesmos componentes da GUI (índice de lojas, PRTGAPI e NetworkTools) e escreve uma linha
+por resultado, em NDJSON ou CSV, assim que cada resultado fica pronto. Não importa tkinter nem
+ttkbootstrap, então roda em servidores sem display e a partir do cron.
+
+Exemplos:
+    python cli.py lojas "centro"
+    python cli.py ping 10.0.0.1 10.0.0.2 --formato csv
+    python cli.py varredura --core CORE-SP --apenas-problemas
+    python cli.py --metricas /var/lib/node_exporter/lojas.prom varredura
+    PRTG_URL=https://prtg PRTG_USUARIO=noc PRTG_PASSHASH=123 python cli.py core CORE-SP
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import signal
+import sys
+import time
+
+from cancelamento import TokenCancelamento
+from indice_lojas import IndiceLojas, carregar_indice_lojas
+from metricas import METRICAS
+from network_tools import NetworkTools
+from tabela_lojas import COLUNAS_LOJA, ler_lojas_csv, nome_loja_prtg
+from varredura import STATUS_ONLINE, STATUS_SEM_NUMERO, VMS_LOJA, filtrar_lojas, numero_da_loja, varrer_lojas
+
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_LOJAS_CSV = os.path.join(DIRETORIO_BASE, "data", "lojas.csv")
+CAMINHO_TOPOLOGIA_PRTG = os.path.join(DIRETORIO_BASE, "data", "prtg_topologia.json")
+
+CAMPOS_PING = ["host", "success", "min_time", "avg_time", "max_time", "packet_loss", "error"]
+CAMPOS_VARREDURA = ["ID_Loja", "Nome_Loja", "Core_PRTG", "Estado", "numero", "status"] + [f"{nome_vm}_ms" for nome_vm, _ in VMS_LOJA]
+CAMPOS_CIRCUITOS = ["ID_Loja", "loja_prtg", "core", "device_name", "device_host", "device_status",
+                    "circuit", "status", "message", "lastvalue", "error"]
+CAMPOS_CORE = ["core", "loja_prtg", "ID_Loja", "group_id", "status", "circuits_total", "circuits_down", "down_circuits"]
+
+class SaidaLinhas:
+    """Escreve registros como NDJSON (um objeto JSON por linha) ou CSV, descarregando a cada linha."""
+
+    def __init__(self, arquivo, formato, campos):
+        self.arquivo = arquivo
+        self.formato = formato
+        self.campos = campos
+        self._escritor_csv = None
+
+    def escrever(self, linha):
+        if self.formato == "csv":
+            if self._escritor_csv is None:
+                self._escritor_csv = csv.DictWriter(self.arquivo, fieldnames=self.campos, extrasaction="ignore")
+                self._escritor_csv.writeheader()
+            self._escritor_csv.writerow(linha)
+        else:
+            self.arquivo.write(json.dumps(linha, ensure_ascii=False) + "\n")
+        self.arquivo.flush()
+
+def carregar_indice(caminho_csv):
+    """Carrega o índice de lojas pelo mesmo cache binário usado pela GUI."""
+    if not os.path.exists(caminho_csv):
+        print(f"Arquivo de dados não encontrado: {caminho_csv}", file=sys.stderr)
+        return IndiceLojas([])
+    avisos = []
+    indice = carregar_indice_lojas(caminho_csv, lambda caminho: ler_lojas_csv(caminho, avisos))
+    for aviso in avisos:
+        print(f"Aviso: {aviso}", file=sys.stderr)
+    return indice
+
+def criar_prtg(args):
+    """Cria o cliente do PRTG a partir dos argumentos/variáveis de ambiente e carrega o snapshot local."""
+    from prtg_API import PRTGAPI # Só os comandos do PRTG precisam de requests
+    prtg_api = PRTGAPI(args.prtg_url, args.prtg_usuario, args.prtg_passhash)
+    # Processo de vida curta: usa o snapshot como está, sem revalidação em segundo plano
+    prtg_api.load_topology(args.topologia, revalidate=False)
+    return prtg_api
+
+@contextlib.contextmanager
+def cancelamento_ctrl_c():
+    """
+    Token cancelado pelo Ctrl-C: os pings em andamento são mortos e o comando encerra na hora, em vez
+    de o KeyboardInterrupt esperar cada processo de ping terminar. Ao sair, um Ctrl-C recebido vira
+    KeyboardInterrupt (código 130 em main).
+    """
+    token = TokenCancelamento()
+    anterior = signal.signal(signal.SIGINT, lambda sinal, quadro: token.cancelar())
+    try:
+        yield token
+    finally:
+        signal.signal(signal.SIGINT, anterior)
+    if token.cancelado():
+        raise KeyboardInterrupt
+
+def comando_lojas(args, saida):
+    indice = carregar_indice(args.csv_lojas)
+    escritor = SaidaLinhas(saida, args.formato, list(COLUNAS_LOJA))
+    for loja in indice.buscar(args.termo)[:args.limite]:
+        escritor.escrever(loja.para_dict() if hasattr(loja, "para_dict") else dict(loja))
+    return 0
+
+def comando_ping(args, saida):
+    escritor = SaidaLinhas(saida, args.formato, CAMPOS_PING)
+    falhas = 0
+
+    def ao_receber(host, resultado):
+        nonlocal falhas
+        falhas += not resultado.get("success")
+        escritor.escrever({campo: resultado.get(campo) for campo in CAMPOS_PING} | {"host": host})
+
+    with cancelamento_ctrl_c() as cancelamento:
+        NetworkTools().ping_hosts_concurrently(args.hosts, count=args.count, timeout=args.timeout,
+                                               on_result=ao_receber, cancel_token=cancelamento)
+    return 1 if falhas else 0
+
+def comando_varredura(args, saida):
+    indice = carregar_indice(args.csv_lojas)
+    lojas = filtrar_lojas(indice.registros(), core=args.core, estado=args.estado)
+    escritor = SaidaLinhas(saida, args.formato, CAMPOS_VARREDURA)
+    vms_por_loja = {}
+    problemas = 0
+
+    def escrever_loja(loja, numero, status, vms):
+        nonlocal problemas
+        problemas += status != STATUS_ONLINE
+        if args.apenas_problemas and status == STATUS_ONLINE:
+            return
+        linha = {coluna: loja.get(coluna, "") for coluna in ("ID_Loja", "Nome_Loja", "Core_PRTG", "Estado")}
+        linha.update({"numero": numero, "status": status})
+        for nome_vm, _ in VMS_LOJA:
+            resultado = vms.get(nome_vm) or {}
+            linha[f"{nome_vm}_ms"] = resultado.get("avg_time") if resultado.get("success") else None
+        escritor.escrever(linha)
+
+    for loja in lojas:
+        if numero_da_loja(loja) is None:
+            escrever_loja(loja, None, STATUS_SEM_NUMERO, {})
+
+    def ao_resultado(posicao, nome_vm, resultado, status):
+        vms_por_loja.setdefault(posicao, {})[nome_vm] = resultado
+        if status is not None:
+            loja = lojas[posicao]
+            escrever_loja(loja, numero_da_loja(loja), status, vms_por_loja.pop(posicao))
+
+    inicio = time.perf_counter()
+    with cancelamento_ctrl_c() as cancelamento:
+        varrer_lojas(NetworkTools(), lojas, count=args.count, timeout=args.timeout, ao_resultado=ao_resultado,
+                     cancelamento=cancelamento)
+    print(f"{len(lojas)} loja(s) varrida(s) em {time.perf_counter() - inicio:.1f} s; {problemas} com problema.",
+          file=sys.stderr)
+    return 1 if problemas else 0
+
+def comando_circuitos(args, saida):
+    indice = carregar_indice(args.csv_lojas)
+    lojas = indice.buscar(args.termo)[:args.limite]
+    if not lojas:
+        print(f"Nenhuma loja encontrada para '{args.termo}'.", file=sys.stderr)
+        return 1
+    prtg_api = criar_prtg(args)
+    escritor = SaidaLinhas(saida, args.formato, CAMPOS_CIRCUITOS)
+    falhas = 0
+    for loja in lojas:
+        loja_prtg = nome_loja_prtg(loja.get("Nome_Loja", ""))
+        core = loja.get("Core_PRTG", "")
+        base = {"ID_Loja": loja.get("ID_Loja", ""), "loja_prtg": loja_prtg, "core": core}
+        resultado = prtg_api.get_circuit_info(loja_prtg, core)
+        if not resultado.get("success"):
+            falhas += 1
+            escritor.escrever(base | {"error": resultado.get("message")})
+            continue
+        for dispositivo in resultado["devices_circuits"]:
+            for circuito in dispositivo["circuits"]:
+                escritor.escrever(base | {
+                    "device_name": dispositivo.get("device_name"),
+                    "device_host": dispositivo.get("device_host"),
+                    "device_status": dispositivo.get("device_status"),
+                    "circuit": circuito.get("name"),
+                    "status": circuito.get("status"),
+                    "message": circuito.get("message"),
+                    "lastvalue": circuito.get("lastvalue")
+                })
+    prtg_api.save_topology()
+    return 1 if falhas else 0
+
+def comando_core(args, saida):
+    prtg_api = criar_prtg(args)
+    resultado = prtg_api.get_core_circuit_status(args.core)
+    if not resultado.get("success"):
+        print(resultado.get("message"), file=sys.stderr)
+        return 1
+    indice = carregar_indice(args.csv_lojas) if os.path.exists(args.csv_lojas) else IndiceLojas([])
+    ids_por_nome_prtg = {}
+    for loja in indice.registros():
+        ids_por_nome_prtg.setdefault(nome_loja_prtg(loja.get("Nome_Loja", "")).lower(), loja.get("ID_Loja", ""))
+
+    escritor = SaidaLinhas(saida, args.formato, CAMPOS_CORE)
+    for nome_loja, loja in resultado["stores"].items():
+        escritor.escrever({
+            "core": args.core,
+            "loja_prtg": nome_loja,
+            "ID_Loja": ids_por_nome_prtg.get(nome_loja.lower(), ""),
+            "group_id": loja["group_id"],
+            "status": loja["status"],
+            "circuits_total": loja["circuits_total"],
+            "circuits_down": loja["circuits_down"],
+            "down_circuits": ";".join(loja["down_circuits"])
+        })
+    prtg_api.save_topology()
+    print(resultado.get("message"), file=sys.stderr)
+    return 0
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Consultas e testes de lojas sem interface gráfica.")
+    parser.add_argument("--formato", choices=("ndjson", "csv"), default="ndjson", help="Formato da saída (padrão: ndjson).")
+    parser.add_argument("--csv-lojas", default=CAMINHO_LOJAS_CSV, help="Caminho do lojas.csv.")
+    parser.add_argument("--metricas", metavar="ARQUIVO",
+                        help="Ao terminar, grava as métricas de PRTG, ping e cache (.json ou texto do Prometheus).")
+
+    prtg = argparse.ArgumentParser(add_help=False)
+    prtg.add_argument("--prtg-url", default=os.environ.get("PRTG_URL"), help="URL do PRTG (ou variável PRTG_URL).")
+    prtg.add_argument("--prtg-usuario", default=os.environ.get("PRTG_USUARIO"), help="Usuário do PRTG (ou PRTG_USUARIO).")
+    prtg.add_argument("--prtg-passhash", default=os.environ.get("PRTG_PASSHASH"), help="Passhash do PRTG (ou PRTG_PASSHASH).")
+    prtg.add_argument("--topologia", default=CAMINHO_TOPOLOGIA_PRTG, help="Snapshot local da topologia do PRTG.")
+
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    lojas = subparsers.add_parser("lojas", help="Busca lojas pelo ID exato ou por parte do nome.")
+    lojas.add_argument("termo")
+    lojas.add_argument("--limite", type=int, default=50)
+    lojas.set_defaults(funcao=comando_lojas)
+
+    ping = subparsers.add_parser("ping", help="Pinga vários hosts ao mesmo tempo.")
+    ping.add_argument("hosts", nargs="+")
+    ping.add_argument("--count", type=int, default=4)
+    ping.add_argument("--timeout", type=float, default=2)
+    ping.set_defaults(funcao=comando_ping)
+
+    varredura = subparsers.add_parser("varredura", help="Pinga as VMs (192.168.N.1-4) de todas as lojas.")
+    varredura.add_argument("--core", help="Filtra pelo Core_PRTG.")
+    varredura.add_argument("--estado", help="Filtra pelo Estado.")
+    varredura.add_argument("--count", type=int, default=2)
+    varredura.add_argument("--timeout", type=float, default=1)
+    varredura.add_argument("--apenas-problemas", action="store_true", help="Omite as lojas com todas as VMs online.")
+    varredura.set_defaults(funcao=comando_varredura)
+
+    circuitos = subparsers.add_parser("circuitos", parents=[prtg], help="Circuitos PRTG das lojas encontradas.")
+    circuitos.add_argument("termo")
+    circuitos.add_argument("--limite", type=int, default=1, help="Máximo de lojas consultadas (padrão: 1).")
+    circuitos.set_defaults(funcao=comando_circuitos, requer_prtg=True)
+
+    core = subparsers.add_parser("core", parents=[prtg], help="Status dos circuitos de todas as lojas de um Core.")
+    core.add_argument("core")
+    core.set_defaults(funcao=comando_core, requer_prtg=True)
+    return parser
+
+def main(argv=None):
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "requer_prtg", False) and not (args.prtg_url and args.prtg_usuario and args.prtg_passhash):
+        parser.error("informe --prtg-url, --prtg-usuario e --prtg-passhash (ou PRTG_URL, PRTG_USUARIO e PRTG_PASSHASH).")
+
+    saida = sys.stdout
+    try:
+        # Mensagens dos módulos compartilhados (print) vão para o stderr; o stdout fica só com os dados
+        with contextlib.redirect_stdout(sys.stderr):
+            return args.funcao(args, saida)
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # Leitor fechou a saída (ex.: "| head"): encerra sem rastro de erro
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    finally:
+        if args.metricas:
+            try:
+                METRICAS.exportar(args.metricas)
+            except OSError as e:
+                print(f"Erro ao gravar as métricas em {args.metricas}: {e}", file=sys.stderr)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+RESOLUCOES = (60, 900, 3600) # Agregados de 1 minuto, 15 minutos e 1 hora
+
+# Por quanto tempo cada nível é mantido (segundos); amostras brutas ficam só para o detalhe recente
+RETENCAO_PADRAO = {
+    "bruto": 2 * 86400,
+    60: 14 * 86400,
+    900: 120 * 86400,
+    3600: 2 * 365 * 86400
+}
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    loja TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    alvo TEXT NOT NULL,
+    UNIQUE (loja, tipo, alvo)
+);
+CREATE TABLE IF NOT EXISTS amostras (
+    serie_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    sucesso INTEGER NOT NULL,
+    valor REAL,
+    perda REAL
+);
+CREATE INDEX IF NOT EXISTS amostras_serie_ts ON amostras (serie_id, ts);
+CREATE INDEX IF NOT EXISTS amostras_ts ON amostras (ts);
+CREATE TABLE IF NOT EXISTS agregados (
+    serie_id INTEGER NOT NULL,
+    resolucao INTEGER NOT NULL,
+    inicio INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    ok INTEGER NOT NULL,
+    n_valor INTEGER NOT NULL,
+    soma REAL NOT NULL,
+    minimo REAL,
+    maximo REAL,
+    PRIMARY KEY (serie_id, resolucao, inicio)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS agregados_resolucao_inicio ON agregados (resolucao, inicio);
+"""
+
+_UPSERT_AGREGADO = """
+INSERT INTO agregados (serie_id, resolucao, inicio, n, ok, n_valor, soma, minimo, maximo)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (serie_id, resolucao, inicio) DO UPDATE SET
+    n = n + excluded.n,
+    ok = ok + excluded.ok,
+    n_valor = n_valor + excluded.n_valor,
+    soma = soma + excluded.soma,
+    minimo = MIN(COALESCE(minimo, excluded.minimo), COALESCE(excluded.minimo, minimo)),
+    maximo = MAX(COALESCE(maximo, excluded.maximo), COALESCE(excluded.maximo, maximo))
+"""
+
+def extrair_valor(texto):
+    """Primeiro número de um lastvalue do PRTG (ex.: '12 ms', '1.234,5 kbit/s'), ou None."""
+    if texto is None:
+        return None
+    if isinstance(texto, (int, float)):
+        return float(texto)
+    match = re.search(r'[-+]?\d[\d.,]*', str(texto))
+    if not match:
+        return None
+    numero = match.group().rstrip(".,")
+    if "," in numero:
+        numero = numero.replace(".", "").replace(",", ".") # Formato pt-BR: 1.234,5
+    try:
+        return float(numero)
+    except ValueError:
+        return None
+
+class HistoricoResultados:
+    """
+    Histórico local dos resultados de ping e dos circuitos PRTG, em SQLite (modo WAL).
+
+    As amostras são acumuladas em memória e gravadas em lote por um thread próprio, que na mesma
+    transação atualiza os agregados de 1 min, 15 min e 1 h. Consultas de tendência leem apenas os
+    agregados (pela chave primária), então o tempo de resposta não depende do volume acumulado.
+    A retenção é aplicada por idade em cada nível e, se o arquivo passar de `tamanho_maximo_mb`,
+    os dados mais antigos são descartados até voltar ao limite.
+    """
+
+    def __init__(self, caminho, lote=500, intervalo_gravacao=2.0, tamanho_maximo_mb=200,
+                 retencao=None, intervalo_limpeza=600):
+        """
+        Args:
+            caminho: Arquivo SQLite do histórico.
+            lote: Quantidade de amostras que dispara uma gravação antecipada.
+            intervalo_gravacao: Segundos máximos que uma amostra espera em memória.
+            tamanho_maximo_mb: Tamanho máximo aproximado do banco.
+            retencao: Dicionário no formato de RETENCAO_PADRAO, para sobrescrever as idades.
+            intervalo_limpeza: Segundos entre aplicações da retenção.
+        """
+        self.caminho = caminho
+        self.lote = lote
+        self.intervalo_gravacao = intervalo_gravacao
+        self.tamanho_maximo = tamanho_maximo_mb * 1024 * 1024
+        self.retencao = {**RETENCAO_PADRAO, **(retencao or {})}
+        self.intervalo_limpeza = intervalo_limpeza
+        self._pendentes = []
+        self._lock = threading.Lock()
+        self._lock_gravacao = threading.Lock() # Serializa o uso da conexão de escrita
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._series = {} # (loja, tipo, alvo) -> id
+        self._ultima_limpeza = 0.0
+
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        self._conexao = self._conectar()
+        # auto_vacuum precisa vir antes de qualquer escrita (em um banco já existente não tem efeito);
+        # o modo WAL fica gravado no arquivo e vale também para as conexões de leitura
+        self._conexao.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._conexao.execute("PRAGMA journal_mode = WAL")
+        self._conexao.execute("PRAGMA synchronous = NORMAL")
+        self._conexao.executescript(_ESQUEMA)
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+        self._thread.start()
+
+    def _conectar(self):
+        return sqlite3.connect(self.caminho, timeout=10, check_same_thread=False)
+
+    # --- Registro de amostras (qualquer thread) ---
+    def registrar(self, loja, tipo, alvo, sucesso, valor=None, perda=None, ts=None):
+        with self._lock:
+            self._pendentes.append((str(loja), tipo, str(alvo), int(ts or time.time()), 1 if sucesso else 0, valor, perda))
+            cheio = len(self._pendentes) >= self.lote
+        if cheio:
+            self._acordar.set()
+
+    def registrar_ping(self, loja, host, resultado):
+        """Registra um resultado de NetworkTools.ping_host (valor = tempo médio em ms)."""
+        self.registrar(loja, "ping", host, resultado.get("success"),
+                       extrair_valor(resultado.get("avg_time")), extrair_valor(resultado.get("packet_loss")))
+
+    def registrar_circuitos(self, loja, devices_circuits):
+        """Registra os circuitos devolvidos por get_circuit_info (valor = número do lastvalue)."""
+        from prtg_API import circuit_is_down # O cliente do PRTG já está carregado quando há circuitos
+        for dispositivo in devices_circuits:
+            for circuito in dispositivo.get("circuits", []):
+                self.registrar(loja, "circuito", circuito.get("name"), not circuit_is_down(circuito),
+                               extrair_valor(circuito.get("lastvalue")))
+
+    # --- Gravação em lote (thread do histórico) ---
+    def _executar(self):
+        while not self._parar.is_set():
+            self._acordar.wait(self.intervalo_gravacao)
+            self._acordar.clear()
+            self._gravar_pendentes()
+            if time.time() - self._ultima_limpeza >= self.intervalo_limpeza:
+                self.aplicar_retencao()
+
+    def _id_serie(self, cursor, loja, tipo, alvo):
+        chave = (loja, tipo, alvo)
+        serie_id = self._series.get(chave)
+        if serie_id is None:
+            cursor.execute("INSERT OR IGNORE INTO series (loja, tipo, alvo) VALUES (?, ?, ?)", chave)
+            serie_id = cursor.execute("SELECT id FROM series WHERE loja = ? AND tipo = ? AND alvo = ?", chave).fetchone()[0]
+            self._series[chave] = serie_id
+        return serie_id
+
+    def _gravar_pendentes(self):
+        with self._lock_gravacao:
+            self._gravar_lote()
+
+    def _gravar_lote(self):
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, []
+        if not pendentes:
+            return
+        try:
+            with self._conexao:
+                cursor = self._conexao.cursor()
+                amostras = []
+                agregados = {} # (serie, resolução, início) -> [n, ok, n_valor, soma, mínimo, máximo]
+                for loja, tipo, alvo, ts, sucesso, valor, perda in pendentes:
+                    serie_id = self._id_serie(cursor, loja, tipo, alvo)
+                    amostras.append((serie_id, ts, sucesso, valor, perda))
+                    for resolucao in RESOLUCOES:
+                        chave = (serie_id, resolucao, ts - ts % resolucao)
+                        atual = agregados.get(chave)
+                        if atual is None:
+                            atual = agregados[chave] = [0, 0, 0, 0.0, None, None]
+                        atual[0] += 1
+                        atual[1] += sucesso
+                        if valor is not None:
+                            atual[2] += 1
+                            atual[3] += valor
+                            atual[4] = valor if atual[4] is None else min(atual[4], valor)
+                            atual[5] = valor if atual[5] is None else max(atual[5], valor)
+                cursor.executemany("INSERT INTO amostras (serie_id, ts, sucesso, valor, perda) VALUES (?, ?, ?, ?, ?)", amostras)
+                cursor.executemany(_UPSERT_AGREGADO, [chave + tuple(valores) for chave, valores in agregados.items()])
+        except sqlite3.Error as e:
+            print(f"Erro ao gravar o histórico ({self.caminho}): {e}")
+
+    def aplicar_retencao(self):
+        """Remove dados além da idade de cada nível e, se preciso, os mais antigos até caber no limite."""
+        with self._lock_gravacao:
+            self._aplicar_retencao()
+
+    def _aplicar_retencao(self):
+        self._ultima_limpeza = time.time()
+        agora = int(time.time())
+        try:
+            with self._conexao:
+                self._conexao.execute("DELETE FROM amostras WHERE ts < ?", (agora - self.retencao["bruto"],))
+                for resolucao in RESOLUCOES:
+                    self._conexao.execute("DELETE FROM agregados WHERE resolucao = ? AND inicio < ?",
+                                          (resolucao, agora - self.retencao[resolucao]))
+            # Acima do limite: descarta a metade mais antiga do nível mais detalhado que ainda tiver dados
+            for tabela, resolucao in (("amostras", None), ("agregados", 60), ("agregados", 900), ("agregados", 3600)):
+                while self._tamanho_usado() > self.tamanho_maximo:
+                    if not self._descartar_metade_antiga(tabela, resolucao):
+                        break
+            # Pelo execute() o incremental_vacuum libera uma única página; o executescript vai até o fim
+            self._conexao.executescript("PRAGMA incremental_vacuum;")
+            self._conexao.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        except sqlite3.Error as e:
+            print(f"Erro ao aplicar a retenção do histórico ({self.caminho}): {e}")
+
+    def _tamanho_usado(self):
+        paginas = self._conexao.execute("PRAGMA page_count").fetchone()[0]
+        livres = self._conexao.execute("PRAGMA freelist_count").fetchone()[0]
+        return (paginas - livres) * self._conexao.execute("PRAGMA page_size").fetchone()[0]
+
+    def _descartar_metade_antiga(self, tabela, resolucao):
+        coluna = "ts" if resolucao is None else "inicio"
+        filtro = "" if resolucao is None else f"WHERE resolucao = {int(resolucao)}"
+        limites = self._conexao.execute(f"SELECT MIN({coluna}), MAX({coluna}) FROM {tabela} {filtro}").fetchone()
+        if limites[0] is None or limites[0] == limites[1]:
+            return False
+        corte = (limites[0] + limites[1]) // 2
+        condicao = f"{coluna} <= ?" if resolucao is None else f"resolucao = {int(resolucao)} AND {coluna} <= ?"
+        with self._conexao:
+            self._conexao.execute(f"DELETE FROM {tabela} WHERE {condicao}", (corte,))
+        return True
+
+    # --- Consultas (qualquer thread) ---
+    def tendencia(self, loja, periodo=3600, resolucao=None):
+        """
+        Série temporal agregada de todos os alvos de uma loja.
+
+        Args:
+            loja: Chave da loja usada no registro (ID_Loja).
+            periodo: Janela consultada, em segundos até agora.
+            resolucao: 60, 900 ou 3600; se omitida, escolhe a maior que ainda dá detalhe suficiente.
+
+        Returns:
+            Dicionário {(tipo, alvo): [(início, amostras, disponibilidade %, média, mínimo, máximo), ...]}.
+        """
+        if resolucao is None:
+            resolucao = 60 if periodo <= 6 * 3600 else 900 if periodo <= 7 * 86400 else 3600
+        desde = int(time.time()) - periodo
+        self._gravar_pendentes() # Garante que as amostras mais recentes entrem na consulta
+        conexao = self._conectar() # Conexão própria: leituras em WAL não bloqueiam a gravação
+        try:
+            series = conexao.execute("SELECT id, tipo, alvo FROM series WHERE loja = ?", (str(loja),)).fetchall()
+            resultado = {}
+            for serie_id, tipo, alvo in series:
+                pontos = conexao.execute(
+                    "SELECT inicio, n, ok, n_valor, soma, minimo, maximo FROM agregados "
+                    "WHERE serie_id = ? AND resolucao = ? AND inicio >= ? ORDER BY inicio",
+                    (serie_id, resolucao, desde - desde % resolucao)
+                ).fetchall()
+                if pontos:
+                    resultado[(tipo, alvo)] = [
+                        (inicio, n, round(100 * ok / n, 1), round(soma / n_valor, 3) if n_valor else None, minimo, maximo)
+                        for inicio, n, ok, n_valor, soma, minimo, maximo in pontos
+                    ]
+            return resultado
+        finally:
+            conexao.close()
+
+    def resumo(self, loja, periodo=3600):
+        """Um agregado por alvo na janela: {(tipo, alvo): (amostras, disponibilidade %, média, mínimo, máximo)}."""
+        resolucao = 60 if periodo <= 6 * 3600 else 900 if periodo <= 7 * 86400 else 3600
+        desde = int(time.time()) - periodo
+        self._gravar_pendentes()
+        conexao = self._conectar()
+        try:
+            linhas = conexao.execute(
+                "SELECT s.tipo, s.alvo, SUM(a.n), SUM(a.ok), SUM(a.n_valor), SUM(a.soma), MIN(a.minimo), MAX(a.maximo) "
+                "FROM series s JOIN agregados a ON a.serie_id = s.id "
+                "WHERE s.loja = ? AND a.resolucao = ? AND a.inicio >= ? GROUP BY s.id ORDER BY s.tipo, s.alvo",
+                (str(loja), resolucao, desde - desde % resolucao)
+            ).fetchall()
+        finally:
+            conexao.close()
+        return {
+            (tipo, alvo): (n, round(100 * ok / n, 1), round(soma / n_valor, 3) if n_valor else None, minimo, maximo)
+            for tipo, alvo, n, ok, n_valor, soma, minimo, maximo in linhas
+        }
+
+    def fechar(self):
+        """Grava o que estiver pendente e fecha o banco."""
+        self._parar.set()
+        self._acordar.set()
+        self._thread.join(timeout=5)
+        self._gravar_pendentes()
+        self._conexao.close()
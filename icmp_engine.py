@@ -0,0 +1,350 @@
+import asyncio
+import os
+import socket
+import struct
+import time
+
+from metricas import METRICAS, registrar_sondas
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+
+_socket_kind = None  # Cache do tipo de socket ICMP disponível: "dgram", "raw" ou "" (indisponível)
+
+def checksum(data):
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+def build_echo_request(ident, seq, payload=b""):
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, ident & 0xFFFF, seq & 0xFFFF)
+    csum = checksum(header + payload)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, csum, ident & 0xFFFF, seq & 0xFFFF) + payload
+
+def parse_icmp(packet):
+    # Sockets RAW (e DGRAM no macOS) entregam o cabeçalho IP junto; no Linux o DGRAM entrega só o ICMP.
+    # O primeiro byte de um cabeçalho IPv4 é 0x4X, valor que nenhum tipo ICMP usado aqui possui.
+    if packet and packet[0] >> 4 == 4:
+        packet = packet[(packet[0] & 0x0F) * 4:]
+    if len(packet) < 8:
+        return None
+    icmp_type, code, _, ident, seq = struct.unpack("!BBHHH", packet[:8])
+    return icmp_type, code, ident, seq
+
+def open_icmp_socket():
+    """
+    Abre um socket ICMP sem precisar do binário 'ping'.
+
+    Tenta primeiro o socket DGRAM não privilegiado (Linux com net.ipv4.ping_group_range liberado,
+    macOS) e depois o RAW (root/Administrador). Retorna (socket, raw) ou levanta OSError.
+    """
+    global _socket_kind
+    kinds = [_socket_kind] if _socket_kind else ["dgram", "raw"]
+    last_error = None
+    for kind in kinds:
+        sock_type = socket.SOCK_DGRAM if kind == "dgram" else socket.SOCK_RAW
+        try:
+            sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+        except OSError as e:
+            last_error = e
+            continue
+        _socket_kind = kind
+        return sock, kind == "raw"
+    _socket_kind = ""
+    raise last_error or OSError("Socket ICMP indisponível")
+
+def icmp_available():
+    if _socket_kind is None:
+        try:
+            sock, _ = open_icmp_socket()
+            sock.close()
+        except OSError:
+            pass
+    return bool(_socket_kind)
+
+def _interrupt_socket(sock):
+    # close() sozinho não acorda um recvfrom bloqueado em outro thread no Linux; o shutdown acorda
+    # (mesmo falhando com ENOTCONN, como acontece em sockets ICMP sem connect)
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    sock.close()
+
+def ping(host, count=4, timeout=2, interval=0.05, payload_size=32, cancel_token=None):
+    """
+    Envia `count` echo requests para `host` e retorna o mesmo dicionário de NetworkTools.ping_host.
+
+    Com `cancel_token` (cancelamento.TokenCancelamento), o cancelamento interrompe a espera pela
+    resposta na hora e o resultado volta com o erro "Ping cancelado.".
+    Levanta OSError apenas se não for possível abrir o socket ICMP (o chamador usa o ping do sistema).
+    """
+    result = {
+        "host": host,
+        "success": False,
+        "min_time": None,
+        "avg_time": None,
+        "max_time": None,
+        "packet_loss": 100,
+        "error": None
+    }
+
+    try:
+        address = socket.gethostbyname(host)
+    except (socket.gaierror, UnicodeError):
+        result["error"] = f"Não foi possível resolver o host '{host}'."
+        return result
+
+    if cancel_token is not None and cancel_token.cancelado():
+        result["error"] = "Ping cancelado."
+        return result
+
+    sock, raw = open_icmp_socket()
+    ident = os.getpid() & 0xFFFF
+    payload = bytes(payload_size)
+    rtts = []
+    started = time.perf_counter()
+    interrupt_handle = cancel_token.ao_cancelar(lambda: _interrupt_socket(sock)) if cancel_token is not None else None
+    try:
+        for seq in range(1, count + 1):
+            if cancel_token is not None and cancel_token.cancelado():
+                result["error"] = "Ping cancelado."
+                return result
+            sent_at = time.perf_counter()
+            sock.sendto(build_echo_request(ident, seq, payload), (address, 0))
+            deadline = sent_at + timeout
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+                try:
+                    packet, (reply_address, _) = sock.recvfrom(2048)
+                except socket.timeout:
+                    break
+                parsed = parse_icmp(packet)
+                if parsed is None or reply_address != address:
+                    continue
+                icmp_type, _, reply_ident, reply_seq = parsed
+                # No DGRAM o kernel reescreve o identificador; só o RAW precisa conferi-lo
+                if icmp_type != ICMP_ECHO_REPLY or reply_seq != seq or (raw and reply_ident != ident):
+                    continue
+                rtts.append((time.perf_counter() - sent_at) * 1000)
+                break
+            if seq < count and interval:
+                time.sleep(interval)
+    except OSError as e:
+        if cancel_token is not None and cancel_token.cancelado():
+            result["error"] = "Ping cancelado."
+        else:
+            result["error"] = f"Erro ao enviar ICMP para {host}: {str(e)}"
+        return result
+    finally:
+        if cancel_token is not None:
+            cancel_token.remover(interrupt_handle)
+        sock.close()
+
+    METRICAS.observar("ping_host_seconds", time.perf_counter() - started, method="icmp")
+    _record_probes(count, rtts)
+    result["packet_loss"] = round(100 * (count - len(rtts)) / count) if count else 100
+    if rtts:
+        result["success"] = True
+        result["min_time"] = round(min(rtts), 3)
+        result["avg_time"] = round(sum(rtts) / len(rtts), 3)
+        result["max_time"] = round(max(rtts), 3)
+    else:
+        result["error"] = f"Sem resposta ICMP de {host} (100% de perda de pacotes)."
+    return result
+
+def _record_probes(count, rtts):
+    registrar_sondas("icmp", count, len(rtts))
+    for rtt in rtts:
+        METRICAS.observar("ping_rtt_ms", rtt, method="icmp")
+
+class _Target:
+    __slots__ = ("key", "host", "address", "rtts", "settled", "error", "done")
+
+    def __init__(self, key, host):
+        self.key = key
+        self.host = host
+        self.address = None
+        self.rtts = []
+        self.settled = 0
+        self.error = None
+        self.done = False  # Resultado já entregue
+
+    def cancelled_result(self):
+        return {"host": self.host, "success": False, "min_time": None, "avg_time": None,
+                "max_time": None, "packet_loss": 100, "error": "Ping cancelado."}
+
+    def result(self, count):
+        result = {
+            "host": self.host,
+            "success": bool(self.rtts),
+            "min_time": None,
+            "avg_time": None,
+            "max_time": None,
+            "packet_loss": round(100 * (count - len(self.rtts)) / count) if count else 100,
+            "error": self.error
+        }
+        if self.rtts:
+            result["min_time"] = round(min(self.rtts), 3)
+            result["avg_time"] = round(sum(self.rtts) / len(self.rtts), 3)
+            result["max_time"] = round(max(self.rtts), 3)
+        elif not self.error:
+            result["error"] = f"Sem resposta ICMP de {self.host} (100% de perda de pacotes)."
+        if self.address is not None:
+            _record_probes(count, self.rtts)
+        return result
+
+async def _resolve(loop, target, semaphore):
+    try:
+        socket.inet_aton(target.host)
+        if target.host.count(".") == 3:
+            target.address = target.host
+            return
+    except OSError:
+        pass
+    async with semaphore:
+        try:
+            infos = await loop.getaddrinfo(target.host, None, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+            target.address = infos[0][4][0]
+        except (socket.gaierror, UnicodeError, IndexError):
+            target.error = f"Não foi possível resolver o host '{target.host}'."
+
+async def ping_many(targets, count=4, timeout=2, interval=0.2, rate=1000, payload_size=32, cancel_token=None):
+    """
+    Pinga vários hosts por um único socket ICMP e entrega (chave, resultado) conforme cada host termina.
+
+    Args:
+        targets: Iterável de (host, chave).
+        count: Echo requests por host; as rodadas são intercaladas entre todos os hosts.
+        timeout: Segundos de espera pela resposta de cada echo request.
+        interval: Intervalo mínimo entre rodadas.
+        rate: Limite de pacotes enviados por segundo (somando todos os hosts).
+        cancel_token: cancelamento.TokenCancelamento; no cancelamento o envio e a espera param na
+            hora e os hosts ainda sem resultado saem com o erro "Ping cancelado.".
+
+    As respostas são associadas pela sequência (única por pacote em voo) e pelo endereço de origem,
+    de modo que a duração total depende do timeout, não da quantidade de hosts.
+    """
+    loop = asyncio.get_running_loop()
+    sock, raw = open_icmp_socket()
+    sock.setblocking(False)
+    ident = os.getpid() & 0xFFFF
+    payload = bytes(payload_size)
+    targets = [_Target(key, host) for host, key in targets]
+    results = asyncio.Queue()
+    pending = {}  # seq -> (alvo, instante de envio); ordem de inserção = ordem de envio
+    next_seq = 0
+
+    def deliver(target, result):
+        if not target.done:
+            target.done = True
+            results.put_nowait((target.key, result))
+
+    def settle(target, rtt=None):
+        if rtt is not None:
+            target.rtts.append(rtt)
+        target.settled += 1
+        if target.settled == count:
+            deliver(target, target.result(count))
+
+    def cancel():
+        # No thread do event loop (o token chama isto via call_soon_threadsafe)
+        for task in tasks:
+            task.cancel()
+        pending.clear()
+        for target in targets:
+            deliver(target, target.cancelled_result())
+
+    def on_readable():
+        while True:
+            try:
+                packet, (reply_address, _) = sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            parsed = parse_icmp(packet)
+            if parsed is None:
+                continue
+            icmp_type, _, reply_ident, reply_seq = parsed
+            if icmp_type != ICMP_ECHO_REPLY or (raw and reply_ident != ident):
+                continue
+            entry = pending.get(reply_seq)
+            if entry is None or entry[0].address != reply_address:
+                continue
+            del pending[reply_seq]
+            settle(entry[0], (time.perf_counter() - entry[1]) * 1000)
+
+    async def sender(active):
+        nonlocal next_seq
+        burst = max(1, rate // 50)
+        for _ in range(count):
+            round_started = loop.time()
+            for sent, target in enumerate(active, 1):
+                next_seq = (next_seq + 1) & 0xFFFF
+                while next_seq in pending:
+                    await asyncio.sleep(0.01)  # Mais de 65535 pacotes em voo: espera liberar sequências
+                try:
+                    sock.sendto(build_echo_request(ident, next_seq, payload), (target.address, 0))
+                    pending[next_seq] = (target, time.perf_counter())
+                except OSError as e:
+                    target.error = f"Erro ao enviar ICMP para {target.host}: {str(e)}"
+                    settle(target)
+                if sent % burst == 0:
+                    await asyncio.sleep(burst / rate)
+            await asyncio.sleep(max(0.0, round_started + interval - loop.time()))
+
+    async def reaper():
+        while True:
+            await asyncio.sleep(0.05)
+            now = time.perf_counter()
+            while pending:
+                seq = next(iter(pending))
+                target, sent_at = pending[seq]
+                if sent_at + timeout > now:
+                    break
+                del pending[seq]
+                settle(target)
+
+    tasks = []
+    cancel_handle = None
+    loop.add_reader(sock.fileno(), on_readable)
+    try:
+        if cancel_token is not None:
+            cancel_handle = cancel_token.ao_cancelar(lambda: loop.call_soon_threadsafe(cancel))
+        semaphore = asyncio.Semaphore(32)
+        resolving = asyncio.ensure_future(asyncio.gather(*(_resolve(loop, target, semaphore) for target in targets)))
+        tasks.append(resolving)
+        try:
+            await resolving
+        except asyncio.CancelledError:
+            if cancel_token is None or not cancel_token.cancelado():
+                raise
+        active = []
+        for target in targets:
+            if target.done:
+                continue
+            if target.address is None:
+                deliver(target, target.result(count))
+            else:
+                active.append(target)
+        if count > 0 and active:
+            tasks.extend([asyncio.create_task(sender(active)), asyncio.create_task(reaper())])
+        else:
+            for target in active:
+                deliver(target, target.result(count))
+        for _ in range(len(targets)):
+            yield await results.get()
+    finally:
+        if cancel_token is not None:
+            cancel_token.remover(cancel_handle)
+        for task in tasks:
+            task.cancel()
+        loop.remove_reader(sock.fileno())
+        sock.close()
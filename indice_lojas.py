@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import copy
+import hashlib
+import heapq
+import os
+import pickle
+import threading
+import unicodedata
+
+VERSAO_CACHE = 3 # Incrementar sempre que a estrutura do IndiceLojas mudar
+
+def normalizar_texto(texto):
+    """Normaliza um texto para busca: remove acentos, aplica casefold e colapsa espaços."""
+    texto = unicodedata.normalize("NFKD", str(texto))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.casefold().split())
+
+class IndiceLojas:
+    """
+    Índice em memória das lojas, montado uma única vez no carregamento dos dados.
+
+    Mantém um mapa hash para o ID exato e um índice de trigramas sobre o nome normalizado, de forma
+    que uma busca parcial só verifica as lojas que contêm todos os trigramas do termo, em vez de
+    percorrer a lista inteira.
+    """
+
+    TAMANHO_NGRAMA = 3
+
+    def __init__(self, lojas):
+        """
+        Args:
+            lojas: Sequência de registros (RegistroLoja ou dicionários) com as colunas do CSV de lojas.
+        """
+        self.lojas = list(lojas)
+        self.removidas = 0 # Posições liberadas por atualizações incrementais (registro None)
+        self.por_id = {}
+        self.ids_normalizados = []
+        self.nomes_normalizados = []
+        self.ngramas = {}
+        self.nomes_curtos = set() # Nomes menores que um trigrama não aparecem no índice
+        for posicao, loja in enumerate(self.lojas):
+            id_loja, id_norm, nome, ngramas = self._chaves(loja)
+            self.por_id.setdefault(id_loja, []).append(posicao)
+            self.ids_normalizados.append(id_norm)
+            self.nomes_normalizados.append(nome)
+            if not ngramas:
+                self.nomes_curtos.add(posicao)
+            for ngrama in ngramas:
+                self.ngramas.setdefault(ngrama, set()).add(posicao)
+        # IDs ordenados permitem achar por busca binária todos os que começam com um prefixo
+        self.ids_ordenados = sorted((id_norm, posicao) for posicao, id_norm in enumerate(self.ids_normalizados))
+
+    def _ngramas(self, nome):
+        n = self.TAMANHO_NGRAMA
+        return {nome[i:i + n] for i in range(len(nome) - n + 1)}
+
+    def _chaves(self, loja):
+        """Retorna (ID original, ID normalizado, nome normalizado, trigramas do nome) de um registro."""
+        id_loja = str(loja.get("ID_Loja", "")).strip()
+        nome = normalizar_texto(loja.get("Nome_Loja", ""))
+        return id_loja, normalizar_texto(id_loja), nome, self._ngramas(nome)
+
+    def __len__(self):
+        return len(self.lojas) - self.removidas
+
+    def registros(self):
+        """Registros atualmente no índice, na ordem do CSV (ignora posições removidas)."""
+        return [loja for loja in self.lojas if loja is not None]
+
+    def buscar_por_id(self, id_loja):
+        """Retorna as lojas cujo ID_Loja é exatamente igual ao informado."""
+        return [self.lojas[p] for p in self.por_id.get(str(id_loja).strip(), [])]
+
+    def posicoes_por_nome(self, termo_norm):
+        """Posições das lojas cujo nome normalizado contém `termo_norm` (já normalizado)."""
+        if not termo_norm:
+            return set()
+        n = self.TAMANHO_NGRAMA
+        if len(termo_norm) < n:
+            # Termo curto: une as listas dos trigramas que o contêm (o vocabulário de trigramas é pequeno)
+            candidatos = set(self.nomes_curtos)
+            for ngrama, posicoes in self.ngramas.items():
+                if termo_norm in ngrama:
+                    candidatos |= posicoes
+        else:
+            # Começa pelo trigrama menos frequente; a verificação final confirma a substring
+            conjuntos = sorted(
+                (self.ngramas.get(termo_norm[i:i + n], set()) for i in range(len(termo_norm) - n + 1)),
+                key=len
+            )
+            candidatos = set(conjuntos[0])
+            for conjunto in conjuntos[1:]:
+                if not candidatos:
+                    break
+                candidatos &= conjunto
+        return {p for p in candidatos if termo_norm in self.nomes_normalizados[p]}
+
+    def posicoes_por_prefixo_id(self, termo_norm):
+        """Posições das lojas cujo ID normalizado começa com `termo_norm`."""
+        posicoes = set()
+        inicio = bisect.bisect_left(self.ids_ordenados, (termo_norm,))
+        for id_norm, posicao in self.ids_ordenados[inicio:]:
+            if not id_norm.startswith(termo_norm):
+                break
+            posicoes.add(posicao)
+        return posicoes
+
+    def buscar_por_nome(self, termo):
+        """Retorna as lojas cujo nome normalizado contém o termo normalizado, na ordem do CSV."""
+        return [self.lojas[p] for p in sorted(self.posicoes_por_nome(normalizar_texto(termo)))]
+
+    def buscar(self, termo):
+        """Busca pelo ID exato e, se não houver correspondência, por parte do nome."""
+        return self.buscar_por_id(termo) or self.buscar_por_nome(termo)
+
+    def atualizar(self, novas_lojas):
+        """
+        Compara `novas_lojas` com o conteúdo indexado e devolve um novo índice com as diferenças.
+
+        As lojas são comparadas pelo ID_Loja: só as linhas incluídas, removidas ou alteradas são
+        normalizadas e reindexadas. O índice atual não é modificado (as estruturas alteradas são
+        copiadas), então buscas em andamento continuam vendo um estado consistente. Se a atualização
+        incremental não puder manter a ordem do CSV (linhas reordenadas, ou incluídas fora do fim do
+        arquivo), o índice é reconstruído.
+
+        Args:
+            novas_lojas: Sequência com o conteúdo completo e atual do CSV.
+
+        Returns:
+            Tupla (índice, resumo); o índice é o próprio objeto se nada mudou. O resumo traz as
+            contagens "incluidas", "removidas" e "alteradas".
+        """
+        novas = {}
+        ids_csv = []
+        for loja in novas_lojas:
+            id_loja = str(loja.get("ID_Loja", "")).strip()
+            novas.setdefault(id_loja, []).append(loja)
+            ids_csv.append(id_loja)
+
+        resumo = {"incluidas": 0, "removidas": 0, "alteradas": 0}
+        remover, substituir, ids_incluir = [], [], set()
+        for id_loja, posicoes in self.por_id.items():
+            registros = novas.get(id_loja)
+            if registros is None:
+                remover.extend(posicoes)
+                resumo["removidas"] += len(posicoes)
+            elif [self.lojas[p] for p in posicoes] != registros:
+                resumo["alteradas"] += 1
+                if len(posicoes) == len(registros):
+                    substituir.extend(zip(posicoes, registros)) # Mantém a posição (ordem do CSV)
+                else:
+                    remover.extend(posicoes)
+                    ids_incluir.add(id_loja)
+        for id_loja, registros in novas.items():
+            if id_loja not in self.por_id:
+                ids_incluir.add(id_loja)
+                resumo["incluidas"] += len(registros)
+        incluir = [loja for loja, id_loja in zip(novas_lojas, ids_csv) if id_loja in ids_incluir]
+
+        # As linhas que ficam mantêm a posição e as incluídas vão para o fim: se a sequência de IDs
+        # resultante for a do arquivo, registros() continua na ordem do CSV
+        descartadas = set(remover)
+        ordem = [str(loja.get("ID_Loja", "")).strip() for posicao, loja in enumerate(self.lojas)
+                 if loja is not None and posicao not in descartadas]
+        ordem.extend(str(loja.get("ID_Loja", "")).strip() for loja in incluir)
+        if ordem == ids_csv and not (remover or substituir or incluir):
+            return self, resumo
+        if ordem != ids_csv or (self.removidas + len(remover)) * 2 > len(self.lojas) + len(incluir):
+            # Ordem diferente ou muitas posições vazias: reconstrói do zero, na ordem do CSV
+            return IndiceLojas(list(novas_lojas)), resumo
+
+        novo = copy.copy(self)
+        novo._copiar_para_escrita()
+        for posicao in remover:
+            novo._remover(posicao)
+        for posicao, loja in substituir:
+            novo._remover(posicao)
+            novo._inserir(posicao, loja)
+        for loja in incluir:
+            novo.lojas.append(None)
+            novo.ids_normalizados.append("")
+            novo.nomes_normalizados.append("")
+            novo._inserir(len(novo.lojas) - 1, loja)
+        novo.removidas = self.removidas + len(remover)
+        del novo._copiados
+        return novo, resumo
+
+    def _copiar_para_escrita(self):
+        # Cópias rasas: listas de posições e conjuntos de trigramas só são duplicados quando alterados
+        self.lojas = list(self.lojas)
+        self.ids_normalizados = list(self.ids_normalizados)
+        self.nomes_normalizados = list(self.nomes_normalizados)
+        self.ids_ordenados = list(self.ids_ordenados)
+        self.nomes_curtos = set(self.nomes_curtos)
+        self.por_id = dict(self.por_id)
+        self.ngramas = dict(self.ngramas)
+        self._copiados = set()
+
+    def _conjunto_ngrama(self, ngrama):
+        if ngrama not in self._copiados:
+            self.ngramas[ngrama] = set(self.ngramas.get(ngrama, ()))
+            self._copiados.add(ngrama)
+        return self.ngramas[ngrama]
+
+    def _remover(self, posicao):
+        loja = self.lojas[posicao]
+        id_loja = str(loja.get("ID_Loja", "")).strip()
+        posicoes = [p for p in self.por_id[id_loja] if p != posicao]
+        if posicoes:
+            self.por_id[id_loja] = posicoes
+        else:
+            del self.por_id[id_loja]
+        id_norm, nome = self.ids_normalizados[posicao], self.nomes_normalizados[posicao]
+        del self.ids_ordenados[bisect.bisect_left(self.ids_ordenados, (id_norm, posicao))]
+        self.nomes_curtos.discard(posicao)
+        for ngrama in self._ngramas(nome):
+            conjunto = self._conjunto_ngrama(ngrama)
+            conjunto.discard(posicao)
+            if not conjunto:
+                del self.ngramas[ngrama]
+                self._copiados.discard(ngrama)
+        self.lojas[posicao] = None
+        self.ids_normalizados[posicao] = ""
+        self.nomes_normalizados[posicao] = ""
+
+    def _inserir(self, posicao, loja):
+        id_loja, id_norm, nome, ngramas = self._chaves(loja)
+        self.lojas[posicao] = loja
+        self.ids_normalizados[posicao] = id_norm
+        self.nomes_normalizados[posicao] = nome
+        posicoes = list(self.por_id.get(id_loja, []))
+        bisect.insort(posicoes, posicao)
+        self.por_id[id_loja] = posicoes
+        bisect.insort(self.ids_ordenados, (id_norm, posicao))
+        if not ngramas:
+            self.nomes_curtos.add(posicao)
+        for ngrama in ngramas:
+            self._conjunto_ngrama(ngrama).add(posicao)
+
+class BuscaIncremental:
+    """
+    Sugestões de lojas durante a digitação.
+
+    Quando o novo termo estende o anterior, filtra apenas os candidatos da consulta anterior em vez
+    de consultar o índice de novo. Os resultados são limitados e ordenados por relevância: ID exato,
+    prefixo do ID, início do nome, início de palavra e, por fim, qualquer trecho do nome.
+    """
+
+    def __init__(self, indice, limite=10):
+        self.indice = indice
+        self.limite = limite
+        self._termo = None
+        self._candidatos = None
+
+    def _relevancia(self, termo_norm, posicao):
+        id_norm = self.indice.ids_normalizados[posicao]
+        nome = self.indice.nomes_normalizados[posicao]
+        if id_norm == termo_norm:
+            return (0, posicao)
+        if id_norm.startswith(termo_norm):
+            return (1, posicao)
+        if nome.startswith(termo_norm):
+            return (2, posicao)
+        if f" {termo_norm}" in nome:
+            return (3, posicao)
+        return (4, posicao)
+
+    def sugerir(self, termo):
+        """Retorna até `limite` registros de lojas que correspondem ao termo digitado."""
+        termo_norm = normalizar_texto(termo)
+        if not termo_norm:
+            self._termo, self._candidatos = None, None
+            return []
+
+        if self._candidatos is not None and termo_norm.startswith(self._termo):
+            ids, nomes = self.indice.ids_normalizados, self.indice.nomes_normalizados
+            candidatos = {p for p in self._candidatos if ids[p].startswith(termo_norm) or termo_norm in nomes[p]}
+        else:
+            candidatos = self.indice.posicoes_por_nome(termo_norm) | self.indice.posicoes_por_prefixo_id(termo_norm)
+        self._termo, self._candidatos = termo_norm, candidatos
+
+        melhores = heapq.nsmallest(self.limite, candidatos, key=lambda p: self._relevancia(termo_norm, p))
+        return [self.indice.lojas[p] for p in melhores]
+
+def _hash_arquivo(caminho):
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def carregar_indice_lojas(caminho_csv, ler_registros, caminho_cache=None):
+    """
+    Carrega o IndiceLojas a partir de um cache binário (pickle) mantido ao lado do CSV.
+
+    O cache é válido enquanto tamanho e mtime do CSV não mudarem; se só o mtime mudar, o hash
+    SHA-256 do conteúdo decide. Em qualquer outro caso o CSV é relido com `ler_registros(caminho_csv)`
+    e o cache é regravado.
+
+    Args:
+        caminho_csv: Caminho do arquivo de lojas.
+        ler_registros: Função que lê o CSV e devolve a lista de registros (ex.: tabela_lojas.ler_lojas_csv).
+        caminho_cache: Caminho do cache; padrão é o do CSV com o sufixo ".cache".
+
+    Returns:
+        O IndiceLojas pronto para uso.
+    """
+    caminho_cache = caminho_cache or f"{caminho_csv}.cache"
+    estado = os.stat(caminho_csv)
+
+    cache = None
+    try:
+        with open(caminho_cache, "rb") as f:
+            cache = pickle.load(f)
+        if cache.get("versao") != VERSAO_CACHE or cache.get("tamanho") != estado.st_size:
+            cache = None
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError, TypeError):
+        cache = None
+
+    if cache is not None:
+        if cache.get("mtime_ns") == estado.st_mtime_ns:
+            return cache["indice"]
+        hash_atual = _hash_arquivo(caminho_csv)
+        if cache.get("sha256") == hash_atual:
+            # Arquivo apenas "tocado" (ex.: copiado de novo): atualiza o mtime guardado
+            cache["mtime_ns"] = estado.st_mtime_ns
+            _gravar_cache(caminho_cache, cache)
+            return cache["indice"]
+    else:
+        hash_atual = _hash_arquivo(caminho_csv)
+
+    indice = IndiceLojas(ler_registros(caminho_csv))
+    _gravar_cache(caminho_cache, _montar_cache(estado, hash_atual, indice))
+    return indice
+
+def _montar_cache(estado, hash_atual, indice):
+    return {
+        "versao": VERSAO_CACHE,
+        "tamanho": estado.st_size,
+        "mtime_ns": estado.st_mtime_ns,
+        "sha256": hash_atual,
+        "indice": indice
+    }
+
+def _gravar_cache(caminho_cache, cache):
+    try:
+        caminho_tmp = f"{caminho_cache}.tmp"
+        with open(caminho_tmp, "wb") as f:
+            pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(caminho_tmp, caminho_cache)
+    except OSError as e:
+        print(f"Não foi possível gravar o cache de lojas ({caminho_cache}): {e}")
+
+def assinatura_arquivo(caminho):
+    """Retorna (tamanho, mtime_ns) do arquivo, ou None se ele não puder ser lido."""
+    try:
+        estado = os.stat(caminho)
+    except OSError:
+        return None
+    return estado.st_size, estado.st_mtime_ns
+
+class ObservadorLojas:
+    """
+    Acompanha o CSV de lojas e aplica as alterações ao índice sem reiniciar a aplicação.
+
+    Verifica tamanho e mtime do arquivo a cada `intervalo` segundos (polling, sem dependências
+    externas). Uma alteração só é lida depois que o arquivo fica estável por um ciclo inteiro, para
+    não pegar uma gravação pela metade. O novo conteúdo é comparado com o índice atual
+    (IndiceLojas.atualizar) e o índice resultante é entregue a `ao_atualizar(indice, resumo)`, que
+    roda no thread do observador.
+    """
+
+    def __init__(self, caminho_csv, indice, ler_registros, ao_atualizar, intervalo=5.0,
+                 assinatura=None, caminho_cache=None):
+        """
+        Args:
+            caminho_csv: Caminho do arquivo de lojas.
+            indice: IndiceLojas carregado atualmente.
+            ler_registros: Função que lê o CSV e devolve a lista de registros.
+            ao_atualizar: Chamada com (novo índice, resumo) a cada alteração aplicada.
+            intervalo: Segundos entre verificações.
+            assinatura: Assinatura do arquivo no momento em que `indice` foi lido; se omitida, a
+                assinatura atual é usada.
+            caminho_cache: Cache binário a regravar após cada alteração; padrão é o do CSV com ".cache".
+        """
+        self.caminho_csv = caminho_csv
+        self.caminho_cache = caminho_cache or f"{caminho_csv}.cache"
+        self.indice = indice
+        self.ler_registros = ler_registros
+        self.ao_atualizar = ao_atualizar
+        self.intervalo = intervalo
+        self.assinatura = assinatura if assinatura is not None else assinatura_arquivo(caminho_csv)
+        self._pendente = None
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._executar, daemon=True)
+            self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.verificar()
+            except Exception as e:
+                print(f"Erro ao verificar alterações em {self.caminho_csv}: {e}")
+
+    def verificar(self):
+        """
+        Executa uma verificação do arquivo.
+
+        Returns:
+            O resumo das diferenças quando o arquivo foi relido, ou None.
+        """
+        atual = assinatura_arquivo(self.caminho_csv)
+        if atual is None or atual == self.assinatura:
+            self._pendente = None
+            return None
+        if atual != self._pendente:
+            self._pendente = atual # Arquivo pode estar sendo gravado: espera o próximo ciclo
+            return None
+        self._pendente = None
+
+        self.assinatura = atual
+        try:
+            registros = self.ler_registros(self.caminho_csv)
+        except Exception as e:
+            print(f"Não foi possível reler {self.caminho_csv}; mantendo os dados atuais: {e}")
+            return None
+
+        indice, resumo = self.indice.atualizar(registros)
+        if indice is not self.indice:
+            self.indice = indice
+            self.ao_atualizar(indice, resumo)
+            if assinatura_arquivo(self.caminho_csv) == atual:
+                _gravar_cache(self.caminho_cache, _montar_cache(os.stat(self.caminho_csv), _hash_arquivo(self.caminho_csv), indice))
+        return resumo
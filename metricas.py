@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import json
+import os
+import threading
+import time
+
+CONTADOR = "counter"
+MEDIDOR = "gauge"
+HISTOGRAMA = "histogram"
+
+LIMITES_SEGUNDOS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LIMITES_SPAWN_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+LIMITES_PARSE_S = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005)
+LIMITES_RTT_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+class _Histograma:
+    __slots__ = ("limites", "contagens", "soma", "n", "maximo")
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1) # Última posição = acima do maior limite (+Inf)
+        self.soma = 0.0
+        self.n = 0
+        self.maximo = None
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.n += 1
+        if self.maximo is None or valor > self.maximo:
+            self.maximo = valor
+
+    def quantil(self, q):
+        # Estimativa por interpolação linear dentro do balde, como o histogram_quantile do Prometheus
+        if not self.n:
+            return None
+        alvo = q * self.n
+        acumulado = 0
+        for posicao, contagem in enumerate(self.contagens):
+            if acumulado + contagem >= alvo and contagem:
+                if posicao == len(self.limites):
+                    return self.maximo
+                inferior = self.limites[posicao - 1] if posicao else 0.0
+                return inferior + (self.limites[posicao] - inferior) * (alvo - acumulado) / contagem
+            acumulado += contagem
+        return self.maximo
+
+class Metricas:
+    """
+    Registro em memória de contadores e histogramas com rótulos, seguro para uso entre threads.
+
+    Cada observação custa uma busca em dicionário e um incremento sob lock, para poder ficar nos
+    caminhos quentes (cada requisição ao PRTG, cada ping). Os dados são exportados no formato texto
+    do Prometheus (para o textfile collector do node_exporter) ou em JSON.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._definicoes = {} # nome -> (tipo, ajuda, limites)
+        self._series = {} # (nome, rótulos ordenados) -> valor (contador) ou _Histograma
+        self.inicio = time.time()
+
+    def contador(self, nome, ajuda):
+        self._definicoes[nome] = (CONTADOR, ajuda, None)
+
+    def medidor(self, nome, ajuda):
+        self._definicoes[nome] = (MEDIDOR, ajuda, None)
+
+    def histograma(self, nome, ajuda, limites=LIMITES_SEGUNDOS):
+        self._definicoes[nome] = (HISTOGRAMA, ajuda, tuple(limites))
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            self._series[chave] = self._series.get(chave, 0) + valor
+
+    def definir(self, nome, valor, **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            self._series[chave] = valor
+
+    def observar(self, nome, valor, **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = _Histograma(self._definicoes[nome][2])
+            serie.observar(valor)
+
+    def zerar(self):
+        with self._lock:
+            self._series.clear()
+            self.inicio = time.time()
+
+    def instantaneo(self):
+        """
+        Cópia dos valores atuais, ordenada por nome e rótulos.
+
+        Returns:
+            Lista de dicionários com "nome", "tipo", "rotulos" e, para contadores e medidores, "valor"; para
+            histogramas, "n", "soma", "media", "p50", "p95", "p99", "maximo" e "baldes".
+        """
+        with self._lock:
+            series = []
+            for (nome, rotulos), serie in sorted(self._series.items(), key=lambda item: item[0]):
+                tipo = self._definicoes.get(nome, (CONTADOR,))[0]
+                linha = {"nome": nome, "tipo": tipo, "rotulos": dict(rotulos)}
+                if tipo == HISTOGRAMA:
+                    linha.update({
+                        "n": serie.n,
+                        "soma": serie.soma,
+                        "media": serie.soma / serie.n if serie.n else None,
+                        "p50": serie.quantil(0.5),
+                        "p95": serie.quantil(0.95),
+                        "p99": serie.quantil(0.99),
+                        "maximo": serie.maximo,
+                        "baldes": dict(zip([str(limite) for limite in serie.limites] + ["+Inf"], serie.contagens))
+                    })
+                else:
+                    linha["valor"] = serie
+                series.append(linha)
+            return series
+
+    def taxa_acerto(self, nome_contador, rotulo, acerto="hit"):
+        """{valor do rótulo: fração de acertos} a partir de um contador com rótulo `result`."""
+        totais = {}
+        for linha in self.instantaneo():
+            if linha["nome"] != nome_contador:
+                continue
+            grupo = linha["rotulos"].get(rotulo, "")
+            acertos, total = totais.get(grupo, (0, 0))
+            if linha["rotulos"].get("result") == acerto:
+                acertos += linha["valor"]
+            totais[grupo] = (acertos, total + linha["valor"])
+        return {grupo: acertos / total for grupo, (acertos, total) in totais.items() if total}
+
+    def para_json(self):
+        return json.dumps({"inicio": self.inicio, "gerado_em": time.time(), "metricas": self.instantaneo()},
+                          ensure_ascii=False, indent=2)
+
+    def para_prometheus(self):
+        linhas = []
+        nome_anterior = None
+        for linha in self.instantaneo():
+            nome = linha["nome"]
+            if nome != nome_anterior:
+                tipo, ajuda, _ = self._definicoes.get(nome, (CONTADOR, "", None))
+                linhas.append(f"# HELP {nome} {ajuda}")
+                linhas.append(f"# TYPE {nome} {tipo}")
+                nome_anterior = nome
+            rotulos = linha["rotulos"]
+            if linha["tipo"] != HISTOGRAMA:
+                linhas.append(f"{nome}{_formatar_rotulos(rotulos)} {_formatar_numero(linha['valor'])}")
+                continue
+            acumulado = 0
+            for limite, contagem in linha["baldes"].items():
+                acumulado += contagem
+                linhas.append(f"{nome}_bucket{_formatar_rotulos(dict(rotulos, le=limite))} {acumulado}")
+            linhas.append(f"{nome}_sum{_formatar_rotulos(rotulos)} {_formatar_numero(linha['soma'])}")
+            linhas.append(f"{nome}_count{_formatar_rotulos(rotulos)} {linha['n']}")
+        return "\n".join(linhas) + "\n"
+
+    def exportar(self, caminho):
+        """Grava em `caminho` (JSON se terminar em .json; senão, texto do Prometheus) de forma atômica."""
+        conteudo = self.para_json() if caminho.lower().endswith(".json") else self.para_prometheus()
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, caminho) # O coletor nunca lê um arquivo pela metade
+
+def _formatar_rotulos(rotulos):
+    if not rotulos:
+        return ""
+    pares = ",".join(f'{chave}="{str(valor).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for chave, valor in rotulos.items())
+    return "{" + pares + "}"
+
+def _formatar_numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+class ExportadorMetricas:
+    """Regrava periodicamente o arquivo de métricas (ex.: para o textfile collector do node_exporter)."""
+
+    def __init__(self, metricas, caminho, intervalo=15.0):
+        self.metricas = metricas
+        self.caminho = caminho
+        self.intervalo = intervalo
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._executar, daemon=True)
+            self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        self._exportar() # Última foto ao encerrar
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            self._exportar()
+
+    def _exportar(self):
+        try:
+            self.metricas.exportar(self.caminho)
+        except OSError as e:
+            print(f"Erro ao exportar métricas para {self.caminho}: {e}")
+
+METRICAS = Metricas() # Registro único do processo, usado pelos módulos instrumentados
+
+METRICAS.contador("prtg_requests_total", "Requisições ao table.json do PRTG, por conteúdo e resultado.")
+METRICAS.histograma("prtg_request_seconds", "Duração das requisições ao PRTG até o último byte da resposta.")
+METRICAS.contador("prtg_response_bytes_total", "Bytes recebidos nas respostas do PRTG.")
+METRICAS.contador("prtg_rows_total", "Linhas de tabela recebidas do PRTG (respostas em streaming).")
+METRICAS.contador("cache_requests_total", "Consultas aos caches TTL do cliente PRTG, por cache e resultado.")
+METRICAS.contador("ping_probes_total", "Echo requests enviados, por método e resultado (reply ou lost).")
+METRICAS.histograma("ping_rtt_ms", "Tempo de resposta dos echo requests (ms).", LIMITES_RTT_MS)
+METRICAS.histograma("ping_host_seconds", "Duração de um ping completo a um host (todos os echo requests).")
+METRICAS.histograma("ping_spawn_seconds", "Tempo para criar o processo do ping do sistema.", LIMITES_SPAWN_S)
+METRICAS.histograma("ping_parse_seconds", "Tempo para interpretar a saída do ping do sistema.", LIMITES_PARSE_S)
+METRICAS.medidor("gui_first_paint_seconds", "Tempo do início do processo até a janela principal aparecer.")
+
+def registrar_requisicao_prtg(conteudo, duracao, tamanho, resultado, linhas=None):
+    """Registra uma requisição ao PRTG (chamada pelos clientes síncrono e assíncrono)."""
+    METRICAS.incrementar("prtg_requests_total", content=conteudo, result=resultado)
+    METRICAS.observar("prtg_request_seconds", duracao, content=conteudo)
+    if tamanho:
+        METRICAS.incrementar("prtg_response_bytes_total", tamanho, content=conteudo)
+    if linhas:
+        METRICAS.incrementar("prtg_rows_total", linhas, content=conteudo)
+
+def registrar_sondas(metodo, enviadas, respondidas):
+    """Contabiliza echo requests respondidos e perdidos de um ping."""
+    if respondidas:
+        METRICAS.incrementar("ping_probes_total", respondidas, method=metodo, result="reply")
+    if enviadas > respondidas:
+        METRICAS.incrementar("ping_probes_total", enviadas - respondidas, method=metodo, result="lost")
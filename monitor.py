@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cancelamento import TokenCancelamento
+from tabela_lojas import nome_loja_prtg
+from varredura import ips_vms_loja, numero_da_loja
+
+ESTADO_ONLINE = "Online"
+ESTADO_OFFLINE = "Offline"
+
+class MonitorContinuo:
+    """
+    Reverifica periodicamente as VMs e os links PRTG de uma lista de lojas monitoradas.
+
+    Cada loja tem o próprio agendamento, com intervalo sorteado dentro de ±`jitter` para que as
+    verificações não aconteçam todas juntas. As verificações rodam em um pool limitado de threads e
+    uma loja nunca é verificada de novo antes da rodada anterior terminar. Só o último estado de
+    cada item é guardado e `ao_mudanca` é chamado apenas quando algo muda, de modo que o custo não
+    cresce com o tempo em que o monitor fica ligado.
+    """
+
+    def __init__(self, network_tools, obter_prtg=None, ao_mudanca=None, intervalo=30, jitter=0.2,
+                 max_workers=4, count=2, timeout=1, max_mudancas=200, historico=None):
+        """
+        Args:
+            network_tools: Instância de NetworkTools usada nos pings.
+            obter_prtg: Função que devolve o PRTGAPI configurado, ou None para verificar só as VMs.
+            ao_mudanca: Chamada como ao_mudanca(loja, mudancas, estado) no thread do pool, onde
+                `mudancas` é uma lista de (item, estado anterior, estado atual).
+            intervalo: Segundos entre verificações de uma mesma loja.
+            jitter: Fração de variação aleatória do intervalo (0.2 = ±20%).
+            max_workers: Máximo de lojas verificadas ao mesmo tempo.
+            count: Echo requests por host.
+            timeout: Segundos de espera por resposta.
+            max_mudancas: Quantidade de mudanças recentes mantidas em `mudancas`.
+            historico: HistoricoResultados opcional onde cada resultado é registrado.
+        """
+        self.network_tools = network_tools
+        self.obter_prtg = obter_prtg
+        self.ao_mudanca = ao_mudanca
+        self.intervalo = intervalo
+        self.jitter = jitter
+        self.max_workers = max_workers
+        self.count = count
+        self.timeout = timeout
+        self.historico = historico
+        self.mudancas = deque(maxlen=max_mudancas) # (instante, chave, item, anterior, atual)
+        self.transicoes = {} # (chave, item) -> quantidade de mudanças de estado observadas
+        self._lojas = {}
+        self._estados = {}
+        self._agendadas = {} # chave -> instante (monotonic) da próxima verificação
+        self._fila = [] # heap de (instante, chave); entradas que não batem com _agendadas são descartadas
+        self._em_execucao = set()
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._cancelamento = TokenCancelamento() # Aborta pings e requisições em andamento ao parar
+        self._executor = None
+        self._thread = None
+
+    @staticmethod
+    def chave_loja(loja):
+        return str(loja.get("ID_Loja", "")).strip() or str(loja.get("Nome_Loja", "")).strip()
+
+    def adicionar(self, loja):
+        """Inclui a loja na lista monitorada; a primeira verificação é imediata."""
+        chave = self.chave_loja(loja)
+        with self._lock:
+            self._lojas[chave] = loja
+            if chave not in self._agendadas and chave not in self._em_execucao:
+                self._agendar(chave, 0)
+            if self._thread is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="monitor")
+                self._thread = threading.Thread(target=self._executar, daemon=True)
+                self._thread.start()
+        self._acordar.set()
+        return chave
+
+    def remover(self, chave):
+        """Retira a loja da lista monitorada e descarta o estado guardado dela."""
+        with self._lock:
+            self._lojas.pop(chave, None)
+            self._estados.pop(chave, None)
+            self._agendadas.pop(chave, None)
+            for item in [k for k in self.transicoes if k[0] == chave]:
+                del self.transicoes[item]
+
+    def monitorando(self, chave):
+        with self._lock:
+            return chave in self._lojas
+
+    def lojas(self):
+        with self._lock:
+            return list(self._lojas.values())
+
+    def parar(self):
+        self._parar.set()
+        self._cancelamento.cancelar()
+        self._acordar.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _agendar(self, chave, atraso):
+        instante = time.monotonic() + atraso
+        self._agendadas[chave] = instante
+        heapq.heappush(self._fila, (instante, chave))
+
+    def _executar(self):
+        while not self._parar.is_set():
+            espera = None
+            with self._lock:
+                agora = time.monotonic()
+                while self._fila and self._fila[0][0] <= agora:
+                    instante, chave = heapq.heappop(self._fila)
+                    if self._agendadas.get(chave) != instante:
+                        continue # Loja removida ou reagendada
+                    del self._agendadas[chave]
+                    self._em_execucao.add(chave)
+                    self._executor.submit(self._verificar, chave, self._lojas[chave])
+                if self._fila:
+                    espera = self._fila[0][0] - agora
+            self._acordar.wait(espera)
+            self._acordar.clear()
+
+    def _verificar(self, chave, loja):
+        try:
+            estado = self._coletar_estado(loja)
+        except Exception as e:
+            print(f"Erro ao monitorar a loja {chave}: {e}")
+            estado = None
+        mudancas = []
+        with self._lock:
+            self._em_execucao.discard(chave)
+            if chave not in self._lojas or self._parar.is_set():
+                return
+            if estado is not None:
+                anterior = self._estados.get(chave, {})
+                mudancas = [(item, anterior.get(item), atual) for item, atual in estado.items() if anterior.get(item) != atual]
+                mudancas += [(item, valor, None) for item, valor in anterior.items() if item not in estado]
+                self._estados[chave] = estado
+                agora = time.time()
+                for item, antes, depois in mudancas:
+                    self.mudancas.append((agora, chave, item, antes, depois))
+                    if antes is not None:
+                        self.transicoes[(chave, item)] = self.transicoes.get((chave, item), 0) + 1
+            self._agendar(chave, self.intervalo * random.uniform(1 - self.jitter, 1 + self.jitter))
+        self._acordar.set()
+        if mudancas and self.ao_mudanca:
+            self.ao_mudanca(loja, mudancas, estado)
+
+    def _coletar_estado(self, loja):
+        # Estado atual de cada item da loja: VMs e hosts dos links (ping) e circuitos (status no PRTG)
+        estado = {}
+        rotulos = {}
+        numero = numero_da_loja(loja)
+        if numero is not None:
+            for nome_vm, ip in ips_vms_loja(numero).items():
+                rotulos[ip] = f"VM {nome_vm} ({ip})"
+
+        prtg_api = self.obter_prtg() if self.obter_prtg else None
+        if prtg_api is not None:
+            with prtg_api.cancellable(self._cancelamento):
+                # Sem o cache de sensores: um valor de até sensor_ttl atrás esconderia uma queda rápida
+                resultado = prtg_api.get_circuit_info(nome_loja_prtg(loja.get("Nome_Loja", "")), loja.get("Core_PRTG", ""),
+                                                      use_sensor_cache=False)
+            if resultado.get("success"):
+                if self.historico:
+                    self.historico.registrar_circuitos(self.chave_loja(loja), resultado["devices_circuits"])
+                for dispositivo in resultado["devices_circuits"]:
+                    host = dispositivo.get("device_host")
+                    if host:
+                        rotulos.setdefault(host, f"Link {dispositivo.get('device_name')} ({host})")
+                    for circuito in dispositivo["circuits"]:
+                        estado[f"Circuito {circuito.get('name')}"] = str(circuito.get("status"))
+            else:
+                estado["PRTG"] = "Indisponível"
+
+        if rotulos:
+            resultados = self.network_tools.ping_hosts_concurrently(
+                list(rotulos), count=self.count, timeout=self.timeout, cancel_token=self._cancelamento
+            )
+            for host, rotulo in rotulos.items():
+                if host in resultados:
+                    if self.historico:
+                        self.historico.registrar_ping(self.chave_loja(loja), host, resultados[host])
+                    estado[rotulo] = ESTADO_ONLINE if resultados[host].get("success") else ESTADO_OFFLINE
+        return estado
@@ -1,3 +1,5 @@
+import asyncio
+import math
 import subprocess
 import platform
 import threading
@@ -6,12 +8,17 @@ import re
 import socket
 import time
 
+import icmp_engine
+from cancelamento import TokenCancelamento
+from metricas import METRICAS, registrar_sondas
+
 class NetworkTools:
-    def __init__(self):
+    def __init__(self, use_native_icmp=True):
         self.ping_results = {}
         self.ping_queue = queue.Queue()
         self.ping_threads = []
         self.max_threads = 5
+        self.use_native_icmp = use_native_icmp
         
     def _decode_output(self, output_bytes):
         if not output_bytes:
@@ -24,7 +31,16 @@ class NetworkTools:
                 continue
         return output_bytes.decode("utf-8", errors="replace")
 
-    def ping_host(self, host, count=4, timeout=2):
+    def ping_host(self, host, count=4, timeout=2, cancel_token=None):
+        # Usa o motor ICMP nativo quando o sistema permite abrir o socket; senão, o binário 'ping'
+        if self.use_native_icmp and ":" not in host and icmp_engine.icmp_available():
+            try:
+                return icmp_engine.ping(host, count=count, timeout=timeout, cancel_token=cancel_token)
+            except OSError:
+                pass
+        return self._ping_host_subprocess(host, count, timeout, cancel_token)
+
+    def _ping_host_subprocess(self, host, count=4, timeout=2, cancel_token=None):
         result = {
             "host": host,
             "success": False,
@@ -41,12 +57,18 @@ class NetworkTools:
         stdout_bytes, stderr_bytes = b"", b""
         stdout, stderr = "", ""
         process = None # Inicializa process para o bloco finally
+        kill_handle = None
+        started = time.perf_counter()
+        if cancel_token is not None and cancel_token.cancelado():
+            result["error"] = "Ping cancelado."
+            return result
 
         try:
+            # Os dois binários só aceitam inteiros (timeout pode vir fracionário, ex.: --timeout 1.5 na CLI)
             if system == "windows":
-                cmd = ["ping", "-n", str(count), "-w", str(timeout * 1000), host]
+                cmd = ["ping", "-n", str(count), "-w", str(int(timeout * 1000)), host]
             else:
-                cmd = ["ping", "-c", str(count), "-W", str(timeout), host]
+                cmd = ["ping", "-c", str(count), "-W", str(max(1, math.ceil(timeout))), host]
             
             process = subprocess.Popen(
                 cmd, 
@@ -54,7 +76,12 @@ class NetworkTools:
                 stderr=subprocess.PIPE, 
                 creationflags=subprocess.CREATE_NO_WINDOW if system == "windows" else 0
             )
+            METRICAS.observar("ping_spawn_seconds", time.perf_counter() - started)
+            if cancel_token is not None:
+                # No cancelamento o processo é morto e o communicate abaixo retorna na hora
+                kill_handle = cancel_token.ao_cancelar(process.kill)
             stdout_bytes, stderr_bytes = process.communicate(timeout=timeout + 2) # Adiciona um timeout para communicate
+            parse_started = time.perf_counter()
 
             stdout = self._decode_output(stdout_bytes)
             stderr = self._decode_output(stderr_bytes)
@@ -123,6 +150,7 @@ class NetworkTools:
                 elif stdout: 
                     error_message += f" - Saída: {stdout.strip()}"
                 result["error"] = error_message
+            METRICAS.observar("ping_parse_seconds", time.perf_counter() - parse_started)
 
         except FileNotFoundError:
             result["success"] = False
@@ -139,7 +167,19 @@ class NetworkTools:
         except Exception as e:
             result["success"] = False
             result["error"] = f"Erro inesperado ao executar ping: {str(e)} (stdout: {stdout[:100]}, stderr: {stderr[:100]})"
-        
+        finally:
+            if cancel_token is not None:
+                cancel_token.remover(kill_handle)
+        if cancel_token is not None and cancel_token.cancelado():
+            result["success"] = False
+            result["error"] = "Ping cancelado."
+
+        # A saída do ping do sistema traz só o resumo: o RTT registrado é o médio do host
+        METRICAS.observar("ping_host_seconds", time.perf_counter() - started, method="subprocess")
+        if process is not None:
+            registrar_sondas("subprocess", count, round(count * (100 - result["packet_loss"]) / 100))
+        if result["avg_time"] is not None:
+            METRICAS.observar("ping_rtt_ms", result["avg_time"], method="subprocess")
         return result
     
     def _ping_worker(self):
@@ -215,6 +255,108 @@ class NetworkTools:
         final_results = {k: self.ping_results[k] for k in keys_for_results if k in self.ping_results}
         return final_results
 
+    async def ping_many(self, hosts, count=4, timeout=2, rate=1000, max_concurrency=32, cancel_token=None):
+        """
+        Pinga muitos hosts ao mesmo tempo e produz (chave, resultado) à medida que cada um termina.
+
+        `hosts` aceita os mesmos itens de ping_multiple_hosts: o host ou uma tupla (host, chave).
+        Com socket ICMP disponível, os hosts IPv4 passam por um único socket (icmp_engine.ping_many);
+        os demais (IPv6, como em ping_host, ou todos sem socket ICMP) usam o ping do sistema em
+        threads, limitado a `max_concurrency`. Com `cancel_token` (cancelamento.TokenCancelamento),
+        o cancelamento para o envio ICMP e mata os processos de ping em andamento.
+        """
+        targets = [item if isinstance(item, tuple) else (item, item) for item in hosts]
+        if not targets:
+            return
+
+        native, system = [], targets
+        if self.use_native_icmp and icmp_engine.icmp_available():
+            native = [(host, key) for host, key in targets if ":" not in host]
+            system = [(host, key) for host, key in targets if ":" in host]
+
+        results = asyncio.Queue()
+        failed = object() # Marca, na fila, uma exceção inesperada a repassar para quem consome
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def ping_system(items):
+            async def ping_one(host, key):
+                async with semaphore:
+                    results.put_nowait((key, await asyncio.to_thread(self._ping_host_subprocess, host, count, timeout, cancel_token)))
+            await asyncio.gather(*(ping_one(host, key) for host, key in items))
+
+        async def ping_native(items):
+            delivered = set()
+            try:
+                async for key, result in icmp_engine.ping_many(items, count=count, timeout=timeout, rate=rate,
+                                                               cancel_token=cancel_token):
+                    delivered.add(key)
+                    results.put_nowait((key, result))
+            except (OSError, NotImplementedError):
+                # Ex.: event loop sem add_reader (Proactor no Windows): quem falta vai pelo ping do sistema
+                await ping_system([(host, key) for host, key in items if key not in delivered])
+
+        async def guarded(coro):
+            try:
+                await coro
+            except Exception as e:
+                results.put_nowait((failed, e))
+
+        tasks = [asyncio.create_task(guarded(ping_native(native)))] if native else []
+        if system:
+            tasks.append(asyncio.create_task(guarded(ping_system(system))))
+        try:
+            for _ in range(len(targets)):
+                key, result = await results.get()
+                if key is failed:
+                    raise result
+                yield key, result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def ping_hosts_concurrently(self, hosts, count=4, timeout=2, on_result=None, should_stop=None, cancel_token=None):
+        """
+        Versão síncrona de ping_many, para uso a partir de threads comuns (ex.: ações da GUI).
+
+        Chama on_result(chave, resultado) assim que cada host termina e interrompe a varredura
+        quando should_stop() retornar True ou `cancel_token` for cancelado; neste caso os processos
+        de ping em andamento são mortos e a função retorna sem esperá-los.
+        Retorna {chave: resultado} dos hosts concluídos.
+        """
+        results = {}
+        # Token interno: should_stop também precisa matar os processos, senão o asyncio.run espera
+        # os pings em andamento terminarem. O token de quem chamou só repassa o cancelamento.
+        token = TokenCancelamento()
+        link = cancel_token.ao_cancelar(token.cancelar) if cancel_token is not None else None
+
+        async def consume():
+            async for key, result in self.ping_many(hosts, count=count, timeout=timeout, cancel_token=token):
+                if token.cancelado():
+                    break # Resultados de processos mortos no cancelamento não são entregues
+                results[key] = result
+                if on_result:
+                    on_result(key, result)
+
+        async def run():
+            consumer = asyncio.create_task(consume())
+            while not consumer.done():
+                if token.cancelado() or (should_stop and should_stop()):
+                    token.cancelar()
+                    consumer.cancel()
+                    break
+                await asyncio.wait({consumer}, timeout=0.1)
+            try:
+                await consumer
+            except asyncio.CancelledError:
+                pass
+
+        try:
+            asyncio.run(run())
+        finally:
+            if cancel_token is not None:
+                cancel_token.remover(link)
+        return results
+
     def resolve_hostname(self, hostname):
         try:
             return socket.gethostbyname(hostname)
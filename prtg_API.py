@@ -1,53 +1,793 @@
 import requests
+import codecs
 import json
+import os
+import queue
+import re
+import socket
+import threading
+import time
 import urllib3
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import quote, urlencode
+
+from metricas import METRICAS, registrar_requisicao_prtg
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+class TTLCache:
+    # Cache LRU de tamanho limitado com expiração por entrada (thread-safe)
+    # Com `name`, cada consulta conta como acerto ou falha em cache_requests_total
+    # `version` muda sempre que o conteúdo muda (usado para saber se vale regravar o snapshot)
+    def __init__(self, maxsize=512, ttl=600, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.version = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._data[key]
+                entry = None
+            if entry is not None:
+                self._data.move_to_end(key)
+        if self.name:
+            METRICAS.incrementar("cache_requests_total", cache=self.name, result="miss" if entry is None else "hit")
+        return default if entry is None else entry[0]
+
+    def peek(self, key, default=None):
+        # Como get, mas sem contar nas métricas nem mexer na ordem LRU
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return default
+        return entry[0]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            previous = self._data.get(key)
+            if previous is None or previous[0] != value:
+                self.version += 1
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                if self._data:
+                    self.version += 1
+                self._data.clear()
+            elif self._data.pop(key, None) is not None:
+                self.version += 1
+
+    def items(self):
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value) for key, (value, expires_at) in self._data.items() if expires_at > now]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+class RequestCancelled(requests.exceptions.RequestException):
+    # Requisição abandonada porque a operação foi cancelada (tratada como qualquer erro de rede)
+    pass
+
+def close_response(response):
+    # Fecha a resposta a partir de outro thread: close() sozinho fica esperando a leitura bloqueada
+    # terminar (até o timeout); derrubar o socket antes acorda quem está lendo na hora
+    connection = getattr(response.raw, "_connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+def normalize_name(name):
+    # Mesma comparação de nomes nas consultas ao PRTG e nos índices locais
+    return str(name or '').strip().lower()
+
+class TopologyIndex:
+    # Índices em memória da árvore completa do PRTG, montados a partir das tabelas de grupos e dispositivos.
+    # Loja é o grupo que contém dispositivos; Core é o grupo acima dela (que não contém dispositivos).
+    def __init__(self, groups, devices, synced_at=None):
+        self.groups = groups
+        self.devices = devices
+        self.synced_at = synced_at or time.time()
+        self.cores = {}
+        self.stores = {}
+        self.stores_by_code = {}
+        self.devices_by_group = {}
+        self.devices_by_host = {}
+
+        groups_by_id = {str(g.get('objid')): g for g in groups}
+        with_devices = {str(d.get('parentid')) for d in devices}
+        core_ids = set()
+        for group_id in with_devices:
+            parent = groups_by_id.get(str(groups_by_id.get(group_id, {}).get('parentid')))
+            if parent is not None and str(parent.get('objid')) not in with_devices:
+                core_ids.add(str(parent.get('objid')))
+                self.cores.setdefault(normalize_name(parent.get('name')), parent.get('objid'))
+        for group in groups:
+            if str(group.get('parentid')) in core_ids:
+                name = normalize_name(group.get('name'))
+                core_name = normalize_name(groups_by_id[str(group.get('parentid'))].get('name'))
+                self.stores[(core_name, name)] = group.get('objid')
+                self.stores_by_code.setdefault(name, []).append(group)
+        for device in devices:
+            self.devices_by_group.setdefault(str(device.get('parentid')), []).append(device)
+            host = str(device.get('host') or '').strip().lower()
+            if host:
+                self.devices_by_host.setdefault(host, device)
+
+    def is_fresh(self, max_age):
+        return time.time() - self.synced_at < max_age
+
+class JSONArrayStream:
+    # Decodificador incremental: recebe os bytes da resposta aos poucos e devolve cada linha do
+    # array `key` (ex: "devices") assim que ela termina de chegar, sem montar o documento inteiro.
+    _WHITESPACE = " \t\r\n,"
+    _TREESIZE_RE = re.compile(r'"treesize"\s*:\s*(\d+)')
+
+    def __init__(self, key):
+        self._start_re = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._state = "prefix"  # prefix -> array -> suffix
+        self.treesize = None
+
+    @property
+    def finished(self):
+        return self._state == "suffix"
+
+    def _find_treesize(self, text):
+        if self.treesize is None:
+            match = self._TREESIZE_RE.search(text)
+            if match:
+                self.treesize = int(match.group(1))
+
+    def feed(self, data):
+        self._buffer += self._decoder.decode(data)
+        rows = []
+        if self._state == "prefix":
+            match = self._start_re.search(self._buffer)
+            if not match:
+                return rows
+            self._find_treesize(self._buffer[:match.start()])
+            self._buffer = self._buffer[match.end():]
+            self._state = "array"
+
+        if self._state == "array":
+            buffer = self._buffer
+            pos = 0
+            while True:
+                while pos < len(buffer) and buffer[pos] in self._WHITESPACE:
+                    pos += 1
+                if pos >= len(buffer):
+                    break
+                if buffer[pos] == "]":
+                    pos += 1
+                    self._state = "suffix"
+                    break
+                try:
+                    row, pos = self._json.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    break  # Objeto ainda incompleto: aguarda o próximo pedaço
+                rows.append(row)
+            self._buffer = buffer[pos:]
+        return rows
+
+    def close(self):
+        self._buffer += self._decoder.decode(b"", final=True)
+        if self._state == "array":
+            raise json.JSONDecodeError("Array JSON incompleto na resposta do PRTG", self._buffer, 0)
+        self._find_treesize(self._buffer)
+        self._buffer = ""
+
+TOPOLOGY_SNAPSHOT_VERSION = 1
+
+def sub_filter(value):
+    # Filtro @sub() do table.json com o valor codificado: &, #, +, % e espaços no nome não podem
+    # ir crus na URL (truncariam ou alterariam a consulta)
+    return f"@sub({quote(str(value), safe='')})"
+
+def find_group_by_name(groups, name):
+    name = normalize_name(name)
+    return next((g for g in groups if normalize_name(g.get('name')) == name), None)
+
+def group_sensors_by_device(sensors):
+    sensors_by_device = {}
+    for sensor in sensors:
+        sensors_by_device.setdefault(str(sensor.get('parentid')), []).append(sensor)
+    return sensors_by_device
+
+def build_devices_circuits(devices, sensors_by_device):
+    # Circuito = sensor com o mesmo nome do dispositivo que o contém
+    devices_circuits = []
+    for device_info in devices:
+        device_id = device_info.get('objid')
+        device_name = device_info.get('device', '')
+
+        if not device_name:
+            continue
+
+        device_name_norm = device_name.strip().lower()
+        device_circuits_list = []
+        for sensor_data in sensors_by_device.get(str(device_id), []):
+            if sensor_data.get('sensor', '').strip().lower() == device_name_norm:
+                device_circuits_list.append({
+                    "id": sensor_data.get('objid'),
+                    "name": sensor_data.get('sensor'),
+                    "status": sensor_data.get('status'),
+                    "status_raw": sensor_data.get('status_raw'),
+                    "message": sensor_data.get('message_raw') or sensor_data.get('message'),
+                    "lastvalue": sensor_data.get('lastvalue')
+                })
+
+        if device_circuits_list:
+            devices_circuits.append({
+                "device_id": device_id,
+                "device_name": device_name,
+                "device_host": device_info.get('host'),
+                "device_status": device_info.get('status'),
+                "circuits": device_circuits_list
+            })
+    return devices_circuits
+
+CORE_STATUS_UP = "Up"
+CORE_STATUS_DOWN = "Down"
+CORE_STATUS_PARTIAL = "Parcial"
+CORE_STATUS_NO_CIRCUITS = "Sem circuitos"
+CIRCUIT_DOWN_STATUS_RAW = {5, 13, 14} # Down, Down (confirmado) e Down (parcial) no status_raw do PRTG
+
+def circuit_is_down(circuit):
+    status_raw = circuit.get('status_raw')
+    if status_raw not in (None, ''):
+        try:
+            return int(status_raw) in CIRCUIT_DOWN_STATUS_RAW
+        except (TypeError, ValueError):
+            pass
+    return 'down' in str(circuit.get('status') or '').lower()
+
+def build_core_status(core_id, groups, devices, sensors):
+    # Monta {nome da loja: status dos circuitos} a partir das tabelas de grupos, dispositivos e sensores
+    # abaixo de um Core. Lojas são os grupos filhos diretos do Core; subgrupos contam para a loja acima.
+    core_id = str(core_id)
+    parents = {str(g.get('objid')): str(g.get('parentid')) for g in groups}
+    stores = {str(g.get('objid')): g for g in groups if str(g.get('parentid')) == core_id}
+
+    def store_of(group_id):
+        for _ in range(len(parents) + 1):
+            if group_id in stores or group_id not in parents:
+                break
+            group_id = parents[group_id]
+        return group_id if group_id in stores else None
+
+    devices_by_store = {}
+    for device in devices:
+        store_id = store_of(str(device.get('parentid')))
+        if store_id is not None:
+            devices_by_store.setdefault(store_id, []).append(device)
+    sensors_by_device = group_sensors_by_device(sensors)
+
+    status = {}
+    for store_id, group in stores.items():
+        store_devices = devices_by_store.get(store_id, [])
+        devices_circuits = build_devices_circuits(store_devices, sensors_by_device)
+        circuits = [c for device in devices_circuits for c in device['circuits']]
+        down_circuits = [str(c.get('name')) for c in circuits if circuit_is_down(c)]
+        down = len(down_circuits)
+        if not circuits:
+            summary = CORE_STATUS_NO_CIRCUITS
+        elif not down:
+            summary = CORE_STATUS_UP
+        elif down == len(circuits):
+            summary = CORE_STATUS_DOWN
+        else:
+            summary = CORE_STATUS_PARTIAL
+        status[str(group.get('name', '')).strip()] = {
+            "group_id": group.get('objid'),
+            "status": summary,
+            "circuits_total": len(circuits),
+            "circuits_down": down,
+            "down_circuits": down_circuits,
+            "devices": store_devices,
+            "sensors_by_device": {str(d.get('objid')): sensors_by_device.get(str(d.get('objid')), []) for d in store_devices},
+            "devices_circuits": devices_circuits
+        }
+    return status
+
 class PRTGAPI:
-    def __init__(self, server_url, username, passhash, verify_ssl=False):
+    def __init__(self, server_url, username, passhash, verify_ssl=False, page_size=2500,
+                 topology_ttl=600, sensor_ttl=15, cache_size=512, timeout=15,
+                 stream_json=True, stream_chunk_size=65536):
         self.server_url = server_url.rstrip('/')
         self.username = username
         self.passhash = passhash
         self.verify_ssl = verify_ssl
+        self.page_size = page_size
+        self.timeout = timeout
+        self.topology_ttl = topology_ttl
+        self.stream_json = stream_json
+        self.stream_chunk_size = stream_chunk_size
         self.session = requests.Session()
+        # Hierarquia Core -> Loja -> Dispositivos muda pouco; valores de sensores mudam a todo momento
+        self.topology_cache = TTLCache(maxsize=cache_size, ttl=topology_ttl, name="topology")
+        self.sensor_cache = TTLCache(maxsize=cache_size, ttl=sensor_ttl, name="sensors")
+        self.topology_path = None
+        self.topology_index = None
+        self._index_version = 0  # Incrementado a cada troca de topology_index
+        self._saved_state = None  # Estado da topologia gravado por último (ou carregado do disco)
+        self._save_lock = threading.Lock()
+        self._revalidation_thread = None
+        self._stopped = threading.Event()  # Cliente substituído: a revalidação em segundo plano desiste
+        self._local = threading.local()
+
+    @contextmanager
+    def cancellable(self, token):
+        # Requisições feitas por este thread dentro do bloco são abandonadas assim que o token
+        # (cancelamento.TokenCancelamento) for cancelado, levantando RequestCancelled
+        previous = getattr(self._local, "token", None)
+        self._local.token = token
+        try:
+            yield
+        finally:
+            self._local.token = previous
+
+    def _abortable(self, token, produce):
+        # Executa produce(emit, abandoned) em um thread auxiliar e entrega aqui o que ele emitir.
+        # No cancelamento, quem consome é liberado na hora; o auxiliar para de ler (ver _open) e a
+        # conexão é fechada, sem voltar ao pool.
+        if token.cancelado():
+            raise RequestCancelled("Requisição ao PRTG cancelada.")
+        items = queue.Queue()
+        abandoned = threading.Event()
+
+        def run():
+            try:
+                produce(lambda value: items.put(("item", value)), abandoned.is_set)
+                items.put(("end", None))
+            except Exception as e:
+                items.put(("end", e))
+
+        handle = token.ao_cancelar(lambda: items.put(("end", RequestCancelled("Requisição ao PRTG cancelada."))))
+        threading.Thread(target=run, daemon=True, name="prtg-request").start()
+        try:
+            while True:
+                kind, value = items.get()
+                if kind == "item":
+                    yield value
+                elif value is not None:
+                    raise value
+                else:
+                    return
+        finally:
+            abandoned.set()
+            token.remover(handle)
+
+    @contextmanager
+    def _open(self, url, timeout, token):
+        # Resposta em modo stream; com token, o cancelamento derruba a conexão no meio da leitura
+        with self.session.get(url, verify=self.verify_ssl, timeout=timeout or self.timeout, stream=True) as response:
+            handle = token.ao_cancelar(lambda: close_response(response)) if token is not None else None
+            try:
+                yield response
+            finally:
+                if token is not None:
+                    token.remover(handle)
+
+    def _send(self, url, timeout):
+        token = getattr(self._local, "token", None)
+        if token is None:
+            response = self.session.get(url, verify=self.verify_ssl, timeout=timeout or self.timeout)
+            response.content # Lê o corpo inteiro aqui, como no caminho cancelável
+            return response
+
+        def produce(emit, abandoned):
+            with self._open(url, timeout, token) as response:
+                body = []
+                for chunk in response.iter_content(chunk_size=self.stream_chunk_size):
+                    if abandoned():
+                        return
+                    body.append(chunk)
+                response._content = b"".join(body) # Corpo já lido: .content/.json() funcionam como sem stream
+            emit(response)
+
+        responses = self._abortable(token, produce)
+        try:
+            return next(responses)
+        finally:
+            responses.close()
+
+    def _iter_chunks(self, url, timeout):
+        token = getattr(self._local, "token", None)
+        if token is None:
+            with self._open(url, timeout, None) as response:
+                response.raise_for_status()
+                yield from response.iter_content(chunk_size=self.stream_chunk_size)
+            return
+
+        def produce(emit, abandoned):
+            with self._open(url, timeout, token) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=self.stream_chunk_size):
+                    if abandoned():
+                        return
+                    emit(chunk)
+
+        yield from self._abortable(token, produce)
 
     def build_url(self, endpoint: str) -> str:
         connector = "&" if "?" in endpoint else "?"
-        return f"{self.server_url}{endpoint}{connector}username={self.username}&passhash={self.passhash}"
+        credentials = urlencode({"username": self.username, "passhash": self.passhash})
+        return f"{self.server_url}{endpoint}{connector}{credentials}"
+
+    def _get(self, url, content, timeout=None):
+        # GET com a resposta inteira em memória; registra contagem, latência e bytes por conteúdo
+        started = time.perf_counter()
+        size = 0
+        status = "error"
+        try:
+            response = self._send(url, timeout)
+            size = len(response.content)
+            response.raise_for_status()
+            status = "ok"
+            return response
+        except RequestCancelled:
+            status = "cancelled"
+            raise
+        finally:
+            registrar_requisicao_prtg(content, time.perf_counter() - started, size, status)
+
+    def _fetch_rows(self, url, content, timeout, meta):
+        if not self.stream_json:
+            data = self._get(url, content, timeout).json()
+            meta['treesize'] = data.get('treesize')
+            yield from data.get(content, [])
+            return
+
+        # A duração inclui o consumo das linhas, que acontece enquanto a resposta chega
+        started = time.perf_counter()
+        size = rows = 0
+        status = "error"
+        try:
+            parser = JSONArrayStream(content)
+            for chunk in self._iter_chunks(url, timeout):
+                size += len(chunk)
+                for row in parser.feed(chunk):
+                    rows += 1
+                    yield row
+            parser.close()
+            meta['treesize'] = parser.treesize
+            status = "ok"
+        except GeneratorExit:
+            status = "closed" # Consumidor parou antes do fim (ex.: get_device_by_name)
+            raise
+        except RequestCancelled:
+            status = "cancelled"
+            raise
+        finally:
+            registrar_requisicao_prtg(content, time.perf_counter() - started, size, status, rows)
+
+    def _iter_table_rows(self, content, columns, filters="", timeout=None, page_size=None):
+        # Busca paginada no table.json: avança com start/count até esgotar o treesize informado pelo PRTG.
+        # As linhas são entregues uma a uma; quem parar de consumir encerra a resposta em andamento.
+        page_size = page_size or self.page_size
+        start = 0
+        while True:
+            url = self.build_url(f"/api/table.json?content={content}&output=json&columns={columns}&count={page_size}&start={start}{filters}")
+            meta = {}
+            count = 0
+            for row in self._fetch_rows(url, content, timeout, meta):
+                count += 1
+                yield row
+            start += count
+            total = meta.get('treesize')
+            if count < page_size or (isinstance(total, int) and start >= total):
+                return
+
+    def _get_table(self, content, columns, filters="", timeout=None):
+        return list(self._iter_table_rows(content, columns, filters, timeout))
+
+    def invalidate_cache(self, topology=True, sensors=True):
+        if topology:
+            self.topology_cache.invalidate()
+            self.topology_index = None
+            self._index_version += 1
+        if sensors:
+            self.sensor_cache.invalidate()
+
+    def invalidate_store(self, loja_name, core_name):
+        key = ("store", core_name.strip().lower(), loja_name.strip().lower())
+        group_id = self.topology_cache.peek(key)  # Sem contar como acerto/falha nas métricas do cache
+        self.topology_cache.invalidate(key)
+        if group_id is not None:
+            self.topology_cache.invalidate(("devices", str(group_id)))
+            self.sensor_cache.invalidate(str(group_id))
+
+    def _current_index(self):
+        # O índice só responde enquanto for recente; depois disso as consultas voltam a ir ao PRTG
+        index = self.topology_index
+        if index is None or not index.is_fresh(self.topology_ttl):
+            return None
+        return index
+
+    def _resolve_core_group_id(self, core_name, use_cache=True):
+        key = ("core", core_name.strip().lower())
+        index = self._current_index() if use_cache else None
+        if index is not None and key[1] in index.cores:
+            return index.cores[key[1]]
+        cached = self.topology_cache.get(key) if use_cache else None
+        if cached is not None:
+            return cached
+
+        grupos = self._iter_table_rows("groups", "objid,name", f"&filter_name={sub_filter(core_name)}")
+        grupo_core_obj = find_group_by_name(grupos, core_name)
+        grupos.close()
+        if not grupo_core_obj:
+            return None
+        self.topology_cache.set(key, grupo_core_obj['objid'])
+        return grupo_core_obj['objid']
+
+    def _resolve_store_group_id(self, core_name, grupo_core_id, loja_name, use_cache=True):
+        key = ("store", core_name.strip().lower(), loja_name.strip().lower())
+        index = self._current_index() if use_cache else None
+        if index is not None and key[1:] in index.stores:
+            return index.stores[key[1:]]
+        cached = self.topology_cache.get(key) if use_cache else None
+        if cached is not None:
+            return cached
+
+        grupos = self._iter_table_rows("groups", "objid,name,parentid", f"&filter_name={sub_filter(loja_name)}&filter_parentid={grupo_core_id}")
+        grupo_loja_obj = find_group_by_name(grupos, loja_name)
+        grupos.close()
+        if not grupo_loja_obj:
+            return None
+        self.topology_cache.set(key, grupo_loja_obj['objid'])
+        return grupo_loja_obj['objid']
+
+    def _get_group_devices(self, group_id, use_cache=True):
+        key = ("devices", str(group_id))
+        index = self._current_index() if use_cache else None
+        if index is not None and key[1] in index.devices_by_group:
+            return index.devices_by_group[key[1]]
+        cached = self.topology_cache.get(key) if use_cache else None
+        if cached is not None:
+            return cached
+
+        devices = self._get_table("devices", "objid,device,host,group,status", f"&filter_parentid={group_id}")
+        if devices:
+            self.topology_cache.set(key, devices)
+        return devices
+
+    def sync_topology(self):
+        # Baixa todos os grupos e dispositivos em poucas chamadas paginadas e monta os índices locais
+        try:
+            groups = self._get_table("groups", "objid,name,parentid", timeout=60)
+            devices = self._get_table("devices", "objid,device,host,group,group_raw,status,parentid", timeout=60)
+        except requests.exceptions.RequestException as e:
+            return False, f"Erro ao sincronizar topologia do PRTG: {str(e)}"
+        except json.JSONDecodeError as e:
+            return False, f"Erro ao decodificar JSON da topologia do PRTG: {str(e)}"
+
+        previous = self.topology_index
+        self.topology_index = TopologyIndex(groups, devices)
+        if previous is None or previous.groups != groups or previous.devices != devices:
+            self._index_version += 1
+        return True, f"Topologia do PRTG sincronizada: {len(groups)} grupos, {len(devices)} dispositivos."
+
+    def get_device_by_host(self, host):
+        index = self._current_index()
+        if index is None:
+            return None
+        return index.devices_by_host.get(str(host).strip().lower())
+
+    def _topology_state(self):
+        return (self.topology_cache.version, self._index_version)
+
+    def save_topology(self, path=None, force=False, wait=True):
+        # Grava a topologia resolvida (Cores, grupos de loja e dispositivos) em JSON versionado.
+        # Sem mudanças desde a última gravação (ou desde o carregamento), não regrava o arquivo.
+        # Com wait=False, se outra gravação estiver em andamento retorna False sem gravar: quem está
+        # gravando confere de novo ao terminar e inclui as mudanças feitas nesse meio-tempo.
+        path = path or self.topology_path
+        if not path:
+            return False
+        if not self._save_lock.acquire(blocking=wait):
+            return False
+        try:
+            while True:
+                state = self._topology_state()
+                if not force and path == self.topology_path and state == self._saved_state:
+                    return True
+                if not self._write_topology(path):
+                    return False
+                if force or path != self.topology_path:
+                    return True
+                self._saved_state = state
+        finally:
+            self._save_lock.release()
+
+    def _write_topology(self, path):
+        snapshot = {
+            "version": TOPOLOGY_SNAPSHOT_VERSION,
+            "server": self.server_url,
+            "saved_at": time.time(),
+            "cores": {},
+            "stores": [],
+            "devices": {}
+        }
+        for key, value in self.topology_cache.items():
+            if key[0] == "core":
+                snapshot["cores"][key[1]] = value
+            elif key[0] == "store":
+                snapshot["stores"].append([key[1], key[2], value])
+            elif key[0] == "devices":
+                snapshot["devices"][key[1]] = value
+        if self.topology_index is not None:
+            snapshot["index"] = {
+                "synced_at": self.topology_index.synced_at,
+                "groups": self.topology_index.groups,
+                "devices": self.topology_index.devices
+            }
+
+        # Nome temporário por processo e thread: gravações simultâneas (GUI e CLI) não se atropelam
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, path)  # Troca atômica: nunca deixa um snapshot pela metade
+            return True
+        except OSError as e:
+            print(f"Erro ao salvar topologia do PRTG: {str(e)}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+
+    def load_topology(self, path, revalidate=True):
+        # Carrega o snapshot salvo por save_topology e agenda a revalidação em segundo plano.
+        # As entradas do cache recebem só o que resta do TTL, descontada a idade do snapshot.
+        self.topology_path = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            print(f"Snapshot de topologia do PRTG ignorado ({path}): {str(e)}")
+            return 0
+
+        if snapshot.get("version") != TOPOLOGY_SNAPSHOT_VERSION or snapshot.get("server") != self.server_url:
+            return 0
+
+        loaded = 0
+        index = snapshot.get("index")
+        if index:
+            self.topology_index = TopologyIndex(index.get("groups", []), index.get("devices", []), index.get("synced_at"))
+            loaded += len(self.topology_index.groups) + len(self.topology_index.devices)
+        remaining = self.topology_cache.ttl - max(0.0, time.time() - (snapshot.get("saved_at") or 0))
+        if remaining > 0:  # Snapshot mais velho que o TTL: as entradas já estariam vencidas
+            for core, objid in snapshot.get("cores", {}).items():
+                self.topology_cache.set(("core", core), objid, ttl=remaining)
+                loaded += 1
+            for core, loja, objid in snapshot.get("stores", []):
+                self.topology_cache.set(("store", core, loja), objid, ttl=remaining)
+                loaded += 1
+            for group_id, devices in snapshot.get("devices", {}).items():
+                self.topology_cache.set(("devices", group_id), devices, ttl=remaining)
+                loaded += 1
+        self._saved_state = self._topology_state()  # O que está em memória é o que está no disco
+
+        if revalidate and loaded and not self._stopped.is_set():
+            self._revalidation_thread = threading.Thread(target=self._revalidate_topology, daemon=True)
+            self._revalidation_thread.start()
+        return loaded
+
+    def stop_revalidation(self):
+        # Chamado quando o cliente é substituído (ex.: PRTG reconfigurado): a revalidação em
+        # andamento para na próxima etapa e não grava o snapshot
+        self._stopped.set()
+
+    def _revalidate_topology(self, delay=5.0, pause=0.5):
+        # Confere cada entrada do snapshot com o PRTG sem bloquear as consultas do operador
+        if self._stopped.wait(delay):
+            return
+        if self.topology_index is not None:
+            success, message = self.sync_topology()
+            if self._stopped.is_set():
+                return
+            if not success:
+                print(f"Revalidação da topologia do PRTG interrompida: {message}")
+                return
+            self.save_topology()
+            return
+
+        stores = [key for key, _ in self.topology_cache.items() if key[0] == "store"]
+        try:
+            for _, core, loja in stores:
+                if self._stopped.is_set():
+                    return
+                core_id = self._resolve_core_group_id(core, use_cache=False)
+                if core_id is None:
+                    self.topology_cache.invalidate(("core", core))
+                    self.invalidate_store(loja, core)
+                    continue
+                old_group_id = self.topology_cache.peek(("store", core, loja))
+                group_id = self._resolve_store_group_id(core, core_id, loja, use_cache=False)
+                if group_id is None or group_id != old_group_id:
+                    self.topology_cache.invalidate(("store", core, loja))
+                    if old_group_id is not None:
+                        self.topology_cache.invalidate(("devices", str(old_group_id)))
+                    if group_id is None:
+                        continue
+                    self.topology_cache.set(("store", core, loja), group_id)
+                self._get_group_devices(group_id, use_cache=False)
+                if self._stopped.wait(pause):
+                    return
+        except requests.exceptions.RequestException as e:
+            print(f"Revalidação da topologia do PRTG interrompida: {str(e)}")
+            return
+        self.save_topology()
 
     def test_connection(self):
         try:
             url = self.build_url("/api/table.json?content=sensors&output=json&count=1")
-            response = self.session.get(url, verify=self.verify_ssl, timeout=10)
-            response.raise_for_status()
+            self._get(url, "sensors", timeout=10)
             return True, "Conexão com PRTG estabelecida com sucesso."
         except requests.exceptions.RequestException as e:
             return False, f"Erro ao conectar ao PRTG: {str(e)}"
 
-    def get_device_by_name(self, device_name):
-        try:
-            url = self.build_url("/api/table.json?content=devices&output=json&columns=objid,device,group,status")
-            response = self.session.get(url, verify=self.verify_ssl)
-            response.raise_for_status()
-            data = response.json()
+    def get_device_by_name(self, device_name, page_size=100):
+        name_norm = device_name.lower()
+        index = self._current_index()
+        if index is not None:
+            device = next((d for d in index.devices if name_norm in d.get('device', '').lower()), None)
+            if device is not None:
+                return device
 
-            for device in data.get('devices', []):
-                if device_name.lower() in device.get('device', '').lower():
-                    return device
-            return None
+        try:
+            # O filtro é aplicado no servidor; as páginas são lidas só até o primeiro resultado
+            devices = self._iter_table_rows("devices", "objid,device,group,status",
+                                            f"&filter_device={sub_filter(device_name)}", page_size=page_size)
+            device = next((d for d in devices if name_norm in d.get('device', '').lower()), None)
+            devices.close()
+            return device
         except requests.exceptions.RequestException as e:
             print(f"Erro ao buscar dispositivo: {str(e)}")
             return None
 
     def get_device_by_core(self, core_name, loja_name):
+        index = self._current_index()
+        loja_norm = normalize_name(loja_name)
+        if index is not None and loja_norm in index.stores_by_code:
+            grupo_loja_id = index.stores_by_code[loja_norm][0].get('objid')
+            for device in index.devices_by_group.get(str(grupo_loja_id), []):
+                if core_name.lower() in device.get('group', '').lower():
+                    return device
+            print(f"Nenhum dispositivo encontrado no grupo '{loja_name}' que corresponda ao core '{core_name}'.")
+            return None
+
         try:
-            url_groups = self.build_url(f"/api/table.json?content=groups&output=json&columns=objid,name&filter_name=@sub({loja_name})")
-            response_groups = self.session.get(url_groups, verify=self.verify_ssl)
-            response_groups.raise_for_status()
-            data_groups = response_groups.json()
+            url_groups = self.build_url(f"/api/table.json?content=groups&output=json&columns=objid,name&filter_name={sub_filter(loja_name)}")
+            data_groups = self._get(url_groups, "groups").json()
 
-            grupo_loja = next((g for g in data_groups.get('groups', []) if g.get('name', '').lower() == loja_name.lower()), None)
+            grupo_loja = find_group_by_name(data_groups.get('groups', []), loja_name)
 
             if not grupo_loja:
                 print(f"Grupo '{loja_name}' não encontrado.")
@@ -55,9 +795,7 @@ class PRTGAPI:
 
             grupo_loja_id = grupo_loja['objid']
             url_devices = self.build_url(f"/api/table.json?content=devices&output=json&columns=objid,device,group,status,group_raw&filter_parentid={grupo_loja_id}")
-            response_devices = self.session.get(url_devices, verify=self.verify_ssl)
-            response_devices.raise_for_status()
-            dispositivos_data = response_devices.json()
+            dispositivos_data = self._get(url_devices, "devices").json()
 
             for device in dispositivos_data.get('devices', []):
                 if core_name.lower() in device.get('group', '').lower():
@@ -73,15 +811,28 @@ class PRTGAPI:
     def get_sensors_by_device_id(self, device_id):
         try:
             url = self.build_url(f"/api/table.json?content=sensors&output=json&columns=objid,sensor,message_raw,message,lastvalue&id={device_id}")
-            response = self.session.get(url, verify=self.verify_ssl)
-            response.raise_for_status()
-            data = response.json()
+            data = self._get(url, "sensors").json()
             return data.get('sensors', [])
         except requests.exceptions.RequestException as e:
             print(f"Erro ao buscar sensores: {str(e)}")
             return []
 
-    def get_circuit_info(self, loja_name, core_name):
+    def get_sensors_by_group_id(self, group_id, use_cache=True):
+        # Uma única consulta (paginada) traz os sensores de todos os dispositivos do grupo,
+        # agrupados aqui pelo parentid (objid do dispositivo pai).
+        cached = self.sensor_cache.get(str(group_id)) if use_cache else None
+        if cached is not None:
+            return cached
+
+        sensors = self._get_table(
+            "sensors", "objid,sensor,parentid,status,status_raw,message_raw,message,lastvalue", f"&id={group_id}"
+        )
+        sensors_by_device = group_sensors_by_device(sensors)
+        self.sensor_cache.set(str(group_id), sensors_by_device)
+        return sensors_by_device
+
+    def get_circuit_info(self, loja_name, core_name, use_sensor_cache=True):
+        # use_sensor_cache=False busca os sensores no PRTG mesmo com valores ainda no cache (ex.: monitor)
         result = {
             "success": False,
             "message": "",
@@ -89,75 +840,26 @@ class PRTGAPI:
         }
 
         try:
-            url_cores = self.build_url(f"/api/table.json?content=groups&output=json&columns=objid,name&filter_name=@sub({core_name})")
-            response_cores = self.session.get(url_cores, verify=self.verify_ssl, timeout=15)
-            response_cores.raise_for_status()
-            data_cores = response_cores.json()
-
-            grupo_core_obj = next((g for g in data_cores.get('groups', []) if g.get('name', '').strip().lower() == core_name.strip().lower()), None)
-
-            if not grupo_core_obj:
+            grupo_core_id = self._resolve_core_group_id(core_name)
+            if grupo_core_id is None:
                 result["message"] = f"Grupo Core '{core_name}' não encontrado no PRTG."
                 return result
-            grupo_core_id = grupo_core_obj['objid']
-
-            url_lojas = self.build_url(f"/api/table.json?content=groups&output=json&columns=objid,name,parentid&filter_name=@sub({loja_name})&filter_parentid={grupo_core_id}")
-            response_lojas = self.session.get(url_lojas, verify=self.verify_ssl, timeout=15)
-            response_lojas.raise_for_status()
-            data_lojas = response_lojas.json()
-
-            grupo_loja_obj = next((g for g in data_lojas.get('groups', []) if g.get('name', '').strip().lower() == loja_name.strip().lower()), None)
 
-            if not grupo_loja_obj:
+            grupo_loja_id = self._resolve_store_group_id(core_name, grupo_core_id, loja_name)
+            if grupo_loja_id is None:
                 result["message"] = f"Grupo (Loja) '{loja_name}' não encontrado dentro do Core '{core_name}'."
                 return result
-            grupo_loja_id = grupo_loja_obj['objid']
 
-            url_devices = self.build_url(f"/api/table.json?content=devices&output=json&columns=objid,device,host,group,status&filter_parentid={grupo_loja_id}")
-            response_devices = self.session.get(url_devices, verify=self.verify_ssl, timeout=15)
-            response_devices.raise_for_status()
-            dispositivos_data = response_devices.json()
-
-            if not dispositivos_data.get('devices', []):
+            dispositivos = self._get_group_devices(grupo_loja_id)
+            if not dispositivos:
                 result["message"] = f"Nenhum dispositivo encontrado no grupo '{loja_name}' (Core: '{core_name}')."
                 return result
 
-            found_circuits_for_any_device = False
-            for device_info in dispositivos_data.get('devices', []):
-                device_id = device_info.get('objid')
-                device_name = device_info.get('device', '')
+            sensors_by_device = self.get_sensors_by_group_id(grupo_loja_id, use_cache=use_sensor_cache)
 
-                if not device_name:
-                    continue
+            result["devices_circuits"] = build_devices_circuits(dispositivos, sensors_by_device)
 
-                sensors_for_device = self.get_sensors_by_device_id(device_id)
-                device_circuits_list = []
-
-                for sensor_data in sensors_for_device:
-                    sensor_name_norm = sensor_data.get('sensor', '').strip().lower()
-                    device_name_norm = device_name.strip().lower()
-
-                    if sensor_name_norm == device_name_norm:
-                        circuit = {
-                            "id": sensor_data.get('objid'),
-                            "name": sensor_data.get('sensor'),
-                            "status": sensor_data.get('status'),
-                            "message": sensor_data.get('message_raw') or sensor_data.get('message'),
-                            "lastvalue": sensor_data.get('lastvalue')
-                        }
-                        device_circuits_list.append(circuit)
-                        found_circuits_for_any_device = True
-
-                if device_circuits_list:
-                    result["devices_circuits"].append({
-                        "device_id": device_id,
-                        "device_name": device_name,
-                        "device_host": device_info.get('host'),
-                        "device_status": device_info.get('status'),
-                        "circuits": device_circuits_list
-                    })
-
-            if not found_circuits_for_any_device:
+            if not result["devices_circuits"]:
                 result["message"] = f"Nenhum sensor correspondente encontrado em '{loja_name}' (Core: '{core_name}')."
             else:
                 result["success"] = True
@@ -187,3 +889,57 @@ class PRTGAPI:
             result["message"] = msg
             print(msg)
             return result
+
+    def get_core_circuit_status(self, core_name):
+        # Status dos circuitos de todas as lojas de um Core em três consultas em lote (grupos, dispositivos
+        # e sensores abaixo do Core, via id= recursivo), no lugar de 3+N chamadas por loja.
+        result = {
+            "success": False,
+            "message": "",
+            "core_id": None,
+            "stores": {}
+        }
+
+        try:
+            core_id = self._resolve_core_group_id(core_name)
+            if core_id is None:
+                result["message"] = f"Grupo Core '{core_name}' não encontrado no PRTG."
+                return result
+            result["core_id"] = core_id
+
+            groups = self._get_table("groups", "objid,name,parentid", f"&id={core_id}", timeout=60)
+            devices = self._get_table("devices", "objid,device,host,group,status,parentid", f"&id={core_id}", timeout=60)
+            sensors = self._get_table(
+                "sensors", "objid,sensor,parentid,status,status_raw,message_raw,message,lastvalue", f"&id={core_id}", timeout=60
+            )
+        except requests.exceptions.Timeout:
+            result["message"] = f"Timeout na API do PRTG ao buscar o status do Core '{core_name}'."
+            print(result["message"])
+            return result
+        except requests.exceptions.RequestException as e:
+            result["message"] = f"Erro na API do PRTG ao buscar o status do Core '{core_name}': {str(e)}"
+            print(result["message"])
+            return result
+        except json.JSONDecodeError as e:
+            result["message"] = f"Erro ao decodificar JSON da API do PRTG para o Core '{core_name}': {str(e)}"
+            print(result["message"])
+            return result
+
+        result["stores"] = build_core_status(core_id, groups, devices, sensors)
+        self._warm_store_caches(core_name, result["stores"])
+        down = sum(1 for store in result["stores"].values() if store["status"] != CORE_STATUS_UP)
+        result["success"] = True
+        result["message"] = (f"Core '{core_name}': {len(result['stores'])} lojas, "
+                             f"{down} com circuitos fora ou sem circuitos.")
+        return result
+
+    def _warm_store_caches(self, core_name, stores):
+        # As consultas do Core já trazem tudo que get_circuit_info buscaria para cada loja
+        core_norm = core_name.strip().lower()
+        for store_name, store in stores.items():
+            group_id = store["group_id"]
+            self.topology_cache.set(("store", core_norm, store_name.lower()), group_id)
+            direct_devices = [d for d in store["devices"] if str(d.get('parentid')) == str(group_id)]
+            if direct_devices:
+                self.topology_cache.set(("devices", str(group_id)), direct_devices)
+            self.sensor_cache.set(str(group_id), store["sensors_by_device"])
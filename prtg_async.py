@@ -0,0 +1,433 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlencode
+
+try:
+    import httpx
+except ImportError:  # Dependência opcional: só quem usa o cliente assíncrono precisa dela
+    httpx = None
+
+from prtg_API import (
+    CORE_STATUS_UP,
+    TTLCache,
+    TopologyIndex,
+    build_core_status,
+    build_devices_circuits,
+    find_group_by_name,
+    group_sensors_by_device,
+    normalize_name,
+    sub_filter,
+)
+from metricas import registrar_requisicao_prtg
+
+class AsyncPRTGAPI:
+    # Variante asyncio do PRTGAPI (requer o pacote httpx), com conexões keep-alive reaproveitadas
+    # e requisições independentes disparadas em paralelo, limitadas por um semáforo.
+    # Oferece as consultas do PRTGAPI como corrotinas (test_connection, sync_topology,
+    # get_device_by_name, get_device_by_core, get_sensors_by_device_id, get_sensors_by_group_id,
+    # get_circuit_info, get_core_circuit_status) e, síncronos, build_url, invalidate_cache,
+    # invalidate_store e get_device_by_host. Não oferece save_topology/load_topology (o snapshot
+    # em disco fica com o cliente síncrono) nem cancellable: aqui o cancelamento é o da própria
+    # task do asyncio. Cada corrotina pública tem prazo total de overall_timeout segundos (todas as
+    # páginas e requisições somadas), além do request_timeout de cada requisição.
+    def __init__(self, server_url, username, passhash, verify_ssl=False, page_size=2500,
+                 topology_ttl=600, sensor_ttl=15, cache_size=512,
+                 max_concurrency=8, request_timeout=15, overall_timeout=30):
+        if httpx is None:
+            raise ImportError("O cliente assíncrono do PRTG requer o pacote httpx (pip install httpx).")
+        self.server_url = server_url.rstrip('/')
+        self.username = username
+        self.passhash = passhash
+        self.verify_ssl = verify_ssl
+        self.page_size = page_size
+        self.max_concurrency = max_concurrency
+        self.request_timeout = request_timeout
+        self.overall_timeout = overall_timeout
+        self.topology_ttl = topology_ttl
+        self.topology_cache = TTLCache(maxsize=cache_size, ttl=topology_ttl, name="topology")
+        self.sensor_cache = TTLCache(maxsize=cache_size, ttl=sensor_ttl, name="sensors")
+        self.topology_index = None
+        self._client = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._semaphore = None
+
+    def build_url(self, endpoint: str) -> str:
+        connector = "&" if "?" in endpoint else "?"
+        credentials = urlencode({"username": self.username, "passhash": self.passhash})
+        return f"{self.server_url}{endpoint}{connector}{credentials}"
+
+    def invalidate_cache(self, topology=True, sensors=True):
+        if topology:
+            self.topology_cache.invalidate()
+            self.topology_index = None
+        if sensors:
+            self.sensor_cache.invalidate()
+
+    def invalidate_store(self, loja_name, core_name):
+        key = ("store", core_name.strip().lower(), loja_name.strip().lower())
+        group_id = self.topology_cache.peek(key)
+        self.topology_cache.invalidate(key)
+        if group_id is not None:
+            self.topology_cache.invalidate(("devices", str(group_id)))
+            self.sensor_cache.invalidate(str(group_id))
+
+    def _current_index(self):
+        # Mesma regra do PRTGAPI: índice vencido não responde, as consultas voltam a ir ao PRTG
+        index = self.topology_index
+        if index is None or not index.is_fresh(self.topology_ttl):
+            return None
+        return index
+
+    def get_device_by_host(self, host):
+        index = self._current_index()
+        if index is None:
+            return None
+        return index.devices_by_host.get(str(host).strip().lower())
+
+    def _get_client(self):
+        # Criado sob demanda para ficar preso ao event loop em que é usado
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                verify=self.verify_ssl,
+                timeout=httpx.Timeout(self.request_timeout),
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def _get_json(self, endpoint):
+        client = self._get_client()
+        content = endpoint.split("content=", 1)[-1].split("&", 1)[0]
+        async with self._semaphore:
+            # Medido dentro do semáforo: a espera por uma vaga não conta como latência do PRTG
+            started = time.perf_counter()
+            response = None
+            try:
+                response = await client.get(self.build_url(endpoint))
+            finally:
+                registrar_requisicao_prtg(content, time.perf_counter() - started,
+                                          len(response.content) if response is not None else 0,
+                                          "ok" if response is not None and response.is_success else "error")
+        response.raise_for_status()
+        return response.json()
+
+    async def _get_table(self, content, columns, filters=""):
+        # Primeira página define o treesize; as demais são buscadas em paralelo
+        endpoint = f"/api/table.json?content={content}&output=json&columns={columns}&count={self.page_size}{filters}"
+        data = await self._get_json(f"{endpoint}&start=0")
+        rows = list(data.get(content, []))
+        total = data.get('treesize')
+        if not isinstance(total, int) or len(rows) < self.page_size or len(rows) >= total:
+            return rows
+
+        pages = await asyncio.gather(*(self._get_json(f"{endpoint}&start={start}")
+                                       for start in range(len(rows), total, self.page_size)))
+        for page in pages:
+            rows.extend(page.get(content, []))
+        return rows
+
+    async def test_connection(self):
+        try:
+            async with asyncio.timeout(self.overall_timeout):
+                await self._get_json("/api/table.json?content=sensors&output=json&count=1")
+            return True, "Conexão com PRTG estabelecida com sucesso."
+        except TimeoutError:
+            return False, "Erro ao conectar ao PRTG: tempo limite esgotado."
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
+            return False, f"Erro ao conectar ao PRTG: {str(e)}"
+
+    async def sync_topology(self):
+        try:
+            async with asyncio.timeout(self.overall_timeout):
+                groups, devices = await asyncio.gather(
+                    self._get_table("groups", "objid,name,parentid"),
+                    self._get_table("devices", "objid,device,host,group,group_raw,status,parentid")
+                )
+        except TimeoutError:
+            return False, "Erro ao sincronizar topologia do PRTG: tempo limite esgotado."
+        except httpx.HTTPError as e:
+            return False, f"Erro ao sincronizar topologia do PRTG: {str(e)}"
+        except json.JSONDecodeError as e:
+            return False, f"Erro ao decodificar JSON da topologia do PRTG: {str(e)}"
+
+        self.topology_index = TopologyIndex(groups, devices)
+        return True, f"Topologia do PRTG sincronizada: {len(groups)} grupos, {len(devices)} dispositivos."
+
+    async def get_device_by_name(self, device_name, page_size=100):
+        name_norm = device_name.lower()
+        index = self._current_index()
+        if index is not None:
+            device = next((d for d in index.devices if name_norm in d.get('device', '').lower()), None)
+            if device is not None:
+                return device
+
+        try:
+            async with asyncio.timeout(self.overall_timeout):
+                endpoint = f"/api/table.json?content=devices&output=json&columns=objid,device,group,status&count={page_size}&filter_device={sub_filter(device_name)}"
+                start = 0
+                while True:
+                    data = await self._get_json(f"{endpoint}&start={start}")
+                    page = data.get('devices', [])
+                    for device in page:
+                        if name_norm in device.get('device', '').lower():
+                            return device
+                    start += len(page)
+                    total = data.get('treesize')
+                    if len(page) < page_size or (isinstance(total, int) and start >= total):
+                        return None
+        except TimeoutError:
+            print(f"Timeout ao buscar dispositivo '{device_name}' no PRTG.")
+            return None
+        except httpx.HTTPError as e:
+            print(f"Erro ao buscar dispositivo: {str(e)}")
+            return None
+
+    async def get_device_by_core(self, core_name, loja_name):
+        try:
+            async with asyncio.timeout(self.overall_timeout):
+                index = self._current_index()
+                loja_norm = normalize_name(loja_name)
+                if index is not None and loja_norm in index.stores_by_code:
+                    grupo_loja_id = index.stores_by_code[loja_norm][0].get('objid')
+                    devices = index.devices_by_group.get(str(grupo_loja_id), [])
+                else:
+                    data_groups = await self._get_json(f"/api/table.json?content=groups&output=json&columns=objid,name&filter_name={sub_filter(loja_name)}")
+                    grupo_loja = find_group_by_name(data_groups.get('groups', []), loja_name)
+                    if not grupo_loja:
+                        print(f"Grupo '{loja_name}' não encontrado.")
+                        return None
+                    devices = await self._get_table("devices", "objid,device,group,status,group_raw", f"&filter_parentid={grupo_loja['objid']}")
+
+            for device in devices:
+                if core_name.lower() in device.get('group', '').lower():
+                    return device
+
+            print(f"Nenhum dispositivo encontrado no grupo '{loja_name}' que corresponda ao core '{core_name}'.")
+            return None
+        except TimeoutError:
+            print(f"Timeout ao buscar dispositivo do grupo '{loja_name}' no PRTG.")
+            return None
+        except httpx.HTTPError as e:
+            print(f"Erro ao buscar dispositivo por grupo/core: {str(e)}")
+            return None
+
+    async def get_sensors_by_device_id(self, device_id):
+        try:
+            async with asyncio.timeout(self.overall_timeout):
+                data = await self._get_json(f"/api/table.json?content=sensors&output=json&columns=objid,sensor,status,message_raw,message,lastvalue&id={device_id}")
+            return data.get('sensors', [])
+        except TimeoutError:
+            print(f"Timeout ao buscar sensores do dispositivo {device_id} no PRTG.")
+            return []
+        except httpx.HTTPError as e:
+            print(f"Erro ao buscar sensores: {str(e)}")
+            return []
+
+    async def get_sensors_by_group_id(self, group_id, use_cache=True):
+        cached = self.sensor_cache.get(str(group_id)) if use_cache else None
+        if cached is not None:
+            return cached
+
+        # Como no PRTGAPI, erros (inclusive TimeoutError no prazo total) sobem para quem chamou
+        async with asyncio.timeout(self.overall_timeout):
+            sensors = await self._get_table(
+                "sensors", "objid,sensor,parentid,status,status_raw,message_raw,message,lastvalue", f"&id={group_id}"
+            )
+        sensors_by_device = group_sensors_by_device(sensors)
+        self.sensor_cache.set(str(group_id), sensors_by_device)
+        return sensors_by_device
+
+    async def _resolve_core_group_id(self, core_name):
+        key = ("core", core_name.strip().lower())
+        index = self._current_index()
+        if index is not None and key[1] in index.cores:
+            return index.cores[key[1]]
+        cached = self.topology_cache.get(key)
+        if cached is not None:
+            return cached
+
+        data = await self._get_json(f"/api/table.json?content=groups&output=json&columns=objid,name&filter_name={sub_filter(core_name)}")
+        grupo_core_obj = find_group_by_name(data.get('groups', []), core_name)
+        if not grupo_core_obj:
+            return None
+        self.topology_cache.set(key, grupo_core_obj['objid'])
+        return grupo_core_obj['objid']
+
+    async def _resolve_store_group_id(self, core_name, grupo_core_id, loja_name):
+        key = ("store", core_name.strip().lower(), loja_name.strip().lower())
+        index = self._current_index()
+        if index is not None and key[1:] in index.stores:
+            return index.stores[key[1:]]
+        cached = self.topology_cache.get(key)
+        if cached is not None:
+            return cached
+
+        data = await self._get_json(f"/api/table.json?content=groups&output=json&columns=objid,name,parentid&filter_name={sub_filter(loja_name)}&filter_parentid={grupo_core_id}")
+        grupo_loja_obj = find_group_by_name(data.get('groups', []), loja_name)
+        if not grupo_loja_obj:
+            return None
+        self.topology_cache.set(key, grupo_loja_obj['objid'])
+        return grupo_loja_obj['objid']
+
+    async def _get_group_devices(self, group_id):
+        key = ("devices", str(group_id))
+        index = self._current_index()
+        if index is not None and key[1] in index.devices_by_group:
+            return index.devices_by_group[key[1]]
+        cached = self.topology_cache.get(key)
+        if cached is not None:
+            return cached
+
+        devices = await self._get_table("devices", "objid,device,host,group,status", f"&filter_parentid={group_id}")
+        if devices:
+            self.topology_cache.set(key, devices)
+        return devices
+
+    async def _get_circuit_info(self, loja_name, core_name, result, use_sensor_cache):
+        grupo_core_id = await self._resolve_core_group_id(core_name)
+        if grupo_core_id is None:
+            result["message"] = f"Grupo Core '{core_name}' não encontrado no PRTG."
+            return result
+
+        grupo_loja_id = await self._resolve_store_group_id(core_name, grupo_core_id, loja_name)
+        if grupo_loja_id is None:
+            result["message"] = f"Grupo (Loja) '{loja_name}' não encontrado dentro do Core '{core_name}'."
+            return result
+
+        # Dispositivos e sensores dependem apenas do grupo da loja: buscados em paralelo
+        dispositivos, sensors_by_device = await asyncio.gather(
+            self._get_group_devices(grupo_loja_id),
+            self.get_sensors_by_group_id(grupo_loja_id, use_cache=use_sensor_cache)
+        )
+        if not dispositivos:
+            result["message"] = f"Nenhum dispositivo encontrado no grupo '{loja_name}' (Core: '{core_name}')."
+            return result
+
+        result["devices_circuits"] = build_devices_circuits(dispositivos, sensors_by_device)
+        if not result["devices_circuits"]:
+            result["message"] = f"Nenhum sensor correspondente encontrado em '{loja_name}' (Core: '{core_name}')."
+        else:
+            result["success"] = True
+            result["message"] = f"Informações de circuito recuperadas para '{loja_name}' (Core: '{core_name}')."
+        return result
+
+    async def get_circuit_info(self, loja_name, core_name, use_sensor_cache=True):
+        result = {
+            "success": False,
+            "message": "",
+            "devices_circuits": []
+        }
+
+        try:
+            async with asyncio.timeout(self.overall_timeout):
+                return await self._get_circuit_info(loja_name, core_name, result, use_sensor_cache)
+        except (TimeoutError, httpx.TimeoutException):
+            msg = f"Timeout na API do PRTG ao buscar informações para Loja '{loja_name}', Core '{core_name}'."
+            result["message"] = msg
+            print(msg)
+            return result
+        except httpx.HTTPStatusError as e:
+            msg = f"Erro na API do PRTG para Cliente '{loja_name}', Core '{core_name}': {str(e)}"
+            msg += f" Detalhes: {e.response.status_code} {e.response.text[:200]}"
+            result["message"] = msg
+            print(msg)
+            return result
+        except httpx.HTTPError as e:
+            msg = f"Erro na API do PRTG para Cliente '{loja_name}', Core '{core_name}': {str(e)}"
+            result["message"] = msg
+            print(msg)
+            return result
+        except json.JSONDecodeError as e:
+            msg = f"Erro ao decodificar JSON da API do PRTG para Cliente '{loja_name}', Core '{core_name}': {str(e)}"
+            result["message"] = msg
+            print(msg)
+            return result
+        except Exception as e:
+            msg = f"Erro inesperado no PRTG para Cliente '{loja_name}', Core '{core_name}': {str(e)}"
+            result["message"] = msg
+            print(msg)
+            return result
+
+    async def get_circuit_info_many(self, lojas):
+        # lojas: iterável de (loja_name, core_name); devolve {(loja_name, core_name): resultado}.
+        # O lote inteiro também respeita overall_timeout: lojas que não terminarem a tempo voltam
+        # com a mensagem de timeout, sem descartar as que já terminaram.
+        lojas = list(lojas)
+        tasks = {asyncio.ensure_future(self.get_circuit_info(loja, core)): (loja, core) for loja, core in lojas}
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=self.overall_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        results = {}
+        for task, (loja, core) in tasks.items():
+            if task.cancelled():
+                results[(loja, core)] = {
+                    "success": False,
+                    "message": f"Timeout na API do PRTG ao buscar informações para Loja '{loja}', Core '{core}'.",
+                    "devices_circuits": []
+                }
+            else:
+                results[(loja, core)] = task.result()
+        return results
+
+    async def _get_core_tables(self, core_name, result):
+        core_id = await self._resolve_core_group_id(core_name)
+        if core_id is None:
+            result["message"] = f"Grupo Core '{core_name}' não encontrado no PRTG."
+            return None
+        result["core_id"] = core_id
+        return await asyncio.gather(
+            self._get_table("groups", "objid,name,parentid", f"&id={core_id}"),
+            self._get_table("devices", "objid,device,host,group,status,parentid", f"&id={core_id}"),
+            self._get_table("sensors", "objid,sensor,parentid,status,status_raw,message_raw,message,lastvalue", f"&id={core_id}")
+        )
+
+    async def get_core_circuit_status(self, core_name):
+        # Mesmo resultado de PRTGAPI.get_core_circuit_status, com as três consultas do Core em paralelo
+        result = {
+            "success": False,
+            "message": "",
+            "core_id": None,
+            "stores": {}
+        }
+
+        try:
+            async with asyncio.timeout(self.overall_timeout):
+                tables = await self._get_core_tables(core_name, result)
+            if tables is None:
+                return result
+            groups, devices, sensors = tables
+            core_id = result["core_id"]
+        except (TimeoutError, httpx.TimeoutException):
+            result["message"] = f"Timeout na API do PRTG ao buscar o status do Core '{core_name}'."
+            print(result["message"])
+            return result
+        except httpx.HTTPError as e:
+            result["message"] = f"Erro na API do PRTG ao buscar o status do Core '{core_name}': {str(e)}"
+            print(result["message"])
+            return result
+        except json.JSONDecodeError as e:
+            result["message"] = f"Erro ao decodificar JSON da API do PRTG para o Core '{core_name}': {str(e)}"
+            print(result["message"])
+            return result
+
+        result["stores"] = build_core_status(core_id, groups, devices, sensors)
+        down = sum(1 for store in result["stores"].values() if store["status"] != CORE_STATUS_UP)
+        result["success"] = True
+        result["message"] = (f"Core '{core_name}': {len(result['stores'])} lojas, "
+                             f"{down} com circuitos fora ou sem circuitos.")
+        return result
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import re
+import sys
+
+COLUNAS_LOJA = ("ID_Loja", "Nome_Loja", "Core_PRTG", "Cidade", "Estado", "Contato_Gerencia", "Telefone")
+COLUNAS_INTERNADAS = ("Core_PRTG", "Cidade", "Estado") # Poucos valores distintos repetidos em muitas lojas
+
+class RegistroLoja:
+    """
+    Registro compacto de uma loja (uma linha do CSV), sem depender do pandas.
+
+    As colunas conhecidas ficam em __slots__; colunas adicionais do CSV (ex.: Telefone_2) vão para
+    `extras`. Oferece o mesmo acesso usado pela GUI com linhas do pandas: get(coluna, padrão) e
+    registro[coluna].
+    """
+
+    __slots__ = COLUNAS_LOJA + ("extras",)
+
+    def __init__(self, ID_Loja="", Nome_Loja="", Core_PRTG="", Cidade="", Estado="",
+                 Contato_Gerencia="", Telefone="", extras=None):
+        self.ID_Loja = ID_Loja
+        self.Nome_Loja = Nome_Loja
+        self.Core_PRTG = Core_PRTG
+        self.Cidade = Cidade
+        self.Estado = Estado
+        self.Contato_Gerencia = Contato_Gerencia
+        self.Telefone = Telefone
+        self.extras = extras or None
+
+    def __reduce__(self):
+        # Serializa como tupla posicional: bem mais compacto e rápido que o estado padrão de __slots__
+        return (RegistroLoja, (self.ID_Loja, self.Nome_Loja, self.Core_PRTG, self.Cidade, self.Estado,
+                               self.Contato_Gerencia, self.Telefone, self.extras))
+
+    def get(self, coluna, padrao=None):
+        if coluna in COLUNAS_LOJA:
+            return getattr(self, coluna)
+        if self.extras and coluna in self.extras:
+            return self.extras[coluna]
+        return padrao
+
+    def __getitem__(self, coluna):
+        valor = self.get(coluna, self)
+        if valor is self:
+            raise KeyError(coluna)
+        return valor
+
+    def valores(self):
+        return tuple(getattr(self, coluna) for coluna in COLUNAS_LOJA) + (tuple(sorted((self.extras or {}).items())),)
+
+    def __eq__(self, outro):
+        return isinstance(outro, RegistroLoja) and self.valores() == outro.valores()
+
+    def __hash__(self):
+        return hash(self.valores())
+
+    def para_dict(self):
+        dados = {coluna: getattr(self, coluna) for coluna in COLUNAS_LOJA}
+        dados.update(self.extras or {})
+        return dados
+
+    def __repr__(self):
+        return f"RegistroLoja(ID_Loja={self.ID_Loja!r}, Nome_Loja={self.Nome_Loja!r})"
+
+def _ler_registros(arquivo, caminho_csv, avisos):
+    leitor = csv.reader(arquivo)
+    cabecalho = [coluna.strip() for coluna in next(leitor, [])]
+    colunas_faltando = [coluna for coluna in COLUNAS_LOJA if coluna not in cabecalho]
+    if colunas_faltando and avisos is not None:
+        avisos.append(f"O arquivo {caminho_csv} não contém as colunas esperadas: {', '.join(colunas_faltando)}.")
+
+    # Colunas faltantes viram valores vazios para evitar KeyErrors posteriores
+    posicoes = [cabecalho.index(coluna) if coluna in cabecalho else None for coluna in COLUNAS_LOJA]
+    internar = [coluna in COLUNAS_INTERNADAS for coluna in COLUNAS_LOJA]
+    colunas_extras = [(i, coluna) for i, coluna in enumerate(cabecalho) if coluna and coluna not in COLUNAS_LOJA]
+
+    registros = []
+    for linha in leitor:
+        if not any(linha):
+            continue # Linhas em branco são ignoradas, como no pandas
+        valores = []
+        for posicao, interna in zip(posicoes, internar):
+            valor = linha[posicao] if posicao is not None and posicao < len(linha) else ""
+            valores.append(sys.intern(valor) if interna else valor)
+        extras = {coluna: linha[i] for i, coluna in colunas_extras if i < len(linha) and linha[i] != ""}
+        registros.append(RegistroLoja(*valores, extras=extras))
+    return registros
+
+def ler_lojas_csv(caminho_csv, avisos=None):
+    """
+    Lê o CSV de lojas com o módulo csv da biblioteca padrão.
+
+    Tenta UTF-8 e, se falhar, latin1 (comum em arquivos gerados no Windows). Todos os valores são
+    mantidos como texto; células vazias viram "".
+
+    Args:
+        caminho_csv: Caminho do arquivo de lojas.
+        avisos: Lista opcional onde são acumulados alertas (ex.: colunas ausentes).
+
+    Returns:
+        Lista de RegistroLoja, na ordem do arquivo.
+    """
+    try:
+        with open(caminho_csv, newline="", encoding="utf-8-sig") as arquivo:
+            return _ler_registros(arquivo, caminho_csv, avisos)
+    except UnicodeDecodeError:
+        if avisos is not None:
+            avisos.clear()
+        with open(caminho_csv, newline="", encoding="latin1") as arquivo:
+            return _ler_registros(arquivo, caminho_csv, avisos)
+
+def nome_loja_prtg(nome_loja_csv):
+    """Formata o nome da loja do CSV para o padrão PRTG (ex: 'Loja 10' -> 'LJ010')."""
+    if not isinstance(nome_loja_csv, str):
+        return str(nome_loja_csv) # Retorna como string se não for
+
+    match = re.search(r'\d+', nome_loja_csv)
+    if match:
+        try:
+            numero = int(match.group())
+            return f"LJ{numero:03d}" # Formata com 3 dígitos, ex: 10 -> 010
+        except ValueError:
+            return nome_loja_csv # Retorna original se não conseguir converter número
+    return nome_loja_csv # Retorna original se não encontrar números
+
+def para_dataframe(registros):
+    """Converte os registros em um DataFrame do pandas (usado apenas para exportação em lote)."""
+    import pandas as pd
+    return pd.DataFrame.from_records([registro.para_dict() for registro in registros])
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cancelamento import TokenCancelamento
+
+NA_FILA = "Na fila"
+EM_ANDAMENTO = "Em andamento"
+CONCLUIDA = "Concluída"
+FALHOU = "Falhou"
+CANCELADA = "Cancelada"
+ESTADOS_FINAIS = (CONCLUIDA, FALHOU, CANCELADA)
+
+class Tarefa:
+    """Uma operação submetida ao GerenciadorTarefas, com progresso, resultado e cancelamento próprios."""
+
+    def __init__(self, identificador, titulo, alvo, chave):
+        self.id = identificador
+        self.titulo = titulo
+        self.alvo = alvo # Loja, Core ou lista de lojas a que a tarefa se refere (exibição)
+        self.chave = chave # Tarefas ativas com a mesma chave não são duplicadas
+        self.estado = NA_FILA
+        self.progresso = "" # Última mensagem de progresso
+        self.concluidos = 0
+        self.total = None
+        self.resultado = None # Parcial enquanto a tarefa roda; final ao concluir
+        self.erro = None
+        self.cancelamento = TokenCancelamento()
+        self.criada_em = time.time()
+        self.inicio = None
+        self.fim = None
+
+    def informar(self, progresso=None, concluidos=None, total=None, resultado=None):
+        """
+        Atualiza o progresso (chamado de dentro da tarefa). Depois de cancelada, a tarefa não
+        altera mais nada do que já foi exibido.
+
+        Args:
+            progresso: Mensagem curta sobre a etapa atual.
+            concluidos: Itens já processados.
+            total: Total de itens, quando conhecido.
+            resultado: Resultado parcial.
+        """
+        if self.cancelada():
+            return
+        if progresso is not None:
+            self.progresso = progresso
+        if concluidos is not None:
+            self.concluidos = concluidos
+        if total is not None:
+            self.total = total
+        if resultado is not None:
+            self.resultado = resultado
+        self._notificar(self)
+
+    def cancelada(self):
+        return self.cancelamento.cancelado()
+
+    def ativa(self):
+        return self.estado not in ESTADOS_FINAIS
+
+    def duracao(self):
+        if self.inicio is None:
+            return 0.0
+        return (self.fim or time.time()) - self.inicio
+
+    def _notificar(self, tarefa):
+        pass # Substituído pelo gerenciador
+
+class GerenciadorTarefas:
+    """
+    Executa as operações da GUI (consultas ao PRTG, pings, varreduras) em um pool limitado de threads.
+
+    Cada tarefa tem estado, progresso, resultado e um TokenCancelamento próprios, de modo que várias
+    lojas podem ser consultadas ao mesmo tempo e cancelar uma não afeta as outras. Acima de
+    `max_workers`, as tarefas aguardam na fila. Uma tarefa cancelada passa na hora para o estado
+    final (quem a acompanha é liberado sem esperar o thread dela terminar); o que ela ainda produzir
+    é descartado. Só as `max_finalizadas` tarefas finalizadas mais recentes são mantidas.
+    """
+
+    def __init__(self, max_workers=6, ao_mudar=None, max_finalizadas=50):
+        """
+        Args:
+            max_workers: Máximo de tarefas executando ao mesmo tempo.
+            ao_mudar: Chamada como ao_mudar(tarefa) a cada mudança de estado ou progresso, no thread
+                que provocou a mudança.
+            max_finalizadas: Tarefas finalizadas mantidas na lista.
+        """
+        self.max_workers = max_workers
+        self.ao_mudar = ao_mudar
+        self.max_finalizadas = max_finalizadas
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tarefa")
+        self._lock = threading.Lock()
+        self._tarefas = {} # id -> Tarefa, na ordem de criação
+        self._futuros = {}
+        self._ao_terminar = {}
+        self._sequencia = itertools.count(1)
+
+    def submeter(self, titulo, funcao, *args, alvo="", chave=None, ao_terminar=None):
+        """
+        Agenda `funcao(tarefa, *args)` no pool; o valor retornado vira o resultado da tarefa.
+
+        Args:
+            titulo: Nome da operação (ex.: "Ping VMs").
+            funcao: Executada em um thread do pool; deve repassar `tarefa.cancelamento` às
+                operações bloqueantes e informar o progresso por `tarefa.informar`.
+            alvo: Loja ou Core a que a tarefa se refere.
+            chave: Se já houver uma tarefa ativa com a mesma chave, ela é devolvida no lugar de
+                uma nova (evita repetir a mesma consulta com cliques seguidos).
+            ao_terminar: Chamada uma única vez como ao_terminar(tarefa) quando a tarefa chega a um
+                estado final, inclusive se for cancelada antes de começar.
+
+        Returns:
+            A Tarefa criada (ou a já existente com a mesma chave).
+        """
+        with self._lock:
+            if chave is not None:
+                for existente in self._tarefas.values():
+                    if existente.chave == chave and existente.ativa():
+                        return existente
+            tarefa = Tarefa(next(self._sequencia), titulo, alvo, chave)
+            tarefa._notificar = self._notificar
+            self._tarefas[tarefa.id] = tarefa
+            if ao_terminar is not None:
+                self._ao_terminar[tarefa.id] = ao_terminar
+            self._futuros[tarefa.id] = self._executor.submit(self._executar, tarefa, funcao, args)
+            self._descartar_antigas()
+        self._notificar(tarefa)
+        return tarefa
+
+    def cancelar(self, identificador):
+        """Cancela a tarefa: se ainda estiver na fila, ela não chega a rodar."""
+        with self._lock:
+            tarefa = self._tarefas.get(identificador)
+            futuro = self._futuros.get(identificador)
+        if tarefa is None or not tarefa.ativa():
+            return
+        if futuro is not None:
+            futuro.cancel()
+        tarefa.cancelamento.cancelar() # Mata pings e abandona requisições em andamento
+        self._finalizar(tarefa, CANCELADA, progresso="Cancelada.")
+
+    def cancelar_todas(self):
+        for tarefa in self.ativas():
+            self.cancelar(tarefa.id)
+
+    def obter(self, identificador):
+        with self._lock:
+            return self._tarefas.get(identificador)
+
+    def tarefas(self):
+        with self._lock:
+            return list(self._tarefas.values())
+
+    def ativas(self):
+        return [tarefa for tarefa in self.tarefas() if tarefa.ativa()]
+
+    def limpar_finalizadas(self):
+        with self._lock:
+            for identificador in [i for i, tarefa in self._tarefas.items() if not tarefa.ativa()]:
+                del self._tarefas[identificador]
+                self._futuros.pop(identificador, None)
+
+    def encerrar(self):
+        """Cancela tudo e libera o pool sem esperar as tarefas em andamento."""
+        self.cancelar_todas()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _executar(self, tarefa, funcao, args):
+        with self._lock:
+            if not tarefa.ativa(): # Cancelada enquanto estava na fila
+                return
+            tarefa.estado = EM_ANDAMENTO
+            tarefa.inicio = time.time()
+        self._notificar(tarefa)
+        try:
+            resultado = funcao(tarefa, *args)
+        except Exception as e:
+            print(f"Erro na tarefa '{tarefa.titulo}' ({tarefa.alvo}): {e}")
+            tarefa.erro = e
+            self._finalizar(tarefa, FALHOU, progresso=f"Erro: {e}")
+        else:
+            self._finalizar(tarefa, CONCLUIDA, resultado=resultado)
+
+    def _finalizar(self, tarefa, estado, progresso=None, resultado=None):
+        with self._lock:
+            if not tarefa.ativa():
+                return # Já finalizada (ex.: cancelada enquanto a função ainda terminava)
+            tarefa.estado = estado
+            tarefa.fim = time.time()
+            if progresso is not None:
+                tarefa.progresso = progresso
+            if resultado is not None:
+                tarefa.resultado = resultado
+            self._futuros.pop(tarefa.id, None)
+            ao_terminar = self._ao_terminar.pop(tarefa.id, None)
+        self._notificar(tarefa)
+        if ao_terminar is not None:
+            ao_terminar(tarefa)
+
+    def _descartar_antigas(self):
+        finalizadas = [i for i, tarefa in self._tarefas.items() if not tarefa.ativa()]
+        for identificador in finalizadas[:max(0, len(finalizadas) - self.max_finalizadas)]:
+            del self._tarefas[identificador]
+
+    def _notificar(self, tarefa):
+        if self.ao_mudar:
+            self.ao_mudar(tarefa)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import time
+
+import pytest
+
+from historico import HistoricoResultados, extrair_valor
+
+@pytest.fixture
+def historico(tmp_path):
+    # Gravação só quando a consulta pede (intervalo longo), para o teste controlar os lotes
+    hist = HistoricoResultados(str(tmp_path / "historico.db"), intervalo_gravacao=3600)
+    yield hist
+    hist.fechar()
+
+def inicio_hora_anterior():
+    agora = int(time.time())
+    return agora - agora % 3600 - 3600
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("12 ms", 12.0),
+    ("1.234,5 kbit/s", 1234.5),
+    ("0,5 %", 0.5),
+    ("-3 dBm", -3.0),
+    ("99.", 99.0),
+    (7, 7.0),
+    ("Sem dados", None),
+    (None, None),
+])
+def test_extrair_valor(texto, esperado):
+    assert extrair_valor(texto) == esperado
+
+def test_resumo_agrega_amostras(historico):
+    historico.registrar("101", "ping", "10.0.0.1", True, 12.0)
+    historico.registrar("101", "ping", "10.0.0.1", False, None)
+    historico.registrar("101", "ping", "10.0.0.1", True, 18.0)
+    historico.registrar("202", "ping", "10.0.0.2", True, 1.0)
+    assert historico.resumo("101") == {("ping", "10.0.0.1"): (3, 66.7, 15.0, 12.0, 18.0)}
+
+def test_tendencia_por_resolucao(historico):
+    t0 = inicio_hora_anterior()
+    for ts, sucesso, valor in ((t0 + 10, True, 10.0), (t0 + 20, True, 30.0),
+                               (t0 + 70, False, None), (t0 + 1000, True, 5.0)):
+        historico.registrar("101", "circuito", "MPLS", sucesso, valor, ts=ts)
+
+    assert historico.tendencia("101", periodo=3 * 3600, resolucao=60) == {("circuito", "MPLS"): [
+        (t0, 2, 100.0, 20.0, 10.0, 30.0),
+        (t0 + 60, 1, 0.0, None, None, None),
+        (t0 + 960, 1, 100.0, 5.0, 5.0, 5.0),
+    ]}
+    assert historico.tendencia("101", periodo=3 * 3600, resolucao=900) == {("circuito", "MPLS"): [
+        (t0, 3, 66.7, 20.0, 10.0, 30.0),
+        (t0 + 900, 1, 100.0, 5.0, 5.0, 5.0),
+    ]}
+    assert historico.tendencia("101", periodo=3 * 3600, resolucao=3600) == {("circuito", "MPLS"): [
+        (t0, 4, 75.0, 15.0, 5.0, 30.0),
+    ]}
+
+def test_lotes_separados_somam_no_mesmo_agregado(historico):
+    # O segundo lote cai no mesmo intervalo: o upsert precisa somar e manter mínimo/máximo
+    t0 = inicio_hora_anterior()
+    historico.registrar("101", "ping", "h", True, 20.0, ts=t0 + 1)
+    historico.registrar("101", "ping", "h", False, None, ts=t0 + 2)
+    historico.tendencia("101", periodo=3 * 3600)
+    historico.registrar("101", "ping", "h", True, 5.0, ts=t0 + 3)
+    historico.registrar("101", "ping", "h", False, None, ts=t0 + 4)
+    assert historico.tendencia("101", periodo=3 * 3600, resolucao=60) == {("ping", "h"): [
+        (t0, 4, 50.0, 12.5, 5.0, 20.0),
+    ]}
+
+def test_tendencia_ignora_fora_do_periodo(historico):
+    t0 = inicio_hora_anterior()
+    historico.registrar("101", "ping", "h", True, 1.0, ts=t0 - 86400)
+    historico.registrar("101", "ping", "h", True, 2.0, ts=t0 + 1)
+    assert historico.tendencia("101", periodo=3 * 3600, resolucao=3600) == {("ping", "h"): [
+        (t0, 1, 100.0, 2.0, 2.0, 2.0),
+    ]}
+    assert historico.tendencia("999") == {}
+
+def test_registrar_ping_e_circuitos(historico):
+    historico.registrar_ping("101", "10.0.0.1", {"success": True, "avg_time": "4 ms", "packet_loss": "0%"})
+    historico.registrar_circuitos("101", [{"circuits": [
+        {"name": "MPLS", "status": "Up", "lastvalue": "1.024,0 kbit/s"},
+        {"name": "Internet", "status": "Down", "lastvalue": "0 kbit/s"},
+    ]}])
+    resumo = historico.resumo("101")
+    assert resumo[("ping", "10.0.0.1")] == (1, 100.0, 4.0, 4.0, 4.0)
+    assert resumo[("circuito", "MPLS")] == (1, 100.0, 1024.0, 1024.0, 1024.0)
+    assert resumo[("circuito", "Internet")] == (1, 0.0, 0.0, 0.0, 0.0)
+
+def contar(caminho, sql):
+    conexao = sqlite3.connect(caminho)
+    try:
+        return conexao.execute(sql).fetchone()[0]
+    finally:
+        conexao.close()
+
+def test_retencao_por_nivel(tmp_path):
+    caminho = str(tmp_path / "historico.db")
+    hist = HistoricoResultados(caminho, intervalo_gravacao=3600, retencao={"bruto": 3600, 60: 86400})
+    try:
+        agora = int(time.time())
+        hist.registrar("101", "ping", "h", True, 1.0, ts=agora - 2 * 86400)
+        hist.registrar("101", "ping", "h", True, 2.0, ts=agora - 7200)
+        hist.registrar("101", "ping", "h", True, 3.0, ts=agora)
+        hist.resumo("101")
+        hist.aplicar_retencao()
+        assert contar(caminho, "SELECT COUNT(*) FROM amostras") == 1
+        assert contar(caminho, "SELECT COUNT(*) FROM agregados WHERE resolucao = 60") == 2
+        # Os níveis mais grossos continuam com a amostra de dois dias atrás
+        assert hist.resumo("101", periodo=3 * 86400) == {("ping", "h"): (3, 100.0, 2.0, 1.0, 3.0)}
+    finally:
+        hist.fechar()
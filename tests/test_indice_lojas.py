@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from indice_lojas import BuscaIncremental, IndiceLojas, normalizar_texto
+
+def loja(id_loja, nome):
+    return {"ID_Loja": id_loja, "Nome_Loja": nome}
+
+def base():
+    return [loja(str(i), f"Loja {i} Centro") for i in range(1, 11)]
+
+def assert_igual_reconstruido(indice, lojas):
+    # O índice atualizado precisa responder como um índice montado do zero com o mesmo arquivo
+    novo = IndiceLojas(lojas)
+    assert indice.registros() == lojas
+    assert len(indice) == len(lojas)
+    for termo in ("1", "10", "loja", "centro", "norte", "lo", "x"):
+        assert indice.buscar(termo) == novo.buscar(termo)
+
+@pytest.mark.parametrize("editar", [
+    lambda lojas: lojas,
+    lambda lojas: lojas[:3] + lojas[4:],
+    lambda lojas: lojas[:5] + [loja("5", "Loja 5 Norte")] + lojas[5:],
+    lambda lojas: lojas + [loja("11", "Loja 11 Norte")],
+    lambda lojas: [loja("0", "Loja 0 Norte")] + lojas,
+    lambda lojas: lojas[:2] + [loja("3", "Loja 3 Norte")] + lojas[3:],
+    lambda lojas: list(reversed(lojas)),
+    lambda lojas: lojas[1:] + lojas[:1],
+    lambda lojas: [loja("99", "Outra")],
+], ids=["igual", "remocao", "id_duplicado", "inclusao_no_fim", "inclusao_no_inicio",
+        "alteracao", "invertido", "rotacionado", "tudo_novo"])
+def test_atualizar_mantem_ordem_do_csv(editar):
+    atual = IndiceLojas(base())
+    lojas = editar(base())
+    novo, _ = atual.atualizar(lojas)
+    assert_igual_reconstruido(novo, lojas)
+    assert atual.registros() == base() # O índice anterior não é alterado
+
+def test_atualizar_sem_mudancas_devolve_o_mesmo_indice():
+    atual = IndiceLojas(base())
+    novo, resumo = atual.atualizar(base())
+    assert novo is atual
+    assert resumo == {"incluidas": 0, "removidas": 0, "alteradas": 0}
+
+def test_atualizar_resumo():
+    atual = IndiceLojas(base())
+    lojas = base()
+    lojas[0] = loja("1", "Loja 1 Norte")
+    del lojas[1]
+    lojas.append(loja("11", "Loja 11"))
+    _, resumo = atual.atualizar(lojas)
+    assert resumo == {"incluidas": 1, "removidas": 1, "alteradas": 1}
+
+def test_atualizacoes_sucessivas():
+    indice = IndiceLojas(base())
+    lojas = base()
+    for passo in range(12):
+        if passo % 3 == 0:
+            lojas = lojas + [loja(str(100 + passo), f"Nova {passo}")]
+        elif passo % 3 == 1:
+            lojas = lojas[1:]
+        else:
+            lojas = lojas[:1] + [loja(lojas[1]["ID_Loja"], f"Renomeada {passo}")] + lojas[2:]
+        indice, _ = indice.atualizar(lojas)
+        assert_igual_reconstruido(indice, lojas)
+
+def lojas_busca():
+    return [
+        loja("101", "São Paulo Centro"),
+        loja("1010", "Campinas"),
+        loja("20", "Paulínia"),
+        loja("3", "SP"),
+        loja(" 101 ", "Duplicada"),
+    ]
+
+def busca_linear(lojas, termo):
+    # Referência: percorre a lista inteira, como a busca fazia antes do índice
+    termo = normalizar_texto(termo)
+    return [l for l in lojas if termo in normalizar_texto(l["Nome_Loja"])]
+
+def test_buscar_por_id_exato():
+    lojas = lojas_busca()
+    indice = IndiceLojas(lojas)
+    assert indice.buscar_por_id("101") == [lojas[0], lojas[4]]
+    assert indice.buscar_por_id(" 1010") == [lojas[1]]
+    assert indice.buscar_por_id("10") == []
+
+@pytest.mark.parametrize("termo", ["paulo", "PAULI", "sao", "são paulo", "  centro ", "p", "sp", "a", "x", "inas"])
+def test_buscar_por_nome_igual_a_busca_linear(termo):
+    lojas = lojas_busca()
+    assert IndiceLojas(lojas).buscar_por_nome(termo) == busca_linear(lojas, termo)
+
+def test_buscar_prefere_id_ao_nome():
+    lojas = lojas_busca()
+    indice = IndiceLojas(lojas)
+    assert indice.buscar("20") == [lojas[2]]
+    assert indice.buscar("paulinia") == [lojas[2]]
+    assert indice.buscar("") == []
+
+def test_posicoes_por_prefixo_id():
+    indice = IndiceLojas(lojas_busca())
+    assert indice.posicoes_por_prefixo_id("10") == {0, 1, 4}
+    assert indice.posicoes_por_prefixo_id("101") == {0, 1, 4}
+    assert indice.posicoes_por_prefixo_id("2") == {2}
+    assert indice.posicoes_por_prefixo_id("9") == set()
+
+def test_busca_incremental_ordena_por_relevancia():
+    lojas = [
+        loja("5", "Loja Norte"),
+        loja("7", "Norte Shopping"),
+        loja("12", "Zona Norte"),
+        loja("1", "Centro"),
+    ]
+    busca = BuscaIncremental(IndiceLojas(lojas))
+    assert busca.sugerir("1") == [lojas[3], lojas[2]] # ID exato antes de prefixo do ID
+    assert busca.sugerir("nor") == [lojas[1], lojas[0], lojas[2]] # Início do nome antes de palavra
+    assert busca.sugerir("norte s") == [lojas[1]] # Refinamento filtra os candidatos anteriores
+    assert busca.sugerir("") == []
+
+def test_busca_incremental_respeita_limite():
+    lojas = [loja(str(i), f"Loja {i}") for i in range(30)]
+    busca = BuscaIncremental(IndiceLojas(lojas), limite=5)
+    assert busca.sugerir("loja") == lojas[:5]
+    assert len(busca.sugerir("loja 1")) == 5
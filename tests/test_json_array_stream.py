@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+from prtg_API import JSONArrayStream
+
+LINHAS = [
+    {"objid": 1, "name": "Loja São João", "host": "10.0.0.1"},
+    {"objid": 2, "name": "Praça {colchete] \"aspas\"", "host": "10.0.0.2"},
+    {"objid": 3, "name": "Ação", "tags": ["a", "b"]},
+]
+
+def documento(treesize_antes=True):
+    corpo = json.dumps(LINHAS, ensure_ascii=False)
+    if treesize_antes:
+        texto = '{"prtg-version":"23.1","treesize":3,"devices":%s}' % corpo
+    else:
+        texto = '{"prtg-version":"23.1","devices":%s,"treesize":3}' % corpo
+    return texto.encode("utf-8")
+
+def alimentar(dados, tamanho):
+    stream = JSONArrayStream("devices")
+    linhas = []
+    for i in range(0, len(dados), tamanho):
+        linhas.extend(stream.feed(dados[i:i + tamanho]))
+    stream.close()
+    return stream, linhas
+
+@pytest.mark.parametrize("tamanho", [1, 2, 3, 7, 64, 100000])
+def test_linhas_independem_do_tamanho_dos_pedacos(tamanho):
+    # Pedaços de 1 byte cortam os caracteres acentuados (UTF-8 de 2 bytes) ao meio
+    stream, linhas = alimentar(documento(), tamanho)
+    assert linhas == LINHAS
+    assert stream.finished
+    assert stream.treesize == 3
+
+def test_cada_linha_sai_assim_que_termina():
+    dados = documento()
+    stream = JSONArrayStream("devices")
+    fim_primeira = dados.index(b"}") + 1
+    assert stream.feed(dados[:fim_primeira - 1]) == []
+    assert stream.feed(dados[fim_primeira - 1:fim_primeira]) == LINHAS[:1]
+    assert not stream.finished
+
+@pytest.mark.parametrize("tamanho", [1, 5, 100000])
+def test_treesize_depois_do_array(tamanho):
+    stream, linhas = alimentar(documento(treesize_antes=False), tamanho)
+    assert linhas == LINHAS
+    assert stream.treesize == 3
+
+def test_array_vazio():
+    stream, linhas = alimentar(b'{"treesize":0,"devices":[ ]}', 1)
+    assert linhas == []
+    assert stream.finished
+    assert stream.treesize == 0
+
+def test_ignora_chave_de_outro_array():
+    stream, linhas = alimentar(b'{"sensors":[{"objid":9}],"devices":[{"objid":1}]}', 4)
+    assert linhas == [{"objid": 1}]
+
+def test_close_com_array_incompleto_falha():
+    dados = documento()
+    stream = JSONArrayStream("devices")
+    stream.feed(dados[:-20])
+    with pytest.raises(json.JSONDecodeError):
+        stream.close()
+
+def test_close_sem_array_nao_falha():
+    stream = JSONArrayStream("devices")
+    assert stream.feed(b'{"treesize":0}') == []
+    stream.close()
+    assert not stream.finished
+    assert stream.treesize == 0
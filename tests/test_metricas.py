@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+
+import pytest
+
+from metricas import ExportadorMetricas, Metricas
+
+@pytest.fixture
+def metricas():
+    m = Metricas()
+    m.contador("requests_total", "Requisições.")
+    m.medidor("fila", "Itens na fila.")
+    m.histograma("duracao_seconds", "Duração.", (1, 2, 5))
+    return m
+
+def por_rotulos(metricas, nome):
+    return {tuple(sorted(l["rotulos"].items())): l for l in metricas.instantaneo() if l["nome"] == nome}
+
+def test_contador_separa_por_rotulos(metricas):
+    metricas.incrementar("requests_total", content="devices", result="ok")
+    metricas.incrementar("requests_total", 2, result="ok", content="devices") # Ordem dos rótulos não importa
+    metricas.incrementar("requests_total", content="sensors", result="error")
+    series = por_rotulos(metricas, "requests_total")
+    assert series[(("content", "devices"), ("result", "ok"))]["valor"] == 3
+    assert series[(("content", "sensors"), ("result", "error"))]["valor"] == 1
+
+def test_medidor_guarda_o_ultimo_valor(metricas):
+    metricas.definir("fila", 5)
+    metricas.definir("fila", 2)
+    assert por_rotulos(metricas, "fila")[()]["valor"] == 2
+
+def test_histograma_baldes_e_quantis(metricas):
+    for valor in (0.5, 1, 1.5, 3):
+        metricas.observar("duracao_seconds", valor)
+    linha = por_rotulos(metricas, "duracao_seconds")[()]
+    assert linha["tipo"] == "histogram"
+    assert linha["baldes"] == {"1": 2, "2": 1, "5": 1, "+Inf": 0} # O limite é inclusivo (le)
+    assert linha["n"] == 4
+    assert linha["soma"] == 6.0
+    assert linha["media"] == 1.5
+    assert linha["maximo"] == 3
+    assert linha["p50"] == pytest.approx(1.0)
+    assert linha["p95"] == pytest.approx(4.4)
+    assert linha["p99"] == pytest.approx(4.88)
+
+def test_quantil_acima_do_maior_limite_usa_o_maximo(metricas):
+    metricas.observar("duracao_seconds", 0.5)
+    metricas.observar("duracao_seconds", 42)
+    linha = por_rotulos(metricas, "duracao_seconds")[()]
+    assert linha["baldes"]["+Inf"] == 1
+    assert linha["p99"] == 42
+
+def test_taxa_acerto(metricas):
+    metricas.contador("cache_requests_total", "Consultas ao cache.")
+    metricas.incrementar("cache_requests_total", 3, cache="devices", result="hit")
+    metricas.incrementar("cache_requests_total", 1, cache="devices", result="miss")
+    metricas.incrementar("cache_requests_total", 2, cache="sensors", result="miss")
+    assert metricas.taxa_acerto("cache_requests_total", "cache") == {"devices": 0.75, "sensors": 0.0}
+    assert metricas.taxa_acerto("inexistente", "cache") == {}
+
+def test_zerar(metricas):
+    metricas.incrementar("requests_total")
+    metricas.observar("duracao_seconds", 1)
+    metricas.zerar()
+    assert metricas.instantaneo() == []
+
+def test_para_prometheus(metricas):
+    metricas.incrementar("requests_total", content="devices", result="ok")
+    metricas.definir("fila", 1.5)
+    metricas.observar("duracao_seconds", 0.5, content="a\"b")
+    metricas.observar("duracao_seconds", 3, content="a\"b")
+    assert metricas.para_prometheus().splitlines() == [
+        "# HELP duracao_seconds Duração.",
+        "# TYPE duracao_seconds histogram",
+        'duracao_seconds_bucket{content="a\\"b",le="1"} 1',
+        'duracao_seconds_bucket{content="a\\"b",le="2"} 1',
+        'duracao_seconds_bucket{content="a\\"b",le="5"} 2',
+        'duracao_seconds_bucket{content="a\\"b",le="+Inf"} 2',
+        'duracao_seconds_sum{content="a\\"b"} 3.5',
+        'duracao_seconds_count{content="a\\"b"} 2',
+        "# HELP fila Itens na fila.",
+        "# TYPE fila gauge",
+        "fila 1.5",
+        "# HELP requests_total Requisições.",
+        "# TYPE requests_total counter",
+        'requests_total{content="devices",result="ok"} 1',
+    ]
+
+def test_para_json(metricas):
+    metricas.incrementar("requests_total", result="ok")
+    dados = json.loads(metricas.para_json())
+    assert dados["metricas"] == [{"nome": "requests_total", "tipo": "counter", "rotulos": {"result": "ok"}, "valor": 1}]
+
+def test_incrementos_concorrentes(metricas):
+    def trabalhar():
+        for _ in range(1000):
+            metricas.incrementar("requests_total", result="ok")
+    threads = [threading.Thread(target=trabalhar) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert por_rotulos(metricas, "requests_total")[(("result", "ok"),)]["valor"] == 8000
+
+def test_exportador_grava_ao_parar(metricas, tmp_path):
+    metricas.incrementar("requests_total")
+    caminho = tmp_path / "saida" / "metricas.prom"
+    ExportadorMetricas(metricas, str(caminho)).parar()
+    assert "requests_total 1" in caminho.read_text(encoding="utf-8")
+    assert list(caminho.parent.iterdir()) == [caminho] # Nenhum temporário deixado para trás
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+from tarefas import CANCELADA, CONCLUIDA, EM_ANDAMENTO, FALHOU, NA_FILA, GerenciadorTarefas
+
+ESPERA = 5 # Limite de segurança para os eventos; os testes não dependem de tempo
+
+@pytest.fixture
+def gerenciador():
+    g = GerenciadorTarefas(max_workers=1)
+    yield g
+    g.encerrar()
+
+def bloqueante(liberar, iniciou=None):
+    # Tarefa que só termina quando o teste mandar
+    def funcao(tarefa):
+        if iniciou is not None:
+            iniciou.set()
+        liberar.wait(ESPERA)
+        return "ok"
+    return funcao
+
+def submeter_e_aguardar(gerenciador, funcao, *args, **kwargs):
+    terminou = threading.Event()
+    tarefa = gerenciador.submeter("Teste", funcao, *args, ao_terminar=lambda t: terminou.set(), **kwargs)
+    assert terminou.wait(ESPERA)
+    return tarefa
+
+def test_conclui_com_resultado(gerenciador):
+    tarefa = submeter_e_aguardar(gerenciador, lambda tarefa, x: x * 2, 21)
+    assert tarefa.estado == CONCLUIDA
+    assert tarefa.resultado == 42
+    assert tarefa.fim is not None
+
+def test_excecao_vira_falhou(gerenciador):
+    def falhar(tarefa):
+        raise ValueError("sem conexão")
+    tarefa = submeter_e_aguardar(gerenciador, falhar)
+    assert tarefa.estado == FALHOU
+    assert isinstance(tarefa.erro, ValueError)
+    assert tarefa.progresso == "Erro: sem conexão"
+
+def test_mesma_chave_ativa_devolve_a_tarefa_existente(gerenciador):
+    liberar = threading.Event()
+    primeira = gerenciador.submeter("Ping", bloqueante(liberar), chave=("ping", "101"))
+    assert gerenciador.submeter("Ping", bloqueante(liberar), chave=("ping", "101")) is primeira
+    outra = gerenciador.submeter("Ping", bloqueante(liberar), chave=("ping", "202"))
+    assert outra is not primeira
+    sem_chave = gerenciador.submeter("Ping", bloqueante(liberar))
+    assert gerenciador.submeter("Ping", bloqueante(liberar)) is not sem_chave
+    liberar.set()
+
+def test_mesma_chave_depois_de_finalizada_cria_nova(gerenciador):
+    primeira = submeter_e_aguardar(gerenciador, lambda tarefa: 1, chave="k")
+    segunda = submeter_e_aguardar(gerenciador, lambda tarefa: 2, chave="k")
+    assert segunda is not primeira
+    assert segunda.resultado == 2
+
+def test_cancelar_na_fila_nao_executa(gerenciador):
+    liberar, iniciou = threading.Event(), threading.Event()
+    ocupando = gerenciador.submeter("Ocupa o único worker", bloqueante(liberar, iniciou))
+    assert iniciou.wait(ESPERA)
+    executou = threading.Event()
+    finalizacoes = []
+    na_fila = gerenciador.submeter("Na fila", lambda tarefa: executou.set(), ao_terminar=finalizacoes.append)
+    assert na_fila.estado == NA_FILA
+    gerenciador.cancelar(na_fila.id)
+    assert na_fila.estado == CANCELADA
+    assert finalizacoes == [na_fila]
+    liberar.set()
+    submeter_e_aguardar(gerenciador, lambda tarefa: None) # Passa depois da cancelada na fila
+    assert not executou.is_set()
+    assert ocupando.estado == CONCLUIDA
+    assert finalizacoes == [na_fila]
+
+def test_cancelar_em_andamento_finaliza_na_hora(gerenciador):
+    iniciou, continuar, saiu = threading.Event(), threading.Event(), threading.Event()
+    finalizacoes = []
+    def trabalhar(tarefa):
+        tarefa.informar(progresso="Consultando", concluidos=1, total=3)
+        iniciou.set()
+        continuar.wait(ESPERA)
+        tarefa.informar(progresso="Depois do cancelamento", resultado="parcial")
+        saiu.set()
+        return "final"
+    tarefa = gerenciador.submeter("Consulta", trabalhar, ao_terminar=finalizacoes.append)
+    assert iniciou.wait(ESPERA)
+    assert tarefa.estado == EM_ANDAMENTO
+    gerenciador.cancelar(tarefa.id)
+    # Finalizada sem esperar o thread, que ainda está bloqueado
+    assert tarefa.estado == CANCELADA
+    assert tarefa.cancelamento.cancelado()
+    assert finalizacoes == [tarefa]
+    continuar.set()
+    assert saiu.wait(ESPERA)
+    submeter_e_aguardar(gerenciador, lambda t: None) # O worker único já devolveu a tarefa cancelada
+    assert tarefa.estado == CANCELADA
+    assert tarefa.progresso == "Cancelada."
+    assert tarefa.concluidos == 1
+    assert tarefa.resultado is None
+    assert finalizacoes == [tarefa]
+
+def test_cancelar_libera_a_chave(gerenciador):
+    liberar = threading.Event()
+    primeira = gerenciador.submeter("Ping", bloqueante(liberar), chave="k")
+    gerenciador.cancelar(primeira.id)
+    assert gerenciador.submeter("Ping", bloqueante(liberar), chave="k") is not primeira
+    liberar.set()
+
+def test_cancelar_todas(gerenciador):
+    liberar = threading.Event()
+    tarefas = [gerenciador.submeter("T", bloqueante(liberar)) for _ in range(3)]
+    gerenciador.cancelar_todas()
+    assert [t.estado for t in tarefas] == [CANCELADA] * 3
+    assert gerenciador.ativas() == []
+    liberar.set()
+
+def test_mantem_apenas_as_finalizadas_recentes():
+    g = GerenciadorTarefas(max_workers=1, max_finalizadas=2)
+    try:
+        feitas = [submeter_e_aguardar(g, lambda tarefa: None) for _ in range(4)]
+        liberar = threading.Event()
+        ativa = g.submeter("Ativa", bloqueante(liberar))
+        assert g.tarefas() == feitas[2:] + [ativa]
+        liberar.set()
+    finally:
+        g.encerrar()
+
+def test_ao_mudar_recebe_as_transicoes():
+    estados = []
+    g = GerenciadorTarefas(max_workers=1, ao_mudar=lambda tarefa: estados.append(tarefa.estado))
+    try:
+        submeter_e_aguardar(g, lambda tarefa: tarefa.informar(progresso="meio"))
+    finally:
+        g.encerrar()
+    assert estados == [NA_FILA, EM_ANDAMENTO, EM_ANDAMENTO, CONCLUIDA]
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+from prtg_API import TTLCache
+
+class Relogio:
+    # Substitui time.monotonic no módulo, para expirar entradas sem esperar
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self):
+        return self.agora
+
+def cache_com_relogio(monkeypatch, **kwargs):
+    relogio = Relogio()
+    monkeypatch.setattr("prtg_API.time.monotonic", relogio)
+    return TTLCache(**kwargs), relogio
+
+def test_get_devolve_valor_ate_expirar(monkeypatch):
+    cache, relogio = cache_com_relogio(monkeypatch, ttl=10)
+    cache.set("a", 1)
+    relogio.agora += 9.9
+    assert cache.get("a") == 1
+    relogio.agora += 0.1
+    assert cache.get("a") is None
+    assert cache.get("a", "padrao") == "padrao"
+    assert len(cache) == 0 # Entrada vencida é descartada na consulta
+
+def test_ttl_por_entrada(monkeypatch):
+    cache, relogio = cache_com_relogio(monkeypatch, ttl=10)
+    cache.set("curta", 1, ttl=1)
+    cache.set("longa", 2)
+    relogio.agora += 5
+    assert cache.get("curta") is None
+    assert cache.get("longa") == 2
+
+def test_lru_descarta_a_menos_usada():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a") # "b" passa a ser a menos usada
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+def test_peek_nao_altera_ordem_lru():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.peek("a") == 1
+    cache.set("c", 3)
+    assert cache.peek("a") is None # peek não renovou "a"
+    assert cache.peek("b") == 2
+
+def test_invalidate():
+    cache = TTLCache()
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.invalidate("a")
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    cache.invalidate()
+    assert len(cache) == 0
+
+def test_version_so_muda_com_o_conteudo():
+    cache = TTLCache()
+    inicial = cache.version
+    cache.set("a", 1)
+    depois_set = cache.version
+    assert depois_set > inicial
+    cache.set("a", 1) # Mesmo valor: só renova o prazo
+    cache.invalidate("inexistente")
+    assert cache.version == depois_set
+    cache.set("a", 2)
+    assert cache.version > depois_set
+    antes = cache.version
+    cache.invalidate("a")
+    assert cache.version > antes
+    antes = cache.version
+    cache.invalidate() # Já vazio
+    assert cache.version == antes
+
+def test_items_ignora_vencidas(monkeypatch):
+    cache, relogio = cache_com_relogio(monkeypatch, ttl=10)
+    cache.set("a", 1, ttl=1)
+    cache.set("b", 2)
+    relogio.agora += 2
+    assert cache.items() == [("b", 2)]
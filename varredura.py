@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import re
+
+VMS_LOJA = (("Gateway", 1), ("API", 2), ("DB", 3), ("Manager", 4)) # Nome da VM e último octeto do IP
+
+STATUS_ONLINE = "Online"
+STATUS_PARCIAL = "Parcial"
+STATUS_OFFLINE = "Offline"
+STATUS_SEM_NUMERO = "Sem número"
+
+def extrair_numero_loja(id_ou_nome_loja):
+    """
+    Extrai o número da loja do ID_Loja (ex: '10', '010') ou Nome_Loja (ex: 'Loja 10', 'LJ010').
+    Usado para construir os IPs das VMs.
+    """
+    if id_ou_nome_loja is None:
+        return None
+    # Tenta extrair números de uma string. Ex: "LJ010" -> "010", "Loja 10" -> "10", "10" -> "10"
+    match = re.search(r'\d+', str(id_ou_nome_loja))
+    if match:
+        try:
+            return int(match.group())
+        except ValueError:
+            return None
+    return None
+
+def numero_da_loja(loja):
+    """Número da loja a partir do ID_Loja ou, se não houver, do Nome_Loja."""
+    numero = extrair_numero_loja(loja.get("ID_Loja"))
+    if numero is None:
+        numero = extrair_numero_loja(loja.get("Nome_Loja"))
+    return numero
+
+def ips_vms_loja(numero_loja):
+    """Retorna {nome da VM: IP} da loja, na faixa 192.168.N.1-4."""
+    return {nome_vm: f"192.168.{numero_loja}.{octeto}" for nome_vm, octeto in VMS_LOJA}
+
+def filtrar_lojas(lojas, core=None, estado=None):
+    """Lojas cujo Core_PRTG e Estado coincidem com os filtros informados (None = qualquer valor)."""
+    core = core.strip().lower() if core else None
+    estado = estado.strip().lower() if estado else None
+    return [
+        loja for loja in lojas
+        if (core is None or str(loja.get("Core_PRTG", "")).strip().lower() == core)
+        and (estado is None or str(loja.get("Estado", "")).strip().lower() == estado)
+    ]
+
+def status_loja(resultados_vms):
+    """Resume os pings das VMs de uma loja em Online, Parcial ou Offline."""
+    online = sum(1 for resultado in resultados_vms.values() if resultado.get("success"))
+    if online == len(VMS_LOJA):
+        return STATUS_ONLINE
+    return STATUS_PARCIAL if online else STATUS_OFFLINE
+
+def varrer_lojas(network_tools, lojas, count=2, timeout=1, ao_resultado=None, should_stop=None, cancelamento=None):
+    """
+    Pinga as VMs de todas as lojas ao mesmo tempo (NetworkTools.ping_hosts_concurrently).
+
+    Args:
+        network_tools: Instância de NetworkTools.
+        lojas: Sequência de registros de lojas.
+        count: Echo requests por VM.
+        timeout: Segundos de espera por resposta.
+        ao_resultado: Chamada como ao_resultado(posicao, nome_vm, resultado, status) a cada VM
+            concluída; `status` só é preenchido quando a última VM da loja termina.
+        should_stop: Função que, ao retornar True, interrompe a varredura.
+        cancelamento: TokenCancelamento opcional; ao ser cancelado, mata os pings em andamento.
+
+    Returns:
+        Lista com um dicionário por loja ("loja", "numero", "vms" e "status"), na ordem de `lojas`.
+        Em caso de cancelamento, lojas incompletas ficam com status None.
+    """
+    linhas = []
+    alvos = []
+    for posicao, loja in enumerate(lojas):
+        numero = numero_da_loja(loja)
+        linhas.append({"loja": loja, "numero": numero, "vms": {},
+                       "status": STATUS_SEM_NUMERO if numero is None else None})
+        if numero is not None:
+            alvos.extend((ip, (posicao, nome_vm)) for nome_vm, ip in ips_vms_loja(numero).items())
+
+    def ao_receber(chave, resultado):
+        posicao, nome_vm = chave
+        linha = linhas[posicao]
+        linha["vms"][nome_vm] = resultado
+        if len(linha["vms"]) == len(VMS_LOJA):
+            linha["status"] = status_loja(linha["vms"])
+        if ao_resultado:
+            ao_resultado(posicao, nome_vm, resultado, linha["status"])
+
+    if alvos:
+        network_tools.ping_hosts_concurrently(alvos, count=count, timeout=timeout,
+                                              on_result=ao_receber, should_stop=should_stop,
+                                              cancel_token=cancelamento)
+    return linhas